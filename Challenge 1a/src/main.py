@@ -1,20 +1,34 @@
-import fitz, requests, os, re, pandas as pd, numpy as np, json
-from sklearn.ensemble import RandomForestClassifier
+import os, re, sys, json, time, argparse, importlib
 from collections import Counter
 
-os.makedirs("pdf_dataset", exist_ok=True)
+# Heavy dependencies (fitz, pandas, sklearn, requests) are imported inside the
+# stages that use them so --help, argument validation and small jobs start fast.
 
-# Download sample PDFs
+FEATURES = ["font_size", "x0", "y0", "bold", "uppercase_ratio", "length"]
+
+# Speed/quality profiles (--profile): page sampling and labeling together; explicit flags override them
+PROFILES = {
+    "fast": {"max_pages": 20, "classifier": "rules"},      # Outline of the first pages only
+    "balanced": {"max_pages": None, "classifier": "rules"},
+    "accurate": {"max_pages": None, "classifier": "model"},
+}
+
+# Sample PDFs used to train the heading model
 urls = ["https://arxiv.org/pdf/1706.03762.pdf", "https://arxiv.org/pdf/1605.08294.pdf", 
         "https://arxiv.org/pdf/1802.05365.pdf", "https://arxiv.org/pdf/1409.0473.pdf"]
 
-for i, url in enumerate(urls, 1):
-    try:
-        r = requests.get(url, timeout=30, stream=True)
-        if int(r.headers.get('content-length', 0)) > 50*1024*1024: continue
-        with open(f"pdf_dataset/sample_{i}.pdf", "wb") as f: f.write(r.content)
-        print(f"Downloaded sample_{i}.pdf")
-    except: pass
+def download_samples(dataset_dir="pdf_dataset", log=sys.stdout):
+    import requests
+    os.makedirs(dataset_dir, exist_ok=True)
+    for i, url in enumerate(urls, 1):
+        path = f"{dataset_dir}/sample_{i}.pdf"
+        if os.path.exists(path): continue  # Already cached from a previous run
+        try:
+            r = requests.get(url, timeout=30, stream=True)
+            if int(r.headers.get('content-length', 0)) > 50*1024*1024: continue
+            with open(path, "wb") as f: f.write(r.content)
+            print(f"Downloaded sample_{i}.pdf", file=log)
+        except: pass
 
 def is_valid(text):
     text = text.strip()
@@ -23,39 +37,166 @@ def is_valid(text):
     if re.match(r".*\.{3,}\s*\d+$|^[\d\s.()ivxlcdm]{1,6}$", text): return False
     return True
 
-def extract_text_blocks(pdf_path):
-    doc = fitz.open(pdf_path)
-    items = []
+def prefetch(paths, depth=4):
+    # Background reader: yields (path, bytes) while the next PDFs are read; the bounded queue caps memory
+    import queue, threading
+    buffer, stop = queue.Queue(maxsize=max(1, depth)), threading.Event()
     
-    for page_num, page in enumerate(doc):
-        ph, pw = page.rect.height, page.rect.width
-        for block in page.get_text("dict")["blocks"]:
-            if block.get('type') != 0: continue
-            for line in block.get("lines", []):
-                text, bbox, fs, fn, bold = "", None, 0, "", False
-                for span in line.get("spans", []):
-                    if not span.get("text", "").strip(): continue
-                    y, x = span["bbox"][1], span["bbox"][0]
-                    # Skip margins and watermarks
-                    if (y < 0.05*ph or y > 0.95*ph or x < 0.05*pw or x > 0.95*pw or 
-                        span.get("alpha", 1) < 0.5 or span.get("size", 12) > 60): continue
-                    
-                    if not text:
-                        text, bbox, fs, fn = span["text"].strip(), span["bbox"], span["size"], span["font"]
-                        bold = "bold" in fn.lower()
-                    else:
-                        text += " " + span["text"].strip()
-                        fs = max(fs, span["size"])
-                        if "bold" in span["font"].lower(): bold = True
+    def put(item):
+        while not stop.is_set():
+            try: buffer.put(item, timeout=0.1); return
+            except queue.Full: pass
+    
+    def reader():
+        for path in paths:
+            if stop.is_set(): return
+            try:
+                with open(path, "rb") as f: put((path, f.read(), None))
+            except OSError as e: put((path, None, e))
+        put(None)
+    
+    threading.Thread(target=reader, daemon=True).start()
+    try:
+        while (item := buffer.get()) is not None:
+            yield item
+    finally: stop.set()
+
+def page_items(page, page_num):
+    ph, pw = page.rect.height, page.rect.width
+    items = []
+    for block in page.get_text("dict")["blocks"]:
+        if block.get('type') != 0: continue
+        for line in block.get("lines", []):
+            text, bbox, fs, fn, bold = "", None, 0, "", False
+            for span in line.get("spans", []):
+                if not span.get("text", "").strip(): continue
+                y, x = span["bbox"][1], span["bbox"][0]
+                # Skip margins and watermarks
+                if (y < 0.05*ph or y > 0.95*ph or x < 0.05*pw or x > 0.95*pw or 
+                    span.get("alpha", 1) < 0.5 or span.get("size", 12) > 60): continue
                 
-                if text and is_valid(text):
-                    items.append({
-                        "text": text, "page": page_num + 1, "font_size": fs,
-                        "bold": bold, "x": bbox[0], "y": bbox[1], "length": len(text)
-                    })
+                if not text:
+                    text, bbox, fs, fn = span["text"].strip(), span["bbox"], span["size"], span["font"]
+                    bold = "bold" in fn.lower()
+                else:
+                    text += " " + span["text"].strip()
+                    fs = max(fs, span["size"])
+                    if "bold" in span["font"].lower(): bold = True
+            
+            if text and is_valid(text):
+                items.append({
+                    "text": text, "page": page_num + 1, "font_size": fs,
+                    "bold": bold, "x": bbox[0], "y": bbox[1], "length": len(text)
+                })
+    return items
+
+def import_fitz():
+    # PyMuPDF >= 1.24.3 is `pymupdf`; its old `fitz` name prints a deprecation warning to stdout (into --stream -)
+    try: import pymupdf as fitz
+    except ImportError: import fitz
+    return fitz
+
+def page_range(doc, max_pages=None):
+    return range(len(doc) if max_pages is None else min(len(doc), max_pages))
+
+def extract_text_blocks(pdf_path, data=None, max_pages=None):
+    fitz = import_fitz()
+    doc = fitz.open(stream=data, filetype="pdf") if data is not None else fitz.open(pdf_path)
+    items = []
+    for page_num in page_range(doc, max_pages): items.extend(page_items(doc[page_num], page_num))
     doc.close()
     return items
 
+def guarded_worker(conn):
+    # Extraction worker: reports every page as it starts and finishes so the parent can time it
+    import signal
+    fitz = import_fitz()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while (task := conn.recv()) is not None:
+        path, skip, max_pages = task
+        try:
+            doc = fitz.open(path)
+            for page_num in page_range(doc, max_pages):
+                if page_num in skip: continue
+                conn.send(("start", page_num))
+                conn.send(("page", page_num, page_items(doc[page_num], page_num)))
+            doc.close()
+            conn.send(("done",))
+        except Exception as e: conn.send(("error", str(e)))
+
+def extract_guarded(paths, workers=2, doc_timeout=None, page_timeout=None, log=sys.stdout, max_pages=None):
+    # Yields (path, items, issues) in input order; a worker that overruns a page or document limit
+    # is killed and replaced. After a page timeout the document resumes on the next page,
+    # after a document timeout the pages extracted so far are kept
+    import multiprocessing as mp
+    from collections import deque
+    from multiprocessing.connection import wait
+    
+    def spawn():
+        conn, child = mp.Pipe()
+        proc = mp.Process(target=guarded_worker, args=(child,), daemon=True)
+        proc.start(); child.close()
+        return {"conn": conn, "proc": proc, "task": None}
+    
+    def kill(w): w["proc"].kill(); w["proc"].join(); w["conn"].close()
+    
+    queue = deque({"i": i, "path": p, "items": [], "issues": [], "skip": set(), "start": None, "page": None}
+                  for i, p in enumerate(paths))
+    pool, results, next_i = [spawn() for _ in range(max(1, min(workers, len(paths))))], {}, 0
+    
+    def finish(w):
+        t = w["task"]; results[t["i"]] = (t["path"], t["items"], t["issues"]); w["task"] = None
+    
+    def abandon(w, reason, seconds=None):
+        t, name = w["task"], os.path.basename(w["task"]["path"])
+        pool[pool.index(w)] = spawn(); kill(w)
+        issue = {"reason": reason, **({"seconds": seconds} if seconds else {})}
+        if reason == "document_timeout" or t["page"] is None:
+            results[t["i"]] = (t["path"], t["items"], t["issues"] + [issue])
+        else:
+            issue = {"page": t["page"] + 1, **issue}
+            t["issues"].append(issue); t["skip"].add(t["page"]); t["page"] = None
+            queue.appendleft(t)
+        print(f"⏱️ {name}: {reason}" + (f" on page {issue['page']}" if "page" in issue else ""), file=log)
+    
+    try:
+        while next_i < len(paths):
+            for w in pool:
+                if w["task"] is None and queue:
+                    t = w["task"] = queue.popleft()
+                    t["start"] = t["start"] or time.monotonic()
+                    w["conn"].send((t["path"], t["skip"], max_pages))
+            busy = [w for w in pool if w["task"] is not None]
+            deadlines = [d for w in busy for d in (
+                w["task"]["start"] + doc_timeout if doc_timeout else None,
+                w["task"]["page_start"] + page_timeout if page_timeout and w["task"]["page"] is not None else None) if d]
+            ready = wait([w["conn"] for w in busy], timeout=max(0, min(deadlines) - time.monotonic()) if deadlines else None)
+            for w in busy:
+                if w["conn"] not in ready: continue
+                t = w["task"]
+                try:
+                    while w["task"] is not None and w["conn"].poll():
+                        msg = w["conn"].recv()
+                        if msg[0] == "start": t["page"], t["page_start"] = msg[1], time.monotonic()
+                        elif msg[0] == "page": t["items"].extend(msg[2]); t["skip"].add(msg[1]); t["page"] = None
+                        elif msg[0] == "done": finish(w)
+                        elif msg[0] == "error": t["issues"].append({"reason": "error", "error": msg[1]}); finish(w)
+                except (EOFError, OSError): abandon(w, "worker_died")
+            now = time.monotonic()
+            for w in list(pool):
+                t = w["task"]
+                if t is None: continue
+                if doc_timeout and now >= t["start"] + doc_timeout: abandon(w, "document_timeout", doc_timeout)
+                elif page_timeout and t["page"] is not None and now >= t["page_start"] + page_timeout: abandon(w, "page_timeout", page_timeout)
+            while next_i in results:
+                yield results.pop(next_i); next_i += 1
+    finally:
+        for w in pool:
+            try: w["conn"].send(None)
+            except OSError: pass
+            w["proc"].join(timeout=1)
+            if w["proc"].is_alive(): kill(w)
+
 def classify_text(text, font_size, is_bold, page, body_size):
     text = text.strip()
     
@@ -89,28 +230,38 @@ def classify_text(text, font_size, is_bold, page, body_size):
     
     return "P"
 
-def process_pdf(pdf_path):
-    items = extract_text_blocks(pdf_path)
+def process_pdf(pdf_path, timings=None, data=None, max_pages=None, rules=True):
+    start = time.perf_counter()
+    items = extract_text_blocks(pdf_path, data, max_pages)
+    if timings is not None: timings["extract_s"] = round(time.perf_counter() - start, 4)
+    return classify_items(items, timings, rules)
+
+def classify_items(items, timings=None, rules=True):
+    # rules=False leaves the rows unlabeled for the batched model (predict_batch)
+    import pandas as pd
     if not items: return pd.DataFrame()
-    
-    # Find body text size (most common)
-    sizes = [item["font_size"] for item in items]
-    body_size = Counter([round(s, 1) for s in sizes]).most_common(1)[0][0]
+    start = time.perf_counter()
     
     data = []
     for item in items:
-        label = classify_text(item["text"], item["font_size"], item["bold"], 
-                            item["page"], body_size)
-        
         data.append({
             "page": item["page"], "text": item["text"], "font_size": item["font_size"],
             "bold": int(item["bold"]), "x0": item["x"], "y0": item["y"],
             "length": item["length"], 
             "uppercase_ratio": sum(c.isupper() for c in item["text"]) / len(item["text"]),
-            "predicted": label
         })
+    df = pd.DataFrame(data)
+    if rules: label_with_rules(df)
     
-    return pd.DataFrame(data)
+    if timings is not None: timings["classify_s"] = round(time.perf_counter() - start, 4)
+    return df
+
+def label_with_rules(df):
+    # Body text size is the most common one
+    body_size = Counter(round(s, 1) for s in df["font_size"].tolist()).most_common(1)[0][0]
+    df["predicted"] = [classify_text(text, font_size, bold, page, body_size) for text, font_size, bold, page in
+                       zip(df["text"].tolist(), df["font_size"].tolist(), df["bold"].tolist(), df["page"].tolist())]
+    return df
 
 def create_output(df):
     if df.empty: return {"title": "Untitled Document", "outline": []}
@@ -119,75 +270,354 @@ def create_output(df):
     titles = df[df["predicted"] == "TITLE"]
     title = titles.iloc[0]["text"] if not titles.empty else "Untitled Document"
     
-    # Create outline
-    outline = []
-    for _, row in df.iterrows():
-        if row["predicted"] != "TITLE":
-            outline.append({
-                "level": row["predicted"],
-                "text": row["text"], 
-                "page": int(row["page"])
-            })
+    # Create outline (column-wise, avoids per-row Series construction on large outlines)
+    rest = df[df["predicted"] != "TITLE"]
+    outline = [{"level": level, "text": text, "page": int(page)}
+               for level, text, page in zip(rest["predicted"], rest["text"], rest["page"])]
     
     return {"title": title, "outline": outline}
 
-# Train basic model
-print("Processing training data...")
-all_data = []
-for f in os.listdir("pdf_dataset"):
-    if f.endswith(".pdf"):
-        try:
-            df = process_pdf(f"pdf_dataset/{f}")
-            if not df.empty: all_data.append(df)
-        except Exception as e: print(f"Error with {f}: {e}")
-
-if all_data:
+def train_model(dataset_dir="pdf_dataset", log=sys.stdout):
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+    download_samples(dataset_dir, log)
+    print("Processing training data...", file=log)
+    all_data = []
+    for f in os.listdir(dataset_dir):
+        if f.endswith(".pdf"):
+            try:
+                df = process_pdf(f"{dataset_dir}/{f}")
+                if not df.empty: all_data.append(df)
+            except Exception as e: print(f"Error with {f}: {e}", file=log)
+    
+    if not all_data: return None
     train_df = pd.concat(all_data, ignore_index=True)
-    features = ["font_size", "x0", "y0", "bold", "uppercase_ratio", "length"]
-    if len(train_df['predicted'].unique()) > 2:
-        model = RandomForestClassifier(n_estimators=100, random_state=42)
-        model.fit(train_df[features], train_df["predicted"])
-        print("Model trained.")
-    else: model = None
-else: model = None
-
-# Docker vs Interactive mode
-if os.path.exists("/app/input"):
-    print("🐳 Docker mode")
-    for pdf_file in os.listdir("/app/input"):
-        if pdf_file.lower().endswith('.pdf'):
+    if len(train_df['predicted'].unique()) <= 2: return None
+    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model.fit(train_df[FEATURES], train_df["predicted"])
+    print("Model trained.", file=log)
+    return model
+
+def load_model(model_path="pdf_dataset/heading_model.joblib", retrain=False, log=sys.stdout):
+    # Cached on disk so batch runs don't pay for downloads and training every start
+    import joblib
+    if os.path.exists(model_path) and not retrain: return joblib.load(model_path)
+    model = train_model(os.path.dirname(model_path) or ".", log)
+    if model is not None:
+        joblib.dump(model, model_path)
+        print(f"Model saved to {model_path}", file=log)
+    return model
+
+def apply_rule_overrides(df):
+    # Same priority rules as classify_text, as masks over a whole batch
+    text = df["text"].str.strip()
+    numbered = text.str.extract(r"^(\d+(?:\.\d+)*)\s+", expand=False)
+    dots = numbered.str.count(r"\.")
+    levels = dots.map({0: "H1", 1: "H2", 2: "H3"}).where(dots.isna() | (dots <= 2), "H4")
+    df.loc[numbered.notna(), "predicted"] = levels[numbered.notna()]
+    df.loc[text.str.contains(r"\.{2,}\s*\d+\s*$"), "predicted"] = "P"  # TOC entries
+    return df
+
+def predict_batch(model, frames):
+    # One model call for the whole chunk of documents, then rule overrides on the combined frame
+    import pandas as pd
+    if not frames: return frames
+    batch = pd.concat(frames, keys=range(len(frames)))
+    batch["predicted"] = model.predict(batch[FEATURES])
+    apply_rule_overrides(batch)
+    for i, df in enumerate(frames):
+        df["predicted"] = batch.loc[i, "predicted"].to_numpy()
+    return frames
+
+def ensure_single_title(df):
+    titles = df[df["predicted"] == "TITLE"]
+    if len(titles) > 1:
+        max_idx = titles["font_size"].idxmax()
+        df.loc[titles.index, "predicted"] = "H1"
+        df.loc[max_idx, "predicted"] = "TITLE"
+    return df
+
+def to_json(obj, compact=False):
+    if compact: return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    return json.dumps(obj, indent=2, ensure_ascii=False)
+
+def write_output(output, path, compact=False):
+    # Temp file + rename in the same directory, so readers never see a partial labels.json
+    import tempfile
+    out_dir = os.path.dirname(path) or "."
+    os.makedirs(out_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=out_dir)
+    try:
+        # mkstemp creates 0600; give the file the mode a plain open() would (readable by other users)
+        umask = os.umask(0); os.umask(umask)
+        os.fchmod(fd, 0o666 & ~umask)
+        with os.fdopen(fd, 'w') as f: f.write(to_json(output, compact))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+def open_stream(path):
+    # "-" streams NDJSON to stdout; anything else is appended to, so consumers can tail it
+    if path == "-": return sys.stdout
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return open(path, "a", encoding="utf-8")
+
+def stream_result(stream, record):
+    stream.write(to_json(record, compact=True) + "\n")
+    stream.flush()
+
+def finish_document(pdf_file, df, output_dir, compact, log):
+    df = ensure_single_title(df)
+    output = create_output(df)
+    write_output(output, f"{output_dir}/{pdf_file[:-4]}_labels.json", compact)
+    print(f"✅ {pdf_file}: {len(df)} items, {dict(df['predicted'].value_counts())}", file=log)
+    return output
+
+def flush_pending(pending, model, output_dir, compact, stream, log):
+    # pending: [(pdf_file, df, record, timings, start)]; the model runs once for all of them
+    if model is not None:
+        frames = [df for _, df, record, _, _ in pending if record["status"] == "empty" and df is not None and not df.empty]
+        predict_start = time.perf_counter()
+        try: predict_batch(model, frames)
+        except Exception as e:
+            # Frames were extracted without labels; rules are the fallback
+            print(f"⚠️ batch prediction failed, labeling with rules: {e}", file=log)
+            for df in frames: label_with_rules(df)
+        per_doc = round((time.perf_counter() - predict_start) / max(1, len(frames)), 4)
+        for _, df, _, timings, _ in pending:
+            if df is not None and not df.empty: timings["predict_s"] = per_doc
+    for pdf_file, df, record, timings, start in pending:
+        if record["status"] == "empty" and df is not None and not df.empty:
             try:
-                df = process_pdf(f"/app/input/{pdf_file}")
-                if not df.empty:
-                    # Ensure single title
-                    titles = df[df["predicted"] == "TITLE"]
-                    if len(titles) > 1:
-                        max_idx = titles["font_size"].idxmax()
-                        df.loc[titles.index, "predicted"] = "H1"
-                        df.loc[max_idx, "predicted"] = "TITLE"
-                    
-                    output = create_output(df)
-                    os.makedirs("/app/output", exist_ok=True)
-                    with open(f"/app/output/{pdf_file[:-4]}_labels.json", 'w') as f:
-                        json.dump(output, f, indent=2, ensure_ascii=False)
-                    
-                    print(f"✅ {pdf_file}: {len(df)} items, {dict(df['predicted'].value_counts())}")
+                write_start = time.perf_counter()
+                output = finish_document(pdf_file, df, output_dir, compact, log)
+                timings["write_s"] = round(time.perf_counter() - write_start, 4)
+                record.update(status="ok", items=len(df), **output)
             except Exception as e:
-                print(f"❌ {pdf_file}: {e}")
-else:
+                record.update(status="error", error=str(e))
+                print(f"❌ {pdf_file}: {e}", file=log)
+        if stream:
+            timings["total_s"] = round(time.perf_counter() - start, 4)
+            stream_result(stream, dict(record, timings=timings))
+    pending.clear()
+
+def run_batch(input_dir, output_dir, stream_path=None, compact=False, prefetch_depth=4, model=None, batch_docs=16,
+              workers=2, doc_timeout=None, page_timeout=None, max_pages=None):
+    stream = open_stream(stream_path) if stream_path else None
+    log = sys.stderr if stream is sys.stdout else sys.stdout  # Keep stdout clean for NDJSON
+    print("🐳 Docker mode", file=log)
+    paths = [f"{input_dir}/{f}" for f in os.listdir(input_dir) if f.lower().endswith('.pdf')]
+    guarded = bool(doc_timeout or page_timeout)
+    if guarded: items = extract_guarded(paths, workers, doc_timeout, page_timeout, log, max_pages)
+    else: items = prefetch(paths, prefetch_depth) if prefetch_depth > 0 else ((p, None, None) for p in paths)
+    
+    # Documents wait here until a chunk is full, so the model runs once per chunk
+    pending = []  # (pdf_file, df, record, timings, start)
+    
+    for path, data, info in items:
+        pdf_file = os.path.basename(path)
+        start, timings, df = time.perf_counter(), {}, None
+        record = {"file": pdf_file, "status": "empty", "title": None, "outline": []}
+        try:
+            if guarded:
+                # data holds the extracted items, info the timeouts (partial outlines are still written)
+                if info: record["issues"] = info
+                errors = [i["error"] for i in info if i["reason"] == "error"]
+                if errors: raise RuntimeError(errors[0])
+                df = classify_items(data, timings, rules=model is None)
+            else:
+                if info: raise info
+                df = process_pdf(path, timings, data, max_pages, rules=model is None)
+        except Exception as e:
+            record.update(status="error", error=str(e))
+            print(f"❌ {pdf_file}: {e}", file=log)
+        pending.append((pdf_file, df, record, timings, start))
+        if len(pending) >= (batch_docs if model is not None else 1): flush_pending(pending, model, output_dir, compact, stream, log)
+    flush_pending(pending, model, output_dir, compact, stream, log)
+    if stream and stream is not sys.stdout: stream.close()
+
+def extract_job(path, max_pages=None, doc_timeout=None, rules=True):
+    # Runs in a watch-mode worker process; returns the frame and its stage timings.
+    # With a timeout, SIGALRM's default action kills the worker even inside PyMuPDF's C code
+    import signal
+    if doc_timeout: signal.setitimer(signal.ITIMER_REAL, doc_timeout)
+    try:
+        timings = {}
+        return process_pdf(path, timings, max_pages=max_pages, rules=rules), timings
+    finally:
+        if doc_timeout: signal.setitimer(signal.ITIMER_REAL, 0)
+
+def warm_worker():
+    # Pay the heavy imports when the pool starts, not on the first dropped file;
+    # shutdown is driven by the parent, so workers drop its SIGTERM/Ctrl+C handling
+    import signal
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGALRM, signal.SIG_DFL)
+    import_fitz()
+    importlib.import_module("pandas")
+
+def is_up_to_date(path, output_dir, size_mtime):
+    out = f"{output_dir}/{os.path.basename(path)[:-4]}_labels.json"
+    return os.path.exists(out) and os.stat(out).st_mtime_ns >= size_mtime[1]
+
+def run_watch(input_dir, output_dir, stream_path=None, compact=False, model=None, workers=2, poll_interval=0.5, settle=1.0,
+              max_pages=None, doc_timeout=None):
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    from concurrent.futures.process import BrokenProcessPool
+    stream = open_stream(stream_path) if stream_path else None
+    log = sys.stderr if stream is sys.stdout else sys.stdout
+    os.makedirs(input_dir, exist_ok=True)
+    print(f"👀 Watch mode: {input_dir} ({workers} workers, Ctrl+C to stop)", file=log, flush=True)
+    
+    def stop(signum, frame): raise KeyboardInterrupt  # docker stop sends SIGTERM
+    import signal
+    signal.signal(signal.SIGTERM, stop)
+    
+    # A file is submitted once its (size, mtime) has stayed unchanged for `settle` seconds,
+    # so half-copied drops are never parsed; a later change to the file queues it again
+    observed = {}  # path -> ((size, mtime_ns), first seen with that signature)
+    done = {}      # path -> signature that was processed
+    running = {}   # future -> (path, signature, start, settle_s)
+    suspects = set()  # in flight when the pool crashed with no timeout to blame; retried one at a time
+    workers = max(1, workers)
+    
+    def new_pool(old=None):
+        # A worker that dies (crash or timeout) breaks the whole executor, so it is replaced
+        if old is not None: old.shutdown(wait=False, cancel_futures=True)
+        return ProcessPoolExecutor(max_workers=workers, initializer=warm_worker)
+    
+    pool = new_pool()
+    try:
+        while True:
+            now = time.time()
+            in_flight = {path for path, _, _, _ in running.values()}
+            names = [f for f in os.listdir(input_dir) if f.lower().endswith('.pdf') and not f.startswith('.')]
+            paths = {f"{input_dir}/{f}" for f in names}
+            for path in set(observed) - paths: observed.pop(path, None); done.pop(path, None)
+            suspects &= paths
+            for path in sorted(paths - in_flight, key=lambda p: (p not in suspects, p)):
+                if len(running) >= workers: break  # Only idle workers get a job, so each job starts when submitted
+                if suspects and (running or path not in suspects): break  # A suspect runs alone, so a crash is its own
+                try: st = os.stat(path)
+                except OSError: continue
+                sig = (st.st_size, st.st_mtime_ns)
+                if done.get(path) == sig: continue
+                if path not in observed or observed[path][0] != sig:
+                    observed[path] = (sig, now)
+                    continue
+                if st.st_size == 0 or now - observed[path][1] < settle: continue
+                if path not in done and is_up_to_date(path, output_dir, sig):
+                    done[path] = sig  # Output from an earlier run is newer than the PDF
+                    suspects.discard(path)
+                    continue
+                try: future = pool.submit(extract_job, path, max_pages, doc_timeout, model is None)
+                except BrokenProcessPool:
+                    if running: break  # The in-flight jobs report the crash below, then the pool is replaced
+                    pool = new_pool(pool)
+                    future = pool.submit(extract_job, path, max_pages, doc_timeout, model is None)
+                running[future] = (path, sig, time.perf_counter(), round(now - observed[path][1], 4))
+            
+            if not running:
+                time.sleep(poll_interval)
+                continue
+            finished, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            crashed = {f for f in finished if not f.cancelled() and isinstance(f.exception(), BrokenProcessPool)}
+            timed_out = set()
+            if crashed:
+                # Every in-flight job of a broken pool fails; collect them all before replacing it
+                finished, _ = wait(running)
+                crashed = {f for f in finished if not f.cancelled() and isinstance(f.exception(), BrokenProcessPool)}
+                now = time.perf_counter()
+                timed_out = {f for f in crashed if doc_timeout and now - running[f][2] >= doc_timeout}
+                pool = new_pool(pool)
+            # Blame timed-out documents, or a crash with a single job in flight; requeue everything else
+            dead = timed_out or (crashed if len(crashed) == 1 else set())
+            pending = []
+            for future in finished:
+                path, sig, start, settle_s = running.pop(future)
+                if future.cancelled() or (future in crashed and future not in dead):
+                    observed.pop(path, None)  # Killed along with another document: queue it again
+                    if future in crashed and not timed_out: suspects.add(path)
+                    continue
+                pdf_file, df, timings = os.path.basename(path), None, {"settle_s": settle_s}
+                record = {"file": pdf_file, "status": "empty", "title": None, "outline": []}
+                try:
+                    df, job_timings = future.result()
+                    timings.update(job_timings)
+                except BrokenProcessPool:
+                    if future in timed_out:
+                        record.update(status="error", error="document_timeout",
+                                      issues=[{"reason": "document_timeout", "seconds": doc_timeout}])
+                        print(f"⏱️ {pdf_file}: document_timeout", file=log)
+                    else:
+                        record.update(status="error", error="worker_died")
+                        print(f"❌ {pdf_file}: worker process died", file=log)
+                except Exception as e:
+                    record.update(status="error", error=str(e))
+                    print(f"❌ {pdf_file}: {e}", file=log)
+                done[path] = sig
+                suspects.discard(path)
+                pending.append((pdf_file, df, record, timings, start))
+            flush_pending(pending, model, output_dir, compact, stream, log)
+    except KeyboardInterrupt:
+        print("🛑 Watch mode stopped", file=log, flush=True)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        if stream and stream is not sys.stdout: stream.close()
+
+def run_interactive(pdf_path, output_path="output/result.json", model=None, max_pages=None):
     print("💻 Interactive mode")
-    pdf_path = input("Enter PDF path: ")
+    if pdf_path is None: pdf_path = input("Enter PDF path: ")
     if os.path.exists(pdf_path):
-        df = process_pdf(pdf_path)
+        df = process_pdf(pdf_path, max_pages=max_pages, rules=model is None)
         if not df.empty:
-            titles = df[df["predicted"] == "TITLE"]
-            if len(titles) > 1:
-                max_idx = titles["font_size"].idxmax()
-                df.loc[titles.index, "predicted"] = "H1"
-                df.loc[max_idx, "predicted"] = "TITLE"
-            
-            output = create_output(df)
-            os.makedirs("output", exist_ok=True)
-            with open("output/result.json", 'w') as f:
-                json.dump(output, f, indent=2, ensure_ascii=False)
-            print(f"✅ Saved: {dict(df['predicted'].value_counts())}")
\ No newline at end of file
+            if model is not None: predict_batch(model, [df])
+            df = ensure_single_title(df)
+            write_output(create_output(df), output_path)
+            print(f"✅ Saved: {dict(df['predicted'].value_counts())}")
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF Heading Detection System")
+    parser.add_argument("--input_dir", default="/app/input", help="Directory of PDFs to process (batch/Docker mode)")
+    parser.add_argument("--output_dir", default="/app/output", help="Directory for *_labels.json results")
+    parser.add_argument("--pdf", help="Single PDF to process (interactive mode, skips the prompt)")
+    parser.add_argument("--train", action="store_true", help="Train the RandomForest heading model on sample arXiv papers")
+    parser.add_argument("--stream", help="Append one compact JSON line per processed PDF to this file ('-' for stdout)")
+    parser.add_argument("--compact", action="store_true", help="Write *_labels.json without indentation")
+    parser.add_argument("--prefetch", type=int, default=4, help="PDFs read ahead in the background during batch runs (0 disables)")
+    parser.add_argument("--profile", choices=list(PROFILES), default="balanced", help="Speed/quality profile: page sampling and classifier (fast: first 20 pages, rules; accurate: model)")
+    parser.add_argument("--classifier", choices=["rules", "model"], help="Label with rules only, or with the RandomForest model plus rule overrides (default: from --profile)")
+    parser.add_argument("--max_pages", type=int, help="Only extract the first N pages of each PDF (default: from --profile)")
+    parser.add_argument("--model_path", default="pdf_dataset/heading_model.joblib", help="Where the trained model is cached")
+    parser.add_argument("--batch_docs", type=int, default=16, help="Documents per batched model prediction")
+    parser.add_argument("--watch", action="store_true", help="Keep running and process PDFs as they appear in --input_dir")
+    parser.add_argument("--workers", type=int, default=2, help="Extraction worker processes in watch mode and when a timeout is set")
+    parser.add_argument("--poll_interval", type=float, default=0.5, help="Seconds between input directory scans in watch mode")
+    parser.add_argument("--settle", type=float, default=1.0, help="Seconds a file's size and mtime must stay unchanged before it is processed")
+    parser.add_argument("--doc_timeout", type=float, help="Seconds per PDF before its extraction worker is killed (batch and watch mode)")
+    parser.add_argument("--page_timeout", type=float, help="Seconds per page before its worker is killed and the PDF resumes on the next page (batch mode)")
+    args = parser.parse_args()
+    for key, value in PROFILES[args.profile].items():
+        if getattr(args, key) is None: setattr(args, key, value)
+    
+    model = None
+    log = sys.stderr if args.stream == "-" else sys.stdout  # Keep an NDJSON stream on stdout clean
+    if args.train or args.classifier == "model":
+        model = load_model(args.model_path, retrain=args.train, log=log)
+        if args.classifier == "model" and model is None: print("⚠️ No model available, falling back to rules", file=log)
+    if args.classifier != "model": model = None
+    
+    # Watch vs Docker vs Interactive mode
+    if args.watch:
+        run_watch(args.input_dir, args.output_dir, args.stream, args.compact, model, args.workers, args.poll_interval, args.settle,
+                  args.max_pages, args.doc_timeout)
+    elif args.pdf is None and os.path.isdir(args.input_dir):
+        run_batch(args.input_dir, args.output_dir, args.stream, args.compact, args.prefetch, model, args.batch_docs,
+                  args.workers, args.doc_timeout, args.page_timeout, args.max_pages)
+    else:
+        run_interactive(args.pdf, model=model, max_pages=args.max_pages)
+
+if __name__ == "__main__":
+    main()
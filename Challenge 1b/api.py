@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+In-process library API for the document analyst
+
+A long-lived service creates one PdfAnalyzer and calls it per request; heavy
+modules, the relevance analyzer's caches and the result cache stay warm
+between calls, and nothing goes through files or JSON:
+
+    from api import PdfAnalyzer, AnalystConfig, AnalysisRequest, PdfDocument
+
+    analyzer = PdfAnalyzer(AnalystConfig(profile="fast"))
+    result = analyzer.analyze(AnalysisRequest(
+        persona="Travel Planner",
+        job="Plan a trip of 4 days for a group of 10 college friends",
+        documents=[PdfDocument.from_path("guide.pdf"), PdfDocument("upload.pdf", data=pdf_bytes)]))
+    for section in result.sections:
+        print(section.importance_rank, section.section_title)
+
+Documents are files on disk or PDF bytes already in memory. Results are the
+challenge1b_output.json structure as objects; ``to_dict`` gives the JSON
+form. The CLI options that work on files next to a collection (index,
+checkpoint, outlines, progress stream) are not part of this API.
+"""
+
+import os
+import json
+import time
+import importlib
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Any, Optional, Tuple
+
+from main import DocumentAnalyst, RelevanceAnalyzer, profile_settings, PROFILES
+
+@dataclass
+class AnalystConfig:
+    """Analysis settings; overrides left at None take the profile's value"""
+    profile: str = "balanced"
+    granularity: Optional[str] = None
+    candidate_pages: Optional[int] = None
+    classifier: Optional[str] = None
+    max_features: Optional[int] = None
+    ngram_max: Optional[int] = None
+    top_k: Optional[int] = None
+    vectorizer: str = "tfidf"
+    scoring: str = "sparse"
+    lsa_components: int = 128
+    dedupe: bool = False
+    prefetch_depth: int = 2
+    memory_budget_mb: Optional[float] = None
+    doc_timeout: Optional[float] = None
+    page_timeout: Optional[float] = None
+    extract_workers: Optional[int] = None
+    term_cache_dir: Optional[str] = None
+    # Result cache: in-memory entries (0 disables it), TTL and optional on-disk tier
+    cache_size: int = 128
+    cache_ttl: Optional[float] = None
+    cache_dir: Optional[str] = None
+
+    def analyst_options(self) -> Tuple[Dict[str, Any], Optional[int]]:
+        """DocumentAnalyst keyword arguments and the candidate page count"""
+        if self.profile not in PROFILES:
+            raise ValueError(f"Unknown profile {self.profile!r}, expected one of {', '.join(PROFILES)}")
+        profile = profile_settings(self.profile, granularity=self.granularity,
+                                   candidate_pages=self.candidate_pages, classifier=self.classifier,
+                                   max_features=self.max_features, ngram_max=self.ngram_max, top_k=self.top_k)
+        candidate_pages = profile.pop("candidate_pages")
+        options = {"vectorizer_mode": self.vectorizer, "scoring": self.scoring,
+                   "lsa_components": self.lsa_components, "dedupe": self.dedupe,
+                   "prefetch_depth": self.prefetch_depth, "memory_budget_mb": self.memory_budget_mb,
+                   "doc_timeout": self.doc_timeout, "page_timeout": self.page_timeout,
+                   "extract_workers": self.extract_workers, "term_cache_dir": self.term_cache_dir, **profile}
+        return options, candidate_pages
+
+@dataclass
+class PdfDocument:
+    """One input PDF: a file on disk, or bytes in memory under a document name"""
+    name: str
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+    @classmethod
+    def from_path(cls, path: str) -> "PdfDocument":
+        return cls(os.path.basename(path), path=path)
+
+@dataclass
+class AnalysisRequest:
+    """Persona, job and the documents to analyze"""
+    persona: str
+    job: str
+    documents: List[PdfDocument]
+    challenge_info: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_collection(cls, collection_dir: str) -> "AnalysisRequest":
+        """Request of a collection directory (challenge1b_input.json plus PDFs/), as the CLI reads it"""
+        with open(os.path.join(collection_dir, "challenge1b_input.json"), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        pdf_dir = os.path.join(collection_dir, "PDFs")
+        return cls(persona=config.get("persona", {}).get("role", ""),
+                   job=config.get("job_to_be_done", {}).get("task", ""),
+                   documents=[PdfDocument.from_path(os.path.join(pdf_dir, file))
+                              for file in os.listdir(pdf_dir) if file.lower().endswith('.pdf')],
+                   challenge_info=config.get("challenge_info"))
+
+@dataclass
+class Section:
+    """One ranked section (an extracted_sections entry)"""
+    document: str
+    page_number: int
+    section_title: str
+    importance_rank: int
+    importance_score: float
+    duplicates: List[Dict[str, Any]] = field(default_factory=list)
+
+@dataclass
+class Subsection:
+    """Refined text of one ranked section (a subsection_analysis entry)"""
+    document: str
+    section_title: str
+    refined_text: str
+    page_number: int
+    relevance_score: float
+
+@dataclass
+class AnalysisResult:
+    """Analysis output: metadata, ranked sections and their refined texts"""
+    metadata: Dict[str, Any]
+    sections: List[Section]
+    subsections: List[Subsection]
+
+    @classmethod
+    def from_dict(cls, output: Dict[str, Any]) -> "AnalysisResult":
+        return cls(metadata=output["metadata"],
+                   sections=[Section(**section) for section in output["extracted_sections"]],
+                   subsections=[Subsection(**subsection) for subsection in output["subsection_analysis"]])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The challenge1b_output.json structure"""
+        sections = []
+        for section in self.sections:
+            extracted = asdict(section)
+            if not extracted["duplicates"]:
+                del extracted["duplicates"]
+            sections.append(extracted)
+        return {
+            "metadata": self.metadata,
+            "extracted_sections": sections,
+            "subsection_analysis": [asdict(subsection) for subsection in self.subsections],
+        }
+
+class PdfAnalyzer:
+    """Warm in-process analyzer, reused across requests
+
+    Every request gets its own DocumentAnalyst (an analyst holds the state
+    of the analysis it runs and refuses a second one at the same time); the
+    relevance analyzer and the result cache are shared, so concurrent calls
+    from several threads are safe.
+    """
+
+    def __init__(self, config: AnalystConfig = None, warm: bool = True):
+        self.config = config or AnalystConfig()
+        self.options, self.candidate_pages = self.config.analyst_options()
+        self.result_cache = None
+        if self.config.cache_size or self.config.cache_dir:
+            from result_cache import ResultCache
+
+            self.result_cache = ResultCache(max_entries=self.config.cache_size, ttl_seconds=self.config.cache_ttl,
+                                            cache_dir=self.config.cache_dir)
+        self.analyzer = RelevanceAnalyzer(mode=self.options["vectorizer_mode"],
+                                          term_cache_dir=self.options["term_cache_dir"],
+                                          scoring=self.options["scoring"],
+                                          lsa_components=self.options["lsa_components"],
+                                          max_features=self.options["max_features"],
+                                          ngram_max=self.options["ngram_max"])
+        if warm:
+            self.warm_up()
+
+    @staticmethod
+    def warm_up():
+        """Import the heavy dependencies now instead of in the first request"""
+        for module in ("fitz", "numpy", "pandas", "sklearn.ensemble", "sklearn.feature_extraction.text"):
+            importlib.import_module(module)
+
+    def analyze(self, request: AnalysisRequest) -> AnalysisResult:
+        """Analyze one request's documents"""
+        names = [document.name for document in request.documents]
+        if not names:
+            raise ValueError("No documents to analyze")
+        if len(set(names)) != len(names):
+            raise ValueError("Document names must be unique")
+
+        pdf_paths, pdf_data = [], {}
+        for document in request.documents:
+            if document.data is not None:
+                pdf_paths.append(document.name)
+                pdf_data[document.name] = document.data
+            elif document.path is not None:
+                pdf_paths.append(document.path)
+            else:
+                raise ValueError(f"Document {document.name} has neither data nor a path")
+
+        # Never reuse an analyst across requests: it holds this request's PDFs, issues and timings
+        analyst = DocumentAnalyst(result_cache=self.result_cache, analyzer=self.analyzer, **self.options)
+        start_time = time.perf_counter()
+        output = analyst.analyze_documents(pdf_paths, request.persona, request.job,
+                                           candidate_pages=self.candidate_pages, pdf_data=pdf_data)
+        output["metadata"]["processing_time_seconds"] = round(time.perf_counter() - start_time, 2)
+        if request.challenge_info is not None:
+            output["metadata"]["challenge_info"] = request.challenge_info
+        return AnalysisResult.from_dict(output)
+
+    def analyze_collection(self, collection_dir: str) -> AnalysisResult:
+        """Analyze a collection directory without writing its output file"""
+        return self.analyze(AnalysisRequest.from_collection(collection_dir))
@@ -0,0 +1,615 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the Challenge 1a/1b pipelines
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import contextlib
+import statistics
+import subprocess
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ENTRY_POINTS = {
+    "challenge1b": os.path.join(HERE, "main.py"),
+    "challenge1a": os.path.join(HERE, "..", "Challenge 1a", "src", "main.py"),
+}
+# Time limit per collection of the challenge
+COLLECTION_BUDGET_SECONDS = 60
+# Regressions smaller than these are treated as measurement noise
+REGRESSION_SLACK_SECONDS = 0.5
+REGRESSION_SLACK_MB = 32
+# Vocabulary of synthetic collections: each document favors one topic
+SYNTHETIC_TOPICS = {
+    "travel": "beach hotel itinerary coast museum train tour nightlife market festival hostel old town".split(),
+    "food": "vegetarian menu buffet recipe dinner gluten salad catering lunch dessert ingredients wine".split(),
+    "forms": "fillable form signature acrobat export pdf field onboarding compliance document share".split(),
+    "finance": "budget revenue invoice expense quarterly forecast audit tax payroll cost report".split(),
+}
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the pipeline's progress prints, so stdout only carries the benchmark's own lines"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def time_command(cmd, runs: int) -> list:
+    """Run a command several times and return wall times in seconds"""
+    timings = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run(cmd, capture_output=True, text=True)
+        timings.append(time.perf_counter() - start_time)
+    return timings
+
+def bench_startup(runs: int = 5) -> dict:
+    """Measure CLI startup (--help) and bare import time of each entry point"""
+    print("🧪 Benchmarking CLI startup")
+    results = {}
+
+    for name, path in ENTRY_POINTS.items():
+        if not os.path.exists(path):
+            print(f"⚠️  {name}: {path} not found, skipping")
+            continue
+
+        help_times = time_command([sys.executable, path, "--help"], runs)
+        import_code = (
+            "import importlib.util, sys; "
+            f"spec = importlib.util.spec_from_file_location('entry', {path!r}); "
+            "spec.loader.exec_module(importlib.util.module_from_spec(spec))"
+        )
+        import_times = time_command([sys.executable, "-c", import_code], runs)
+        baseline_times = time_command([sys.executable, "-c", "pass"], runs)
+
+        results[name] = {
+            "help_median_seconds": round(statistics.median(help_times), 4),
+            "import_median_seconds": round(statistics.median(import_times), 4),
+            "interpreter_median_seconds": round(statistics.median(baseline_times), 4),
+        }
+        print(f"⏱️  {name}: --help {results[name]['help_median_seconds']:.3f}s, "
+              f"import {results[name]['import_median_seconds']:.3f}s "
+              f"(bare interpreter {results[name]['interpreter_median_seconds']:.3f}s)")
+
+    return results
+
+def list_pdfs(input_dir: str) -> list:
+    """PDF paths in a directory, sorted"""
+    return sorted(os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.lower().endswith('.pdf'))
+
+def section_key(section: dict) -> tuple:
+    from span_text import text_of
+
+    return (section['document'], section['page'], text_of(section['title_ref']))
+
+def ranking_agreement(reference: list, candidate: list) -> dict:
+    """Top-k overlap and rank correlation of two ranked section lists"""
+    reference_keys = [section_key(s) for s in reference]
+    candidate_keys = [section_key(s) for s in candidate]
+    overlap = len(set(reference_keys) & set(candidate_keys)) / len(reference_keys) if reference_keys else 1.0
+    return {
+        "top_k_overlap": round(overlap, 4),
+        "same_order": reference_keys == candidate_keys,
+    }
+
+def bench_lsa(input_dir: str, persona: str, job: str, components: int = 128,
+              queries: int = 5, top_k: int = 10) -> dict:
+    """Compare sparse cosine scoring with LSA embedding scoring"""
+    import main as analyst_main
+
+    print("🧪 Benchmarking LSA vs sparse relevance scoring")
+    pdf_paths = list_pdfs(input_dir)
+    if not pdf_paths:
+        print(f"❌ No PDF files found in {input_dir}")
+        return {}
+
+    analyst = analyst_main.DocumentAnalyst()
+    with quiet():
+        spans, texts = analyst.extract_spans(pdf_paths)
+    results = {"documents": len(pdf_paths), "spans": len(spans)}
+    rankings = {}
+
+    for scoring in ("sparse", "lsa"):
+        analyzer = analyst_main.RelevanceAnalyzer(scoring=scoring, lsa_components=components)
+        timings = []
+        for _ in range(queries):
+            start_time = time.perf_counter()
+            df = analyzer.calculate_relevance(spans, persona, job, texts=texts)
+            timings.append(time.perf_counter() - start_time)
+
+        sections = analyst.group_into_sections(df, texts)
+        rankings[scoring] = (df['relevance_score'], analyst.rank_sections(sections, top_k))
+        results[scoring] = {
+            "first_query_seconds": round(timings[0], 4),
+            "warm_query_median_seconds": round(statistics.median(timings[1:] or timings), 4),
+        }
+        print(f"⏱️  {scoring}: first query {timings[0]:.3f}s, "
+              f"warm median {results[scoring]['warm_query_median_seconds']:.4f}s")
+
+    agreement = ranking_agreement(rankings["sparse"][1], rankings["lsa"][1])
+    agreement["span_score_spearman"] = round(
+        float(rankings["sparse"][0].corr(rankings["lsa"][0], method="spearman")), 4)
+    results["agreement"] = agreement
+    print(f"📊 Top-{top_k} overlap {agreement['top_k_overlap']:.0%}, "
+          f"span score Spearman {agreement['span_score_spearman']:.3f}")
+    return results
+
+def bench_concurrent(input_dir: str, persona: str, job: str, threads: int = 4,
+                     queries: int = 16, scoring: str = "sparse") -> dict:
+    """Serve queries from one shared RelevanceAnalyzer, serially and from a thread pool"""
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+    import main as analyst_main
+
+    print(f"🧪 Benchmarking {queries} concurrent queries on {threads} threads")
+    pdf_paths = list_pdfs(input_dir)
+    if not pdf_paths:
+        print(f"❌ No PDF files found in {input_dir}")
+        return {}
+
+    with quiet():
+        spans, texts = analyst_main.DocumentAnalyst().extract_spans(pdf_paths)
+    words = job.split()
+    # Distinct queries: rotate the job description so each one is scored separately
+    jobs = [" ".join(words[i % len(words):] + words[:i % len(words)]) for i in range(queries)]
+    analyzer = analyst_main.RelevanceAnalyzer(scoring=scoring)
+
+    def score(query_job):
+        return analyzer.relevance_scores(spans, persona, query_job, texts=texts)["combined_score"]
+
+    score(jobs[0])  # Warm up imports and shared caches outside the timings
+    start_time = time.perf_counter()
+    serial = [score(j) for j in jobs]
+    serial_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        concurrent = list(pool.map(score, jobs))
+    concurrent_seconds = time.perf_counter() - start_time
+
+    identical = all(np.array_equal(a, b) for a, b in zip(serial, concurrent))
+    results = {
+        "documents": len(pdf_paths),
+        "spans": len(spans),
+        "serial_seconds": round(serial_seconds, 4),
+        "concurrent_seconds": round(concurrent_seconds, 4),
+        "speedup": round(serial_seconds / concurrent_seconds, 2) if concurrent_seconds else None,
+        "identical_scores": identical,
+        "input_unchanged": "combined_score" not in spans.columns,
+    }
+    print(f"⏱️  serial {serial_seconds:.3f}s, {threads} threads {concurrent_seconds:.3f}s "
+          f"({results['speedup']}x), identical scores: {identical}")
+    return results
+
+def bench_shards(input_dir: str, persona: str, job: str, shard_counts: list = (2, 4),
+                 queries: int = 3, top_k: int = 10) -> dict:
+    """Score an indexed collection unsharded and with scatter-gather over shards"""
+    import tempfile
+    import main as analyst_main
+
+    print(f"🧪 Benchmarking sharded scoring with {', '.join(map(str, shard_counts))} shards")
+    pdf_paths = list_pdfs(input_dir)
+    if not pdf_paths:
+        print(f"❌ No PDF files found in {input_dir}")
+        return {}
+
+    def timed(analyst, index, score):
+        timings = []
+        for _ in range(queries):
+            start_time = time.perf_counter()
+            with quiet():
+                ranking = score(analyst, index)
+            timings.append(time.perf_counter() - start_time)
+        return ranking, round(statistics.median(timings), 4)
+
+    def unsharded(analyst, index):
+        texts = index.span_texts()
+        df = analyst.analyzer.calculate_relevance(index.to_frame(), persona, job, index=index, texts=texts)
+        sections = analyst.group_into_sections(df, texts)
+        return len(sections), analyst.rank_sections(sections, top_k)
+
+    def sharded(analyst, index):
+        return analyst.analyze_sharded(index, persona, job, top_k)
+
+    with tempfile.TemporaryDirectory(prefix="bench-shards-") as tmp_dir:
+        index_dir = os.path.join(tmp_dir, analyst_main.INDEX_DIRNAME)
+        analyst = analyst_main.DocumentAnalyst(granularity="span")
+        with quiet():
+            index = analyst.load_index(pdf_paths, index_dir)
+        (total, reference), seconds = timed(analyst, index, unsharded)
+        results = {"documents": len(pdf_paths), "spans": index.n_spans, "sections": total,
+                   "unsharded_seconds": seconds, "shards": {}}
+        print(f"⏱️  unsharded: {seconds:.3f}s")
+
+        for n in shard_counts:
+            with quiet():
+                analyst = analyst_main.DocumentAnalyst(shards=n)
+                index = analyst.load_index(pdf_paths, index_dir)
+            (total, ranking), seconds = timed(analyst, index, sharded)
+            identical = total == results["sections"] and [
+                (section_key(s), s['importance_score']) for s in ranking] == [
+                (section_key(s), s['importance_score']) for s in reference]
+            results["shards"][n] = {
+                "seconds": seconds,
+                "speedup": round(results["unsharded_seconds"] / seconds, 2) if seconds else None,
+                "identical_ranking": identical,
+            }
+            print(f"⏱️  {n} shards: {seconds:.3f}s ({results['shards'][n]['speedup']}x), "
+                  f"identical ranking: {identical}")
+    return results
+
+def output_agreement(reference: list, candidate: list) -> dict:
+    """Ranking agreement of two extracted_sections lists, at the shorter list's depth"""
+    depth = min(len(reference), len(candidate))
+    reference_keys = [(s['document'], s['page_number'], s['section_title']) for s in reference[:depth]]
+    candidate_keys = [(s['document'], s['page_number'], s['section_title']) for s in candidate[:depth]]
+    overlap = len(set(reference_keys) & set(candidate_keys)) / depth if depth else 1.0
+    return {"depth": depth, "top_k_overlap": round(overlap, 4), "same_order": reference_keys == candidate_keys}
+
+def outline_agreement(reference: dict, candidate: dict) -> dict:
+    """Heading F1 and title match of two Challenge 1a outlines"""
+    def headings(outline):
+        return {(e['level'], e['text'], e['page']) for e in outline['outline'] if e['level'] != 'P'}
+
+    expected, found = headings(reference), headings(candidate)
+    matched = len(expected & found)
+    precision = matched / len(found) if found else 1.0
+    recall = matched / len(expected) if expected else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"heading_f1": f1, "title_match": reference['title'] == candidate['title']}
+
+def bench_profiles_1b(input_dir: str, persona: str, job: str, runs: int = 3) -> dict:
+    """Latency of each Challenge 1b profile and its ranking agreement with the accurate profile"""
+    import main as analyst_main
+
+    pdf_paths = list_pdfs(input_dir)
+    results, outputs = {}, {}
+    for name in ["accurate", "balanced", "fast"]:
+        options = analyst_main.profile_settings(name)
+        candidate_pages = options.pop("candidate_pages")
+        timings = []
+        for _ in range(runs + 1):
+            # A fresh analyst per run, so no run reuses another's fitted models
+            analyst = analyst_main.DocumentAnalyst(**options)
+            with quiet():
+                start_time = time.perf_counter()
+                outputs[name] = analyst.analyze_documents(pdf_paths, persona, job, candidate_pages=candidate_pages)
+                timings.append(time.perf_counter() - start_time)
+        results[name] = {"median_seconds": round(statistics.median(timings[1:]), 4)}
+
+    for name, result in results.items():
+        result["speedup"] = round(results["accurate"]["median_seconds"] / result["median_seconds"], 2)
+        result.update(output_agreement(outputs["accurate"]["extracted_sections"], outputs[name]["extracted_sections"]))
+    return results
+
+def bench_profiles_1a(input_dir: str, runs: int = 3, model_path: str = "pdf_dataset/heading_model.joblib") -> dict:
+    """Latency of each Challenge 1a profile and its outline agreement with the accurate profile
+
+    A cached heading model is used if present; the benchmark never trains
+    (or downloads) one, so without it "accurate" labels with rules.
+    """
+    import importlib.util
+
+    spec = importlib.util.spec_from_file_location("challenge1a_main", ENTRY_POINTS["challenge1a"])
+    pipeline = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(pipeline)
+    model = pipeline.load_model(model_path) if os.path.exists(model_path) else None
+
+    pdf_paths = list_pdfs(input_dir)
+    results, outlines = {}, {}
+    for name in ["accurate", "balanced", "fast"]:
+        profile = pipeline.PROFILES[name]
+        profile_model = model if profile["classifier"] == "model" else None
+        timings = []
+        for _ in range(runs + 1):
+            start_time = time.perf_counter()
+            outlines[name] = []
+            for pdf_path in pdf_paths:
+                df = pipeline.process_pdf(pdf_path, max_pages=profile["max_pages"], rules=profile_model is None)
+                if not df.empty and profile_model is not None:
+                    pipeline.predict_batch(profile_model, [df])
+                outlines[name].append(pipeline.create_output(pipeline.ensure_single_title(df) if not df.empty else df))
+            timings.append(time.perf_counter() - start_time)
+        results[name] = {"median_seconds": round(statistics.median(timings[1:]), 4),
+                         "model": profile_model is not None}
+
+    for name, result in results.items():
+        result["speedup"] = round(results["accurate"]["median_seconds"] / result["median_seconds"], 2)
+        agreements = [outline_agreement(a, b) for a, b in zip(outlines["accurate"], outlines[name])]
+        result["heading_f1"] = round(statistics.mean(a["heading_f1"] for a in agreements), 4) if agreements else 1.0
+        result["title_match"] = sum(a["title_match"] for a in agreements) / len(agreements) if agreements else 1.0
+    return results
+
+def bench_profiles(pipeline: str, input_dir: str, persona: str = None, job: str = None, runs: int = 3,
+                   model_path: str = None) -> dict:
+    """Evaluation report of the fast/balanced/accurate profiles of one pipeline
+
+    Every profile gets one untimed warm-up run (imports, page cache) before
+    ``runs`` timed ones.
+    """
+    print(f"🧪 Benchmarking Challenge {pipeline} profiles over {runs} runs")
+    if not list_pdfs(input_dir):
+        print(f"❌ No PDF files found in {input_dir}")
+        return {}
+    if pipeline == "1b":
+        results = bench_profiles_1b(input_dir, persona, job, runs)
+    else:
+        results = bench_profiles_1a(input_dir, runs, model_path)
+
+    for name, result in results.items():
+        agreement = (f"top-{result['depth']} overlap {result['top_k_overlap']:.0%}, same order: {result['same_order']}"
+                     if pipeline == "1b" else
+                     f"heading F1 {result['heading_f1']:.3f}, titles {result['title_match']:.0%}")
+        print(f"⏱️  {name}: {result['median_seconds']:.3f}s ({result['speedup']}x), {agreement}")
+    return results
+
+def make_collection(collection_dir: str, documents: int, pages: int, spans_per_page: int,
+                    persona_words: int, seed: int = 0) -> str:
+    """Write a synthetic collection (PDFs/ and challenge1b_input.json) with PyMuPDF
+
+    Every page has a bold title, bold subheadings every six spans and body
+    lines in between; the line height shrinks so ``spans_per_page`` lines fit.
+    The input JSON is written last, so an existing one marks a complete
+    collection that is reused as is.
+    """
+    import fitz
+
+    input_file = os.path.join(collection_dir, "challenge1b_input.json")
+    if os.path.exists(input_file):
+        return collection_dir
+
+    rng = random.Random(seed)
+    topics = list(SYNTHETIC_TOPICS)
+    vocabulary = [word for words in SYNTHETIC_TOPICS.values() for word in words]
+    pdf_dir = os.path.join(collection_dir, "PDFs")
+    os.makedirs(pdf_dir, exist_ok=True)
+    line_height = max(6.0, min(14.0, 700.0 / max(spans_per_page, 1)))
+
+    filenames = []
+    for d in range(documents):
+        topic = topics[d % len(topics)]
+        words = SYNTHETIC_TOPICS[topic] * 3 + vocabulary
+        doc = fitz.open()
+        for p in range(pages):
+            page = doc.new_page()
+            page.insert_text((72, 60), f"{topic.title()} Guide {d} Part {p + 1}", fontsize=18, fontname="hebo")
+            y = 60 + 28
+            for s in range(spans_per_page):
+                if s % 6 == 0:
+                    text = " ".join(rng.choice(words) for _ in range(3)).title()
+                    page.insert_text((72, y), text, fontsize=line_height * 0.9, fontname="hebo")
+                else:
+                    text = " ".join(rng.choice(words) for _ in range(rng.randint(8, 12))).capitalize() + "."
+                    page.insert_text((72, y), text, fontsize=line_height * 0.7, fontname="helv")
+                y += line_height
+        filename = f"{topic}_{d:04d}.pdf"
+        doc.save(os.path.join(pdf_dir, filename))
+        doc.close()
+        filenames.append(filename)
+
+    config = {
+        "challenge_info": {"challenge_id": "synthetic", "test_case_name": os.path.basename(collection_dir)},
+        "documents": [{"filename": f, "title": os.path.splitext(f)[0]} for f in filenames],
+        "persona": {"role": " ".join(rng.choice(vocabulary) for _ in range(persona_words)).title()},
+        "job_to_be_done": {"task": "Prepare " + " ".join(rng.choice(vocabulary) for _ in range(8))},
+    }
+    with open(input_file, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+    return collection_dir
+
+def _scaling_run(collection_dir: str, profile: str) -> dict:
+    """One analysis of a collection, run in a fresh process: stage timings and peak RSS"""
+    import resource
+    import main as analyst_main
+    from api import PdfAnalyzer, AnalysisRequest
+    from span_spill import current_rss
+
+    PdfAnalyzer.warm_up()  # Imports are measured by the startup benchmark
+    request = AnalysisRequest.from_collection(collection_dir)
+    options = analyst_main.profile_settings(profile)
+    candidate_pages = options.pop("candidate_pages")
+    analyst = analyst_main.DocumentAnalyst(**options)
+    rss_before = current_rss()
+
+    with quiet():
+        start_time = time.perf_counter()
+        output = analyst.analyze_documents(sorted(d.path for d in request.documents), request.persona, request.job,
+                                           candidate_pages=candidate_pages)
+        seconds = time.perf_counter() - start_time
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = peak if sys.platform == "darwin" else peak * 1024
+    mb = float(1 << 20)
+    return {
+        "seconds": round(seconds, 4),
+        "stage_seconds": {stage: round(t, 4) for stage, t in analyst.stage_seconds.items()},
+        "peak_rss_mb": round(peak / mb, 1),
+        "start_rss_mb": round(rss_before / mb, 1),
+        "sections": output["metadata"]["total_sections_found"],
+    }
+
+def scaling_exponent(points: list) -> float:
+    """Slope of log(seconds) over log(documents): 1.0 is linear scaling"""
+    xs = [math.log(documents) for documents, _ in points]
+    ys = [math.log(max(seconds, 1e-6)) for _, seconds in points]
+    x_mean, y_mean = statistics.mean(xs), statistics.mean(ys)
+    variance = sum((x - x_mean) ** 2 for x in xs)
+    return sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) / variance if variance else 0.0
+
+def scaling_failures(runs: list, baseline_runs: dict, max_regression: float, budget: float) -> list:
+    """Runs over the per-collection budget, or slower / larger than their baseline run"""
+    failures = []
+    for run in runs:
+        if run["seconds"] > budget:
+            failures.append(f"{run['config']}: {run['seconds']:.1f}s exceeds the {budget:g}s budget")
+        base = baseline_runs.get(run["config"])
+        if base is None:
+            continue
+        if run["seconds"] > base["seconds"] * (1 + max_regression) + REGRESSION_SLACK_SECONDS:
+            failures.append(f"{run['config']}: {run['seconds']:.2f}s vs {base['seconds']:.2f}s in the baseline")
+        if run["peak_rss_mb"] > base["peak_rss_mb"] * (1 + max_regression) + REGRESSION_SLACK_MB:
+            failures.append(f"{run['config']}: peak RSS {run['peak_rss_mb']:.0f} MB vs "
+                            f"{base['peak_rss_mb']:.0f} MB in the baseline")
+    return failures
+
+def bench_scaling(documents: list = (1, 10, 50, 100, 250, 500), pages: list = (4,), spans_per_page: list = (30,),
+                  persona_words: list = (3,), profile: str = "balanced", runs: int = 1, work_dir: str = None,
+                  baseline: str = None, max_regression: float = 0.25,
+                  budget: float = COLLECTION_BUDGET_SECONDS) -> dict:
+    """Scaling curves of DocumentAnalyst over synthetic collections
+
+    Every combination of the size parameters is generated once (and kept in
+    ``work_dir`` if given) and analyzed ``runs`` times, each run in a fresh
+    process so peak RSS belongs to that collection alone. Failures list runs
+    over ``budget`` seconds and, with a ``baseline`` report, runs more than
+    ``max_regression`` slower or larger than the same configuration there.
+    """
+    import shutil
+    import tempfile
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    print(f"🧪 Benchmarking scaling of the {profile} profile over {', '.join(map(str, documents))} documents")
+    baseline_runs = {}
+    if baseline:
+        with open(baseline, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        baseline_runs = {run["config"]: run for run in report.get("scaling", report)["runs"]}
+
+    own_work_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="bench-scaling-")
+    context = multiprocessing.get_context("spawn")
+    results = {"profile": profile, "budget_seconds": budget, "max_regression": max_regression,
+               "runs": [], "scaling_exponents": {}}
+    try:
+        for n_pages in pages:
+            for n_spans in spans_per_page:
+                for n_words in persona_words:
+                    curve = f"p{n_pages}-s{n_spans}-w{n_words}"
+                    points = []
+                    for n_docs in sorted(documents):
+                        collection_dir = make_collection(os.path.join(work_dir, f"d{n_docs}-{curve}"),
+                                                         n_docs, n_pages, n_spans, n_words)
+                        measurements = []
+                        for _ in range(runs):
+                            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                                measurements.append(pool.submit(_scaling_run, collection_dir, profile).result())
+                        # The run with the median time represents the configuration
+                        measurements.sort(key=lambda m: m["seconds"])
+                        run = dict(measurements[len(measurements) // 2], config=f"d{n_docs}-{curve}-{profile}",
+                                   documents=n_docs, pages=n_pages, spans_per_page=n_spans, persona_words=n_words)
+                        run["seconds_per_document"] = round(run["seconds"] / n_docs, 4)
+                        results["runs"].append(run)
+                        points.append((n_docs, run["seconds"]))
+                        stages = ", ".join(f"{stage} {t:.2f}s" for stage, t in run["stage_seconds"].items())
+                        print(f"⏱️  {n_docs:>4} docs x {n_pages} pages x {n_spans} spans: {run['seconds']:.2f}s "
+                              f"({stages}), peak RSS {run['peak_rss_mb']:.0f} MB")
+                    if len(points) > 1:
+                        results["scaling_exponents"][curve] = round(scaling_exponent(points), 3)
+                        print(f"📈 {curve}: time grows as documents^{results['scaling_exponents'][curve]:.2f}")
+    finally:
+        if own_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results["failures"] = scaling_failures(results["runs"], baseline_runs, max_regression, budget)
+    for failure in results["failures"]:
+        print(f"❌ {failure}")
+    if not results["failures"]:
+        print("✅ Every collection within budget" + (" and baseline" if baseline_runs else ""))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the PDF analysis pipelines")
+    subparsers = parser.add_subparsers(dest="command")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--report", help="Write results to this JSON file")
+
+    startup_parser = subparsers.add_parser("startup", parents=[common], help="Measure CLI startup and import time")
+    startup_parser.add_argument("--runs", type=int, default=5, help="Repetitions per measurement")
+
+    lsa_parser = subparsers.add_parser("lsa", parents=[common], help="Compare LSA and sparse relevance scoring")
+    lsa_parser.add_argument("--input_dir", required=True, help="Directory containing PDF files")
+    lsa_parser.add_argument("--persona", required=True, help="Persona description")
+    lsa_parser.add_argument("--job", required=True, help="Job to be done")
+    lsa_parser.add_argument("--components", type=int, default=128, help="LSA embedding dimension")
+    lsa_parser.add_argument("--queries", type=int, default=5, help="Repeated queries per scoring mode")
+
+    concurrent_parser = subparsers.add_parser("concurrent", parents=[common],
+                                              help="Score queries concurrently with one shared analyzer")
+    concurrent_parser.add_argument("--input_dir", required=True, help="Directory containing PDF files")
+    concurrent_parser.add_argument("--persona", required=True, help="Persona description")
+    concurrent_parser.add_argument("--job", required=True, help="Job to be done")
+    concurrent_parser.add_argument("--threads", type=int, default=4, help="Thread pool size")
+    concurrent_parser.add_argument("--queries", type=int, default=16, help="Number of distinct queries")
+    concurrent_parser.add_argument("--scoring", choices=["sparse", "lsa"], default="sparse", help="Scoring mode")
+
+    shards_parser = subparsers.add_parser("shards", parents=[common],
+                                          help="Compare unsharded and sharded scatter-gather scoring")
+    shards_parser.add_argument("--input_dir", required=True, help="Directory containing PDF files")
+    shards_parser.add_argument("--persona", required=True, help="Persona description")
+    shards_parser.add_argument("--job", required=True, help="Job to be done")
+    shards_parser.add_argument("--shards", type=int, nargs="+", default=[2, 4], help="Shard counts to compare")
+    shards_parser.add_argument("--queries", type=int, default=3, help="Repeated queries per configuration")
+
+    profiles_parser = subparsers.add_parser("profiles", parents=[common],
+                                            help="Latency and agreement with 'accurate' of every profile")
+    profiles_parser.add_argument("--pipeline", choices=["1a", "1b"], default="1b", help="Pipeline to evaluate")
+    profiles_parser.add_argument("--input_dir", required=True, help="Directory containing PDF files")
+    profiles_parser.add_argument("--persona", help="Persona description (1b)")
+    profiles_parser.add_argument("--job", help="Job to be done (1b)")
+    profiles_parser.add_argument("--runs", type=int, default=3, help="Repetitions per profile")
+    profiles_parser.add_argument("--model_path", default="pdf_dataset/heading_model.joblib",
+                                 help="Cached Challenge 1a heading model (1a)")
+
+    scaling_parser = subparsers.add_parser("scaling", parents=[common],
+                                           help="Scaling curves, stage timings and peak memory on synthetic collections")
+    scaling_parser.add_argument("--documents", type=int, nargs="+", default=[1, 10, 50, 100, 250, 500],
+                                help="Document counts of the scaling curve")
+    scaling_parser.add_argument("--pages", type=int, nargs="+", default=[4], help="Pages per document")
+    scaling_parser.add_argument("--spans_per_page", type=int, nargs="+", default=[30], help="Text lines per page")
+    scaling_parser.add_argument("--persona_words", type=int, nargs="+", default=[3], help="Words in the persona")
+    scaling_parser.add_argument("--profile", default="balanced", help="Challenge 1b profile to run")
+    scaling_parser.add_argument("--runs", type=int, default=1, help="Repetitions per collection (median time)")
+    scaling_parser.add_argument("--work_dir", help="Keep and reuse the generated collections in this directory")
+    scaling_parser.add_argument("--baseline", help="Earlier scaling --report to compare against")
+    scaling_parser.add_argument("--max_regression", type=float, default=0.25,
+                                help="Allowed slowdown or memory growth over the baseline (0.25 = 25%%)")
+    scaling_parser.add_argument("--budget", type=float, default=COLLECTION_BUDGET_SECONDS,
+                                help="Seconds allowed per collection")
+
+    args = parser.parse_args()
+
+    if args.command == "startup":
+        results = bench_startup(args.runs)
+    elif args.command == "lsa":
+        results = bench_lsa(args.input_dir, args.persona, args.job, args.components, args.queries)
+    elif args.command == "concurrent":
+        results = bench_concurrent(args.input_dir, args.persona, args.job, args.threads,
+                                   args.queries, args.scoring)
+    elif args.command == "profiles":
+        if args.pipeline == "1b" and not (args.persona and args.job):
+            parser.error("profiles --pipeline 1b needs --persona and --job")
+        results = bench_profiles(args.pipeline, args.input_dir, args.persona, args.job, args.runs, args.model_path)
+    elif args.command == "shards":
+        results = bench_shards(args.input_dir, args.persona, args.job, args.shards, args.queries)
+    elif args.command == "scaling":
+        results = bench_scaling(args.documents, args.pages, args.spans_per_page, args.persona_words, args.profile,
+                                args.runs, args.work_dir, args.baseline, args.max_regression, args.budget)
+    else:
+        parser.print_help()
+        return
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({"benchmark_run": datetime.now().isoformat(), args.command: results}, f, indent=2)
+        print(f"💾 Benchmark report saved to: {args.report}")
+    if args.command == "scaling" and results["failures"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
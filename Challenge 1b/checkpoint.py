@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Checkpoint journal for multi-collection runs
+
+The journal directory holds an append-only ``journal.jsonl`` and the span
+extraction result of every finished document:
+
+    journal.jsonl               one JSON record per finished document or collection
+    documents/<key>.json.gz     extracted spans of one document
+
+Document keys hash the PDF content and the extracted page selection;
+collection keys hash the input configuration, every PDF's content and the
+analysis settings. A record is appended only after the files it refers to
+are completely written, and a torn last line from an interrupted run is
+dropped, so a resumed run skips exactly the work that finished.
+"""
+
+import os
+import gzip
+import json
+import shutil
+import hashlib
+import tempfile
+from typing import List, Dict, Any, Optional
+
+JOURNAL_VERSION = 1
+
+class CheckpointJournal:
+    """Finished documents and collections of a run, keyed by content hashes"""
+
+    def __init__(self, journal_dir: str, resume: bool = False):
+        self.journal_dir = journal_dir
+        self.documents_dir = os.path.join(journal_dir, "documents")
+        self.journal_path = os.path.join(journal_dir, "journal.jsonl")
+        self.documents = {}    # document key -> spans file
+        self.collections = {}  # collection name -> record
+
+        if not resume and os.path.exists(journal_dir):
+            shutil.rmtree(journal_dir)
+        os.makedirs(self.documents_dir, exist_ok=True)
+        if resume:
+            self._load()
+
+    def _load(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'rb') as f:
+            content = f.read()
+        complete = content.rfind(b"\n") + 1
+        if complete < len(content):
+            # Drop a torn last record from an interrupted run before appending to the journal
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(complete)
+
+        for line in content[:complete].decode("utf-8").splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("version") != JOURNAL_VERSION:
+                continue
+            if record["type"] == "document" and os.path.exists(record["file"]):
+                self.documents[record["key"]] = record["file"]
+            elif record["type"] == "collection":
+                self.collections[record["collection"]] = record
+
+    def _append(self, record: Dict[str, Any]):
+        record = dict(record, version=JOURNAL_VERSION)
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def content_hash(self, path: str) -> str:
+        """SHA-256 of a file (memoized, see content_sha256)"""
+        from collection_index import content_sha256
+
+        return content_sha256(path)
+
+    def document_key(self, pdf_path: str, pages: set = None) -> str:
+        """Key of one document's extraction: file name, PDF content and page selection
+
+        The name is part of the key because the stored spans carry it, so
+        identical copies under different names are journaled separately.
+        """
+        pages = sorted(pages) if pages is not None else None
+        payload = json.dumps([os.path.basename(pdf_path), self.content_hash(pdf_path), pages])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def collection_key(self, input_file: str, pdf_paths: List[str], settings: Dict[str, Any]) -> str:
+        """Key of one collection run: input config, PDF contents and settings"""
+        payload = {
+            "input": self.content_hash(input_file),
+            "documents": sorted([os.path.basename(p), self.content_hash(p)] for p in pdf_paths),
+            "settings": settings,
+        }
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def has_document(self, key: str) -> bool:
+        return key in self.documents
+
+    def document_spans(self, key: str) -> Optional[List[Dict]]:
+        """Spans of a finished document, or None"""
+        if key not in self.documents:
+            return None
+        try:
+            with gzip.open(self.documents[key], 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            del self.documents[key]
+            return None
+
+    def record_document(self, key: str, document: str, spans: List[Dict]):
+        """Store a finished document's spans and journal it"""
+        path = os.path.join(self.documents_dir, f"{key}.json.gz")
+        fd, tmp_path = tempfile.mkstemp(prefix=".doc-", suffix=".tmp", dir=self.documents_dir)
+        with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+            json.dump(spans, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.documents[key] = path
+        self._append({"type": "document", "key": key, "document": document, "file": path})
+
+    def collection_done(self, collection: str, key: str) -> bool:
+        """True if this collection finished with the same key and its output still exists"""
+        record = self.collections.get(collection)
+        return bool(record and record["key"] == key and os.path.exists(record["output"]))
+
+    def record_collection(self, collection: str, key: str, output_file: str):
+        """Journal a finished collection"""
+        record = {"type": "collection", "collection": collection, "key": key, "output": output_file}
+        self.collections[collection] = record
+        self._append(record)
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+On-disk collection index shared across worker processes
+
+A collection index stores the span table, heading labels and span TF-IDF
+matrix of one PDF collection as flat ``.npy`` files:
+
+    meta.json               documents, fonts, labels, vocabulary, span count,
+                            source hashes with the size and mtime they were taken at
+    col_<name>.npy          one file per numeric span column (float32/int32/uint8)
+    text_buffer.npy         UTF-8 bytes of every span text, concatenated
+    text_offsets.npy        int64 offsets into text_buffer (n_spans + 1)
+    tfidf_data.npy          CSR values (float32)
+    tfidf_indices.npy       CSR column indices (int32)
+    tfidf_indptr.npy        CSR row pointers (int64)
+    idf.npy                 IDF weight per vocabulary term (float32)
+
+Arrays are opened with ``mmap_mode='r'`` so every worker analyzing the same
+collection shares the pages through the OS page cache and nothing is parsed
+at load time.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any
+
+import numpy as np
+
+INDEX_VERSION = 2
+
+# Numeric span columns and their on-disk dtypes
+SPAN_COLUMNS = {
+    "page": np.int32,
+    "font_size": np.float32,
+    "bold": np.uint8,
+    "x0": np.float32,
+    "y0": np.float32,
+    "x1": np.float32,
+    "y1": np.float32,
+    "uppercase_ratio": np.float32,
+    "length": np.int32,
+}
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Content hash of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+_content_hashes = {}  # (path, size, mtime) -> sha256, shared by every cache, journal and index in the process
+_content_hashes_lock = threading.Lock()
+
+def content_sha256(path: str) -> str:
+    """file_sha256, memoized on (path, size, mtime) so an unchanged file is read once per process"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _content_hashes_lock:
+        digest = _content_hashes.get(memo_key)
+    if digest is None:
+        digest = file_sha256(path)
+        with _content_hashes_lock:
+            _content_hashes[memo_key] = digest
+    return digest
+
+def source_stamp(path: str) -> Dict[str, Any]:
+    """Manifest entry of a source PDF: content hash plus the size and mtime it was hashed at"""
+    stat = os.stat(path)
+    return {"sha256": content_sha256(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def sources_match(sources: Dict[str, Any], pdf_paths: List[str]) -> bool:
+    """True if ``pdf_paths`` are exactly the manifest's sources
+
+    A file whose size and mtime equal the recorded ones is trusted without
+    reading it; only touched files are hashed again and compared by content.
+    """
+    if set(sources) != {os.path.basename(p) for p in pdf_paths}:
+        return False
+    for path in pdf_paths:
+        stamp = sources[os.path.basename(path)]
+        stat = os.stat(path)
+        if stamp["size"] == stat.st_size and stamp["mtime_ns"] == stat.st_mtime_ns:
+            continue
+        if stamp["sha256"] != content_sha256(path):
+            return False
+    return True
+
+def manifest_matches(meta: Dict[str, Any], pdf_paths: List[str], settings: Dict[str, Any] = None) -> bool:
+    """True if an index manifest was built from exactly these PDF contents and settings"""
+    if meta.get("settings", {}) != (settings or {}):
+        return False
+    return sources_match(meta["sources"], pdf_paths)
+
+@contextmanager
+def staged_index_dir(index_dir: str, prefix: str = ".index-"):
+    """Yield a sibling temp dir to write an index into, then swap it in place of ``index_dir``
+
+    Readers never see a half-built index; if writing fails the temp dir is
+    removed and the old index is left as it was.
+    """
+    parent = os.path.dirname(os.path.abspath(index_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=prefix, dir=parent)
+    try:
+        yield tmp_dir
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    if os.path.exists(index_dir):
+        shutil.rmtree(index_dir)
+    os.replace(tmp_dir, index_dir)
+
+def _categorical(values) -> tuple:
+    """Encode a sequence of strings as (int32 codes, sorted category list)"""
+    categories = sorted(set(values))
+    lookup = {v: i for i, v in enumerate(categories)}
+    codes = np.fromiter((lookup[v] for v in values), dtype=np.int32, count=len(values))
+    return codes, categories
+
+class CollectionIndex:
+    """Memory-mapped span table and TF-IDF matrix for one collection"""
+
+    def __init__(self, index_dir: str, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        self.index_dir = index_dir
+        self.meta = meta
+        self.arrays = arrays
+        self._tfidf = None
+        self._query_vectorizer = None
+        self._lock = threading.Lock()  # Guards the lazily built members above
+
+    @property
+    def n_spans(self) -> int:
+        return self.meta["n_spans"]
+
+    @classmethod
+    def build(cls, index_dir: str, df, pdf_paths: List[str], vectorizer, tfidf_matrix,
+              settings: Dict[str, Any] = None, texts=None) -> "CollectionIndex":
+        """Write an index for an extracted, classified span DataFrame
+
+        ``vectorizer`` must be the fitted TfidfVectorizer that produced
+        ``tfidf_matrix`` (one row per span, in DataFrame order). ``settings``
+        records extraction options the span table depends on. ``texts`` is
+        the SpanTexts buffer of the frame's text_offset/text_length columns;
+        without it the frame needs a plain 'text' column.
+        """
+        from scipy import sparse
+
+        if texts is not None:
+            text_buffer, offsets = texts.pack(df["text_offset"].to_numpy(), df["text_length"].to_numpy())
+        else:
+            encoded = [t.encode("utf-8") for t in df["text"].tolist()]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+            text_buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+        doc_codes, documents = _categorical(df["document"].tolist())
+        font_codes, fonts = _categorical(df["font_name"].tolist())
+        label_codes, labels = _categorical(df["predicted_label"].tolist())
+
+        tfidf = sparse.csr_matrix(tfidf_matrix, dtype=np.float32)
+        tfidf.sort_indices()
+
+        arrays = {f"col_{name}": df[name].to_numpy().astype(dtype) for name, dtype in SPAN_COLUMNS.items()}
+        arrays.update({
+            "col_document": doc_codes,
+            "col_font_name": font_codes,
+            "col_predicted_label": label_codes.astype(np.uint8),
+            "text_buffer": text_buffer,
+            "text_offsets": offsets,
+            "tfidf_data": tfidf.data.astype(np.float32),
+            "tfidf_indices": tfidf.indices.astype(np.int32),
+            "tfidf_indptr": tfidf.indptr.astype(np.int64),
+            "idf": vectorizer.idf_.astype(np.float32),
+        })
+
+        vocabulary = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+        meta = {
+            "version": INDEX_VERSION,
+            "n_spans": len(df),
+            "documents": documents,
+            "fonts": fonts,
+            "labels": labels,
+            "sources": {os.path.basename(p): source_stamp(p) for p in pdf_paths},
+            "settings": settings or {},
+            "vocabulary": vocabulary,
+            "vectorizer": {
+                "stop_words": vectorizer.stop_words,
+                "ngram_range": list(vectorizer.ngram_range),
+                "lowercase": vectorizer.lowercase,
+            },
+        }
+
+        with staged_index_dir(index_dir) as tmp_dir:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), array, allow_pickle=False)
+            with open(os.path.join(tmp_dir, "meta.json"), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+        return cls.open(index_dir)
+
+    @classmethod
+    def open(cls, index_dir: str) -> "CollectionIndex":
+        """Open an index with every array memory-mapped read-only"""
+        with open(os.path.join(index_dir, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version {meta.get('version')} in {index_dir}")
+
+        arrays = {}
+        for file in os.listdir(index_dir):
+            if file.endswith(".npy"):
+                arrays[file[:-4]] = np.load(os.path.join(index_dir, file), mmap_mode='r', allow_pickle=False)
+        return cls(index_dir, meta, arrays)
+
+    @classmethod
+    def exists(cls, index_dir: str) -> bool:
+        return os.path.exists(os.path.join(index_dir, "meta.json"))
+
+    def matches(self, pdf_paths: List[str], settings: Dict[str, Any] = None) -> bool:
+        """True if the index was built from exactly these PDF contents and settings"""
+        return manifest_matches(self.meta, pdf_paths, settings)
+
+    def text(self, i: int) -> str:
+        """Decode a single span text from the shared buffer"""
+        offsets = self.arrays["text_offsets"]
+        return bytes(self.arrays["text_buffer"][offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def texts(self) -> List[str]:
+        """Decode all span texts"""
+        buffer = bytes(self.arrays["text_buffer"])
+        offsets = self.arrays["text_offsets"].tolist()
+        return [buffer[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(self.n_spans)]
+
+    def span_texts(self):
+        """SpanTexts over the mapped text buffer (nothing is decoded or copied)"""
+        from span_text import SpanTexts
+
+        return SpanTexts(self.arrays["text_buffer"])
+
+    def to_frame(self):
+        """Span table as a DataFrame, including predicted heading labels
+
+        The frame already has the compact span schema (see
+        compact_span_frame) and its numeric columns are views over the mapped
+        arrays, so workers share them instead of each holding a copy. Span
+        texts are text_offset/text_length references into span_texts();
+        document, font and label columns are categoricals over the stored codes.
+        """
+        import pandas as pd
+
+        def categorical(name, categories):
+            codes = self.arrays[f"col_{name}"]
+            if categories != sorted(categories):
+                # Sorted categories, as astype("category") would give (groupby order depends on it)
+                order = np.argsort(categories)
+                rank = np.empty(len(order), dtype=np.int32)
+                rank[order] = np.arange(len(order), dtype=np.int32)
+                codes, categories = rank[codes], [categories[i] for i in order]
+            return pd.Categorical.from_codes(codes, categories=categories)
+
+        data = {name: self.arrays[f"col_{name}"] for name in SPAN_COLUMNS}
+        data["bold"] = data["bold"].view(np.bool_)
+        data["document"] = categorical("document", self.meta["documents"])
+        data["font_name"] = categorical("font_name", self.meta["fonts"])
+        data["predicted_label"] = categorical("predicted_label", self.meta["labels"])
+        offsets = self.arrays["text_offsets"]
+        data["text_offset"] = offsets[:-1]
+        data["text_length"] = np.subtract(offsets[1:], offsets[:-1], dtype=np.int32, casting="unsafe")
+        # copy=False keeps one block per column instead of consolidating (copying) them
+        return pd.DataFrame(data, copy=False)
+
+    def tfidf_matrix(self):
+        """Span TF-IDF matrix as a CSR view over the mapped arrays (no copy)"""
+        with self._lock:
+            if self._tfidf is None:
+                from scipy import sparse
+
+                shape = (self.n_spans, len(self.meta["vocabulary"]))
+                self._tfidf = sparse.csr_matrix(
+                    (self.arrays["tfidf_data"], self.arrays["tfidf_indices"], self.arrays["tfidf_indptr"]),
+                    shape=shape, copy=False
+                )
+        return self._tfidf
+
+    def query_vector(self, text: str):
+        """Project query text into the index's TF-IDF space (L2-normalized)"""
+        from sklearn.preprocessing import normalize
+
+        with self._lock:
+            if self._query_vectorizer is None:
+                from sklearn.feature_extraction.text import CountVectorizer
+
+                settings = self.meta["vectorizer"]
+                self._query_vectorizer = CountVectorizer(
+                    vocabulary=self.meta["vocabulary"],
+                    stop_words=settings["stop_words"],
+                    ngram_range=tuple(settings["ngram_range"]),
+                    lowercase=settings["lowercase"],
+                )
+        counts = self._query_vectorizer.transform([text]).astype(np.float32)
+        return normalize(counts.multiply(self.arrays["idf"]).tocsr())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Time-limited PDF extraction in worker processes
+
+Each worker process extracts one document at a time and reports every page as
+it starts and finishes. The parent enforces a per-page and a per-document time
+limit; a worker that exceeds either is killed and replaced. After a page
+timeout the document resumes on the following page, after a document timeout
+the pages extracted so far are kept. Every timeout is returned as an issue
+record so callers can report it in their output metadata.
+"""
+
+import os
+import time
+import signal
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+from typing import List, Dict, Any, Iterator, Tuple
+
+def _worker_loop(conn, processor):
+    """Extract documents sent by the parent, reporting progress page by page"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The parent handles Ctrl+C
+    while True:
+        task = conn.recv()
+        if task is None:
+            return
+        pdf_path, pages, data = task
+        try:
+            doc = processor.open_document(pdf_path, data)
+            page_numbers = processor.page_numbers(doc, pages)
+            conn.send(("pages", page_numbers))
+            for page_num in page_numbers:
+                conn.send(("start", page_num))
+                conn.send(("page", page_num, processor.extract_page(doc, page_num, os.path.basename(pdf_path))))
+            doc.close()
+            conn.send(("done",))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+class _Worker:
+    """One extraction process and the task it is working on"""
+
+    def __init__(self, context, processor):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_loop, args=(child_conn, processor), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.kill()
+
+class ExtractionWatchdog:
+    """Extracts documents in worker processes under page and document time limits"""
+
+    def __init__(self, processor, workers: int = None, doc_timeout: float = None,
+                 page_timeout: float = None):
+        self.processor = processor
+        self.workers = max(1, workers or min(4, os.cpu_count() or 1))
+        self.doc_timeout = doc_timeout
+        self.page_timeout = page_timeout
+        self.context = multiprocessing.get_context()
+
+    def _deadline(self, task: Dict[str, Any]) -> float:
+        deadlines = []
+        if self.doc_timeout:
+            deadlines.append(task["started"] + self.doc_timeout)
+        if self.page_timeout and task["page"] is not None:
+            deadlines.append(task["page_started"] + self.page_timeout)
+        return min(deadlines, default=float("inf"))
+
+    def extract(self, tasks: List[Tuple]) -> Iterator[Tuple[str, List[Dict], List[Dict]]]:
+        """Yield (pdf_path, spans, issues) for (pdf_path, pages[, data]) tasks, in input order
+
+        ``pages`` is a set of 1-based page numbers, or None for every page.
+        ``data`` optionally holds the PDF bytes, sent to the worker instead
+        of having it read ``pdf_path``.
+        """
+        queue = deque({"index": i, "pdf_path": task[0], "pages": task[1], "data": task[2] if len(task) > 2 else None,
+                       "spans": [], "issues": [], "started": None, "page": None, "page_started": None,
+                       "remaining": None, "pages_done": 0}
+                      for i, task in enumerate(tasks))
+        results = {}
+        next_index = 0
+        workers = [_Worker(self.context, self.processor) for _ in range(min(self.workers, len(tasks)))]
+
+        def finish(task):
+            results[task["index"]] = (task["pdf_path"], task["spans"], task["issues"])
+
+        def abandon(worker, reason, **details):
+            # Kill a stuck or dead worker; resume its document after the current page if possible
+            task = worker.task
+            workers[workers.index(worker)] = _Worker(self.context, self.processor)
+            worker.kill()
+            document = os.path.basename(task["pdf_path"])
+            if reason == "document_timeout" or task["page"] is None:
+                task["issues"].append(dict({"document": document, "reason": reason}, **details))
+                finish(task)
+                return
+            task["issues"].append(dict({"document": document, "page": task["page"] + 1, "reason": reason}, **details))
+            remaining = [p for p in task["remaining"] if p != task["page"]]
+            if not remaining:
+                finish(task)
+                return
+            task.update(pages={p + 1 for p in remaining}, page=None, page_started=None, remaining=None)
+            queue.appendleft(task)
+
+        try:
+            while next_index < len(tasks):
+                for worker in workers:
+                    if worker.task is None and queue:
+                        worker.task = queue.popleft()
+                        if worker.task["started"] is None:
+                            worker.task["started"] = time.monotonic()
+                        worker.conn.send((worker.task["pdf_path"], worker.task["pages"], worker.task["data"]))
+
+                busy = [w for w in workers if w.task is not None]
+                if busy:
+                    timeout = max(0.0, min(self._deadline(w.task) for w in busy) - time.monotonic())
+                    ready = wait([w.conn for w in busy], timeout=None if timeout == float("inf") else timeout)
+
+                    for worker in busy:
+                        if worker.conn not in ready:
+                            continue
+                        task = worker.task
+                        try:
+                            while worker.task is not None and worker.conn.poll():
+                                message = worker.conn.recv()
+                                if message[0] == "pages":
+                                    task["remaining"] = list(message[1])
+                                elif message[0] == "start":
+                                    task.update(page=message[1], page_started=time.monotonic())
+                                elif message[0] == "page":
+                                    task["spans"].extend(message[2])
+                                    task["remaining"].remove(message[1])
+                                    task["pages_done"] += 1
+                                    task.update(page=None, page_started=None)
+                                elif message[0] == "done":
+                                    finish(task)
+                                    worker.task = None
+                                elif message[0] == "error":
+                                    task["issues"].append({"document": os.path.basename(task["pdf_path"]),
+                                                           "reason": "error", "error": message[1]})
+                                    finish(task)
+                                    worker.task = None
+                        except (EOFError, OSError):
+                            abandon(worker, "worker_died")
+
+                    now = time.monotonic()
+                    for worker in list(workers):
+                        task = worker.task
+                        if task is None:
+                            continue
+                        if self.doc_timeout and now >= task["started"] + self.doc_timeout:
+                            print(f"⏱️  {os.path.basename(task['pdf_path'])}: document timeout after {self.doc_timeout:g}s")
+                            abandon(worker, "document_timeout", seconds=self.doc_timeout,
+                                    pages_extracted=task["pages_done"])
+                        elif self.page_timeout and task["page"] is not None and now >= task["page_started"] + self.page_timeout:
+                            print(f"⏱️  {os.path.basename(task['pdf_path'])}: page {task['page'] + 1} timeout after {self.page_timeout:g}s")
+                            abandon(worker, "page_timeout", seconds=self.page_timeout)
+
+                while next_index in results:
+                    yield results.pop(next_index)
+                    next_index += 1
+        finally:
+            for worker in workers:
+                worker.stop()
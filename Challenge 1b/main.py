@@ -4,21 +4,147 @@ Intelligent Document Analyst System
 Theme: "Connect What Matters — For the User Who Matters"
 """
 
-import fitz  # PyMuPDF
-import pandas as pd
-import numpy as np
+from __future__ import annotations
+
 import json
 import os
 import re
+import time
+import heapq
+import threading
 import string
 from datetime import datetime
-from typing import List, Dict, Any, Tuple
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.cluster import KMeans
+from typing import List, Dict, Any, Tuple, Iterable, Iterator, TYPE_CHECKING
 import argparse
 
+# Heavy dependencies (PyMuPDF, pandas, numpy, scikit-learn) are imported inside
+# the stages that need them, so --help and argument validation start instantly.
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Bumped whenever a change alters analysis output; part of result cache keys
+PIPELINE_VERSION = "1.2"
+
+# Collection index directory, created inside each collection when --index is used
+INDEX_DIRNAME = ".index"
+# Per-PDF hashed term count cache, used by --vectorizer hashing
+TERM_CACHE_DIRNAME = ".term_cache"
+# Checkpoint journal of a multi-collection run, created in --collections_dir
+CHECKPOINT_DIRNAME = ".checkpoint"
+# Sharded collection index (--index --shards), created next to INDEX_DIRNAME
+SHARDED_INDEX_DIRNAME = ".shards"
+# Directory of Challenge 1a *_labels.json outlines, resolved inside each collection
+OUTLINES_DIRNAME = "outlines"
+# Span count from which --granularity auto scores whole sections instead of spans
+SECTION_SCORING_MIN_SPANS = 20000
+# Speed/quality profiles (--profile): extraction granularity, page sampling, heading
+# classification, vectorizer size and top-k depth together; explicit flags override them
+PROFILES = {
+    "fast": {"granularity": "section", "candidate_pages": 20, "classifier": "rules",
+             "max_features": 500, "ngram_max": 1, "top_k": 5},
+    "balanced": {"granularity": "auto", "candidate_pages": None, "classifier": "model",
+                 "max_features": 1000, "ngram_max": 2, "top_k": 10},
+    "accurate": {"granularity": "span", "candidate_pages": None, "classifier": "model",
+                 "max_features": 5000, "ngram_max": 2, "top_k": 10},
+}
+# Character budget and sentence count of each refined_text in subsection_analysis
+REFINED_TEXT_CHARS = 500
+REFINED_MAX_SENTENCES = 5
+# A sentence runs up to terminal punctuation followed by whitespace, or to the end of the text
+SENTENCE_PATTERN = re.compile(r'\S.*?(?:[.!?]+(?=\s)|$)', re.S)
+
+def prefetch_pdfs(pdf_paths: List[str], depth: int = 2):
+    """Yield (path, bytes) while a background thread reads the upcoming PDFs
+    
+    The bounded queue gives backpressure: at most ``depth`` PDFs wait in memory
+    ahead of the consumer. With ``depth`` 0 nothing is prefetched and PyMuPDF
+    opens each path itself.
+    """
+    import queue
+    
+    if depth <= 0:
+        for pdf_path in pdf_paths:
+            yield pdf_path, None
+        return
+    
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+    
+    def reader():
+        for pdf_path in pdf_paths:
+            if stop.is_set():
+                return
+            try:
+                with open(pdf_path, 'rb') as f:
+                    put((pdf_path, f.read(), None))
+            except OSError as e:
+                put((pdf_path, None, e))
+        put(None)
+    
+    threading.Thread(target=reader, daemon=True).start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is None:
+                return
+            pdf_path, data, error = item
+            if error is not None:
+                raise error
+            yield pdf_path, data
+    finally:
+        stop.set()
+
+def open_pdf(pdf_path: str, data: bytes = None):
+    """Open a PDF from prefetched bytes, or from disk"""
+    import fitz  # PyMuPDF
+    
+    if data is not None:
+        return fitz.open(stream=data, filetype="pdf")
+    return fitz.open(pdf_path)
+
+# Compact span table schema: categorical strings, narrow integers, float32
+# geometry and scores, boolean flags
+SPAN_DTYPES = {
+    "document": "category",
+    "font_name": "category",
+    "page": "int16",
+    "length": "int32",
+    "text_offset": "int64",
+    "text_length": "int32",
+    "font_size": "float32",
+    "x0": "float32",
+    "y0": "float32",
+    "x1": "float32",
+    "y1": "float32",
+    "uppercase_ratio": "float32",
+    "bold": "bool",
+}
+FEATURE_COLUMNS = ["font_size", "x0", "y0", "bold", "uppercase_ratio", "length"]
+
+def profile_settings(name: str, **overrides) -> Dict[str, Any]:
+    """Settings of a named profile, with every override that is not None applied"""
+    settings = dict(PROFILES[name])
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    return settings
+
+def compact_span_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast a span DataFrame to the compact SPAN_DTYPES schema"""
+    dtypes = {col: dtype for col, dtype in SPAN_DTYPES.items() if col in df.columns}
+    if "page" in df.columns and len(df) and df["page"].max() > 32767:
+        dtypes["page"] = "int32"
+    df = df.astype(dtypes)
+    if "predicted_label" in df.columns:
+        df["predicted_label"] = df["predicted_label"].astype("category")
+    return df
+
 class DocumentProcessor:
     """Handles PDF text extraction and preprocessing"""
     
@@ -39,82 +165,271 @@ class DocumentProcessor:
         alpha_ratio = sum(1 for c in cleaned if c.isalnum()) / len(cleaned) if cleaned else 0
         return len(cleaned.strip()) >= 3 and alpha_ratio > 0.3
     
-    def extract_text_with_structure(self, pdf_path: str) -> List[Dict]:
-        """Extract text with structural information"""
-        doc = fitz.open(pdf_path)
+    def extract_page_texts(self, pdf_path: str, data: bytes = None) -> List[str]:
+        """Cheap first-tier extraction: plain text of every page"""
+        doc = open_pdf(pdf_path, data)
+        texts = [page.get_text("text") for page in doc]
+        doc.close()
+        return texts
+    
+    def open_document(self, pdf_path: str, data: bytes = None):
+        """Open a PDF from prefetched bytes, or from disk"""
+        return open_pdf(pdf_path, data)
+    
+    def page_numbers(self, doc, pages: set = None) -> List[int]:
+        """0-based page numbers to extract, optionally limited to 1-based ``pages``"""
+        return list(range(len(doc))) if pages is None else sorted(p - 1 for p in pages if 0 < p <= len(doc))
+    
+    def extract_page(self, doc, page_num: int, document: str) -> List[Dict]:
+        """Spans of one page (0-based ``page_num``) with structural information"""
         sections = []
+        blocks = doc[page_num].get_text("dict")["blocks"]
         
-        for page_num, page in enumerate(doc):
-            blocks = page.get_text("dict")["blocks"]
-            
-            for block in blocks:
-                if block['type'] == 0:  # Text block
-                    for line in block["lines"]:
-                        for span in line["spans"]:
-                            text = span["text"].strip()
-                            if not self.is_meaningful(text):
-                                continue
-                                
-                            sections.append({
-                                "document": os.path.basename(pdf_path),
-                                "page": page_num + 1,
-                                "text": text,
-                                "font_size": span["size"],
-                                "font_name": span["font"],
-                                "bold": "Bold" in span["font"],
-                                "x0": span["bbox"][0],
-                                "y0": span["bbox"][1],
-                                "x1": span["bbox"][2],
-                                "y1": span["bbox"][3],
-                                "uppercase_ratio": sum(1 for c in text if c.isupper()) / len(text) if text else 0,
-                                "length": len(text),
-                            })
+        for block in blocks:
+            if block['type'] == 0:  # Text block
+                for line in block["lines"]:
+                    for span in line["spans"]:
+                        text = span["text"].strip()
+                        if not self.is_meaningful(text):
+                            continue
+                            
+                        sections.append({
+                            "document": document,
+                            "page": page_num + 1,
+                            "text": text,
+                            "font_size": span["size"],
+                            "font_name": span["font"],
+                            "bold": "Bold" in span["font"],
+                            "x0": span["bbox"][0],
+                            "y0": span["bbox"][1],
+                            "x1": span["bbox"][2],
+                            "y1": span["bbox"][3],
+                            "uppercase_ratio": sum(1 for c in text if c.isupper()) / len(text) if text else 0,
+                            "length": len(text),
+                        })
+        return sections
+    
+    def extract_text_with_structure(self, pdf_path: str, pages: set = None, data: bytes = None) -> List[Dict]:
+        """Extract text with structural information
         
+        ``pages`` optionally restricts extraction to these 1-based page numbers;
+        ``data`` holds the already-read PDF bytes.
+        """
+        doc = self.open_document(pdf_path, data)
+        sections = []
+        for page_num in self.page_numbers(doc, pages):
+            sections.extend(self.extract_page(doc, page_num, os.path.basename(pdf_path)))
         doc.close()
         return sections
 
+class NearDuplicateFilter:
+    """Collapses near-duplicate spans and sections using MinHash/LSH
+    
+    Texts are shingled into word n-grams, summarized by MinHash signatures and
+    bucketed with LSH banding. Candidate pairs whose estimated Jaccard
+    similarity reaches the threshold are merged, and each cluster is reduced to
+    its first occurrence, which records where the copies were found.
+    """
+    
+    MERSENNE_PRIME = (1 << 31) - 1
+    
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                 shingle_size: int = 3, min_chars: int = 40, seed: int = 42):
+        import numpy as np
+        
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.min_chars = min_chars
+        
+        rng = np.random.RandomState(seed)
+        self.perm_a = rng.randint(1, self.MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self.perm_b = rng.randint(0, self.MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+    
+    def shingles(self, text: str):
+        """Hashed word n-gram shingles of a text"""
+        import zlib
+        import numpy as np
+        
+        words = re.findall(r'\w+', text.lower())
+        k = self.shingle_size
+        grams = {' '.join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+        return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+    
+    def signatures(self, texts: List[str]):
+        """MinHash signature matrix (n_texts x num_perm)"""
+        import numpy as np
+        
+        signatures = np.empty((len(texts), self.num_perm), dtype=np.uint64)
+        for i, text in enumerate(texts):
+            hashes = self.shingles(text) % self.MERSENNE_PRIME
+            permuted = (self.perm_a[:, None] * hashes[None, :] + self.perm_b[:, None]) % self.MERSENNE_PRIME
+            signatures[i] = permuted.min(axis=1)
+        return signatures
+    
+    def clusters(self, texts: List[str]) -> List[List[int]]:
+        """Groups of near-duplicate texts (positions), only groups larger than one"""
+        import numpy as np
+        
+        signatures = self.signatures(texts)
+        parent = list(range(len(texts)))
+        
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        rows = self.num_perm // self.bands
+        for band in range(self.bands):
+            buckets = {}
+            for i, key in enumerate(map(bytes, signatures[:, band * rows:(band + 1) * rows])):
+                buckets.setdefault(key, []).append(i)
+            for members in buckets.values():
+                for other in members[1:]:
+                    root, other_root = find(members[0]), find(other)
+                    if root != other_root and np.mean(signatures[members[0]] == signatures[other]) >= self.threshold:
+                        parent[max(root, other_root)] = min(root, other_root)
+        
+        groups = {}
+        for i in range(len(texts)):
+            groups.setdefault(find(i), []).append(i)
+        return [sorted(members) for members in groups.values() if len(members) > 1]
+    
+    def collapse_spans(self, df: pd.DataFrame, texts=None) -> pd.DataFrame:
+        """Drop near-duplicate spans, keeping the first with a 'duplicates' provenance list
+        
+        Every kept span also counts the dropped spans that directly follow it
+        in reading order ('dropped_after'), so iter_sections can tell a
+        section that lost its whole body from one that never had any.
+        """
+        import numpy as np
+        from span_text import frame_texts
+        
+        candidates = df.index[df['length'] >= self.min_chars]
+        df['duplicates'] = None
+        df['dropped_after'] = 0
+        if len(candidates) < 2:
+            return df
+        
+        texts = list(frame_texts(df.loc[candidates], texts))
+        dropped = []
+        for members in self.clusters(texts):
+            keep, copies = candidates[members[0]], candidates[members[1:]]
+            df.at[keep, 'duplicates'] = [
+                {"document": df.at[i, 'document'], "page_number": int(df.at[i, 'page'])} for i in copies
+            ]
+            dropped.extend(copies)
+        
+        if dropped:
+            print(f"🔄 Collapsed {len(dropped)} near-duplicate spans")
+            # Charge each dropped span to the kept span before it in the same document
+            order = df.sort_values(['document', 'page', 'y0']).index.to_numpy()
+            is_dropped = np.isin(order, dropped)
+            documents = df.loc[order, 'document'].to_numpy()
+            last_kept = None
+            for i, row in enumerate(order):
+                if i and documents[i] != documents[i - 1]:
+                    last_kept = None
+                if not is_dropped[i]:
+                    last_kept = row
+                elif last_kept is not None:
+                    df.at[last_kept, 'dropped_after'] += 1
+        return df.drop(index=dropped).reset_index(drop=True)
+    
+    def collapse_sections(self, sections: List[Dict]) -> List[Dict]:
+        """Drop near-duplicate sections, keeping the first with a 'duplicates' provenance list
+        
+        Sections shorter than ``min_chars`` (such as heading-only ones) are
+        too short for MinHash and only collapse when their text is identical.
+        """
+        from span_text import text_of
+        
+        texts = [
+            text_of(section['title_ref']) + ' ' + ' '.join(text_of(item['text_ref']) for item in section['content'])
+            for section in sections
+        ]
+        candidates = [i for i, text in enumerate(texts) if len(text) >= self.min_chars]
+        for section in sections:
+            section.setdefault('duplicates', [])
+        
+        groups = [[candidates[i] for i in members] for members in self.clusters([texts[i] for i in candidates])] \
+            if len(candidates) >= 2 else []
+        short = {}
+        for i, text in enumerate(texts):
+            if len(text) < self.min_chars:
+                short.setdefault(' '.join(text.lower().split()), []).append(i)
+        groups.extend(members for members in short.values() if len(members) > 1)
+        
+        dropped = set()
+        for members in groups:
+            keep = sections[members[0]]
+            for i in members[1:]:
+                copy = sections[i]
+                keep['duplicates'].append({"document": copy['document'], "page_number": int(copy['page'])})
+                dropped.add(i)
+        
+        if dropped:
+            print(f"🔄 Collapsed {len(dropped)} near-duplicate sections")
+        return [section for i, section in enumerate(sections) if i not in dropped]
+
 class HeadingClassifier:
-    """Classifies text into heading levels and paragraphs"""
+    """Classifies text into heading levels and paragraphs
     
-    def __init__(self):
-        self.model = RandomForestClassifier(n_estimators=50, random_state=42)
+    In "model" mode a RandomForest is trained on the rule-based labels of
+    the collection; in "rules" mode those labels are used directly.
+    """
+    
+    def __init__(self, mode: str = "model"):
+        self.mode = mode
+        self.model = None
         self.is_trained = False
     
     def create_labels(self, df: pd.DataFrame) -> pd.DataFrame:
         """Create rule-based labels for training"""
+        import numpy as np
+        
         mean_font = df["font_size"].mean()
         std_font = df["font_size"].std()
         
-        def label_row(row):
-            font = row["font_size"]
-            bold = row["bold"]
-            upper = row["uppercase_ratio"]
-            length = row["length"]
-            
-            # Title: Large font, often bold, short
-            if font >= mean_font + 2 * std_font and length < 100:
-                return "TITLE"
-            # H1: Large font, bold, moderate uppercase
-            elif font >= mean_font + 1.5 * std_font and bold and upper > 0.3:
-                return "H1"
-            # H2: Medium-large font, may be bold
-            elif font >= mean_font + 0.75 * std_font and (bold or upper > 0.5):
-                return "H2"
-            # H3: Slightly larger font or bold
-            elif font >= mean_font + 0.25 * std_font and bold:
-                return "H3"
-            # Everything else is paragraph
-            else:
-                return "P"
+        font = df["font_size"].to_numpy()
+        bold = df["bold"].to_numpy(dtype=bool)
+        upper = df["uppercase_ratio"].to_numpy()
+        length = df["length"].to_numpy()
         
-        df["label"] = df.apply(label_row, axis=1)
+        # Evaluated in order, first match wins; everything else is paragraph
+        df["label"] = np.select(
+            [
+                # Title: Large font, often bold, short
+                (font >= mean_font + 2 * std_font) & (length < 100),
+                # H1: Large font, bold, moderate uppercase
+                (font >= mean_font + 1.5 * std_font) & bold & (upper > 0.3),
+                # H2: Medium-large font, may be bold
+                (font >= mean_font + 0.75 * std_font) & (bold | (upper > 0.5)),
+                # H3: Slightly larger font or bold
+                (font >= mean_font + 0.25 * std_font) & bold,
+            ],
+            ["TITLE", "H1", "H2", "H3"],
+            default="P"
+        )
         return df
     
     def train(self, df: pd.DataFrame):
         """Train the heading classifier"""
+        from sklearn.ensemble import RandomForestClassifier
+        
         df = self.create_labels(df)
+        if self.mode == "rules":
+            self.is_trained = True
+            return df
+        
+        self.model = RandomForestClassifier(n_estimators=50, random_state=42)
         
-        features = df[["font_size", "x0", "y0", "bold", "uppercase_ratio", "length"]].astype(float)
+        # Trees work in float32 internally, so this is the only feature copy made
+        features = df[FEATURE_COLUMNS].to_numpy(dtype="float32")
         labels = df["label"]
         
         self.model.fit(features, labels)
@@ -124,26 +439,303 @@ class HeadingClassifier:
     
     def predict(self, df: pd.DataFrame) -> pd.DataFrame:
         """Predict heading levels"""
+        import pandas as pd
+        
+        if self.mode == "rules":
+            df = self.create_labels(df)
+            df["predicted_label"] = pd.Categorical(df.pop("label"))
+            return df
+        
         if not self.is_trained:
             df = self.train(df)
         
-        features = df[["font_size", "x0", "y0", "bold", "uppercase_ratio", "length"]].astype(float)
-        df["predicted_label"] = self.model.predict(features)
+        features = df[FEATURE_COLUMNS].to_numpy(dtype="float32")
+        df["predicted_label"] = pd.Categorical(self.model.predict(features))
         
         return df
 
+def _hash_term_counts(texts: List[str], n_features: int):
+    """Raw hashed term counts for one document's spans (runs in worker processes)"""
+    import numpy as np
+    from sklearn.feature_extraction.text import HashingVectorizer
+    
+    vectorizer = HashingVectorizer(
+        n_features=n_features,
+        stop_words='english',
+        ngram_range=(1, 2),
+        alternate_sign=False,
+        norm=None,
+        dtype=np.float32
+    )
+    return vectorizer.transform(texts)
+
+class HashingTermModel:
+    """Hashed term counts with incrementally maintained document frequencies
+    
+    Every document is vectorized independently into a fixed feature space, so
+    documents can be processed in parallel and cached per PDF. IDF weights are
+    derived from span document-frequency counts that are updated by adding or
+    removing a single document's contribution. Documents are held by name and
+    content, so identical copies under different names each count (as they do
+    in the fitted TF-IDF); the per-PDF cache is keyed by content alone.
+    """
+    
+    def __init__(self, n_features: int = 2 ** 18, cache_dir: str = None, max_workers: int = None):
+        import numpy as np
+        
+        self.n_features = n_features
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+        self.n_spans = 0
+        self.documents = {}  # (document name, content key) or other document key -> term count matrix
+    
+    def document_key(self, texts: List[str]) -> str:
+        """Content key of a document's spans in this feature space"""
+        import hashlib
+        
+        digest = hashlib.sha256(f"hashing-v1:{self.n_features}:(1, 2)".encode("utf-8"))
+        for text in texts:
+            digest.update(text.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+    
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+    
+    def _load_cached(self, key: str, n_rows: int):
+        from scipy import sparse
+        
+        if self.cache_dir and os.path.exists(self._cache_path(key)):
+            matrix = sparse.load_npz(self._cache_path(key)).tocsr()
+            if matrix.shape == (n_rows, self.n_features):
+                return matrix
+        return None
+    
+    def add_document(self, key: str, matrix):
+        """Add one document's spans to the document-frequency counts"""
+        import numpy as np
+        
+        if key in self.documents:
+            return
+        matrix.sum_duplicates()
+        self.doc_freq += np.bincount(matrix.indices, minlength=self.n_features)
+        self.n_spans += matrix.shape[0]
+        self.documents[key] = matrix
+    
+    def remove_document(self, key: str):
+        """Remove one document's spans from the document-frequency counts"""
+        import numpy as np
+        
+        matrix = self.documents.pop(key, None)
+        if matrix is None:
+            return
+        self.doc_freq -= np.bincount(matrix.indices, minlength=self.n_features)
+        self.n_spans -= matrix.shape[0]
+    
+    def sync(self, doc_texts: Dict[str, List[str]]) -> List:
+        """Make the model hold exactly these documents; return their matrices in order
+        
+        Only documents that are new to the model are loaded from the per-PDF
+        cache or vectorized (in parallel worker processes).
+        """
+        from scipy import sparse
+        from concurrent.futures import ProcessPoolExecutor
+        
+        keys = [(name, self.document_key(texts)) for name, texts in doc_texts.items()]
+        for key in set(self.documents) - set(keys):
+            self.remove_document(key)
+        
+        # Content already held under another name is reused; other new content is vectorized once
+        held = {key[1]: matrix for key, matrix in self.documents.items() if isinstance(key, tuple)}
+        missing = {}
+        for key, texts in zip(keys, doc_texts.values()):
+            if key in self.documents:
+                continue
+            cached = held.get(key[1])
+            if cached is None:
+                cached = self._load_cached(key[1], len(texts))
+            if cached is not None:
+                self.add_document(key, cached)
+                held[key[1]] = cached
+            else:
+                missing.setdefault(key[1], (texts, []))[1].append(key)
+        
+        if missing:
+            if len(missing) > 1 and self.max_workers != 1:
+                with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                    matrices = list(pool.map(_hash_term_counts, [texts for texts, _ in missing.values()],
+                                             [self.n_features] * len(missing)))
+            else:
+                matrices = [_hash_term_counts(texts, self.n_features) for texts, _ in missing.values()]
+            
+            for (content_key, (_, owners)), matrix in zip(missing.items(), matrices):
+                matrix = matrix.tocsr()
+                if self.cache_dir:
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    sparse.save_npz(self._cache_path(content_key), matrix)
+                for key in owners:
+                    self.add_document(key, matrix)
+        
+        return [self.documents[key] for key in keys]
+    
+    def idf(self):
+        """Smoothed IDF from the current document-frequency counts"""
+        import numpy as np
+        
+        return (np.log((1 + self.n_spans) / (1 + self.doc_freq)) + 1).astype(np.float32)
+    
+    def tfidf(self, counts, idf=None):
+        """L2-normalized TF-IDF rows for raw term counts (``idf`` defaults to the current weights)"""
+        from scipy import sparse
+        from sklearn.preprocessing import normalize
+        
+        return normalize(counts @ sparse.diags(self.idf() if idf is None else idf))
+
+class LsaProjection:
+    """Low-rank dense embedding of a span TF-IDF matrix (truncated SVD)
+    
+    Only the vocabulary columns actually used by the spans are decomposed, and
+    embeddings are stored as L2-normalized float32 so scoring a query is one
+    small matrix-vector product.
+    """
+    
+    def __init__(self, columns, components, embeddings):
+        self.columns = columns        # used vocabulary columns (int32)
+        self.components = components  # (n_components, len(columns)) float32
+        self.embeddings = embeddings  # (n_spans, n_components) float32
+    
+    @classmethod
+    def fit(cls, tfidf_matrix, n_components: int = 128) -> "LsaProjection":
+        import numpy as np
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.preprocessing import normalize
+        
+        tfidf_matrix = tfidf_matrix.tocsr()
+        columns = np.unique(tfidf_matrix.indices).astype(np.int32)
+        reduced = tfidf_matrix[:, columns]
+        n_components = max(1, min(n_components, reduced.shape[0] - 1, reduced.shape[1] - 1))
+        
+        svd = TruncatedSVD(n_components=n_components, random_state=42)
+        embeddings = normalize(svd.fit_transform(reduced)).astype(np.float32)
+        return cls(columns, svd.components_.astype(np.float32), embeddings)
+    
+    @staticmethod
+    def _path(directory: str, n_components: int, name: str) -> str:
+        return os.path.join(directory, f"lsa{n_components}_{name}.npy")
+    
+    @classmethod
+    def load(cls, directory: str, n_components: int) -> "LsaProjection":
+        """Memory-map a projection saved with the requested component count"""
+        import numpy as np
+        
+        arrays = [np.load(cls._path(directory, n_components, name), mmap_mode='r')
+                  for name in ("columns", "components", "embeddings")]
+        return cls(*arrays)
+    
+    @classmethod
+    def exists(cls, directory: str, n_components: int) -> bool:
+        return os.path.exists(cls._path(directory, n_components, "embeddings"))
+    
+    def save(self, directory: str, n_components: int):
+        import numpy as np
+        
+        # Embeddings go last, since their presence marks a complete projection
+        for name in ("columns", "components", "embeddings"):
+            tmp_path = os.path.join(directory, f".lsa{n_components}_{name}.tmp.npy")
+            np.save(tmp_path, getattr(self, name))
+            os.replace(tmp_path, self._path(directory, n_components, name))
+    
+    def score(self, query_vector):
+        """Cosine similarity of every span embedding with a sparse query vector"""
+        import numpy as np
+        
+        query = query_vector.tocsr()[:, self.columns] @ self.components.T
+        query = np.asarray(query, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(self.embeddings.shape[0], dtype=np.float32)
+        return self.embeddings @ (query / norm)
+
 class RelevanceAnalyzer:
-    """Analyzes document relevance to persona and job-to-be-done"""
+    """Analyzes document relevance to persona and job-to-be-done
     
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(
-            max_features=1000,
+    Queries keep no per-query state on the analyzer and never modify the
+    span table or index they score, so one instance can serve concurrent
+    queries from a thread pool. The shared caches (LSA projections, hashed
+    document frequencies) are only changed under a lock and are read-only
+    once built.
+    """
+    
+    def __init__(self, mode: str = "tfidf", term_cache_dir: str = None, max_workers: int = None,
+                 scoring: str = "sparse", lsa_components: int = 128, max_features: int = 1000,
+                 ngram_max: int = 2):
+        self.mode = mode
+        self.max_features = max_features
+        self.ngram_max = ngram_max
+        self.scoring = scoring
+        self.lsa_components = lsa_components
+        self.lsa_cache = {}  # collection fingerprint -> (vectorizer, LsaProjection)
+        self.term_model = None
+        self.term_cache_dir = term_cache_dir
+        self.max_workers = max_workers
+        self._lock = threading.RLock()
+    
+    def build_vectorizer(self):
+        """Create the TF-IDF vectorizer (imports scikit-learn on first use)"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
+        return TfidfVectorizer(
+            max_features=self.max_features,
             stop_words='english',
-            ngram_range=(1, 2),
+            ngram_range=(1, self.ngram_max),
             min_df=1,
             max_df=0.95
         )
         
+    def fit_streaming(self, text_chunks, query_text: str):
+        """Fit the TF-IDF vectorizer over span texts streamed chunk by chunk
+        
+        Vocabulary pruning (max_df, min_df, max_features) and IDF weights
+        follow TfidfVectorizer.fit over the spans plus the query, so
+        transform() yields the same rows as the in-memory fit_transform.
+        """
+        import itertools
+        import numbers
+        import numpy as np
+        from collections import Counter
+        
+        vectorizer = self.build_vectorizer()
+        analyze = vectorizer.build_analyzer()
+        term_freq, doc_freq, n_docs = Counter(), Counter(), 0
+        for texts in itertools.chain(text_chunks, [[query_text]]):
+            for text in texts:
+                terms = analyze(text)
+                term_freq.update(terms)
+                doc_freq.update(set(terms))
+                n_docs += 1
+        
+        # Terms in sorted order, pruned exactly like CountVectorizer._limit_features
+        terms = sorted(term_freq)
+        dfs = np.fromiter((doc_freq[t] for t in terms), dtype=np.int64, count=len(terms))
+        tfs = np.fromiter((term_freq[t] for t in terms), dtype=np.float64, count=len(terms))
+        max_df, min_df = vectorizer.max_df, vectorizer.min_df
+        high = max_df if isinstance(max_df, numbers.Integral) else max_df * n_docs
+        low = min_df if isinstance(min_df, numbers.Integral) else min_df * n_docs
+        mask = (dfs <= high) & (dfs >= low)
+        if vectorizer.max_features is not None and mask.sum() > vectorizer.max_features:
+            keep = np.where(mask)[0][(-tfs[mask]).argsort()[:vectorizer.max_features]]
+            mask = np.zeros(len(terms), dtype=bool)
+            mask[keep] = True
+        kept = np.where(mask)[0]
+        if len(kept) == 0:
+            raise ValueError("After pruning, no terms remain")
+        
+        vectorizer.vocabulary_ = {terms[i]: j for j, i in enumerate(kept)}
+        idf = np.full(len(kept), n_docs + 1, dtype=np.float64) / (dfs[kept] + 1.0)
+        vectorizer.idf_ = np.log(idf) + 1.0
+        return vectorizer
+        
     def extract_keywords(self, text: str) -> List[str]:
         """Extract relevant keywords from text"""
         # Simple keyword extraction using common patterns
@@ -159,23 +751,182 @@ class RelevanceAnalyzer:
         
         return list(set(keywords))
     
-    def calculate_relevance(self, sections_df: pd.DataFrame, persona: str, job: str) -> pd.DataFrame:
-        """Calculate relevance scores for each section"""
+    def hashed_vectors(self, sections_df: pd.DataFrame, query_text: str, texts=None) -> Tuple:
+        """Query and span TF-IDF vectors from the hashing term model"""
+        import numpy as np
+        from scipy import sparse
+        from span_text import frame_texts
+        
+        # Spans of each document, in order of first appearance
+        positions = sections_df.groupby('document', sort=False, observed=True).indices
+        texts = list(frame_texts(sections_df, texts))
+        doc_texts = {doc: [texts[i] for i in rows] for doc, rows in positions.items()}
+        
+        # Syncing changes the shared document frequencies; weight with a snapshot of them
+        with self._lock:
+            if self.term_model is None:
+                self.term_model = HashingTermModel(cache_dir=self.term_cache_dir, max_workers=self.max_workers)
+            matrices = self.term_model.sync(doc_texts)
+            idf = self.term_model.idf()
+        
+        counts = sparse.vstack(matrices).tocsr()
+        order = np.concatenate(list(positions.values()))
+        counts = counts[np.argsort(order)]
+        
+        query_counts = _hash_term_counts([query_text], self.term_model.n_features)
+        return self.term_model.tfidf(query_counts, idf), self.term_model.tfidf(counts, idf)
+    
+    def score_texts(self, texts: List[str], query_text: str):
+        """TF-IDF cosine similarity of free texts (e.g. whole pages) with a query"""
+        from sklearn.metrics.pairwise import cosine_similarity
+        
+        tfidf_matrix = self.build_vectorizer().fit_transform(texts + [query_text])
+        return cosine_similarity(tfidf_matrix[:-1], tfidf_matrix[-1]).ravel()
+    
+    def document_scores(self, documents: List[str], persona: str, job: str,
+                        chunk_size: int = 2000) -> Tuple:
+        """Score free-text documents (e.g. whole sections) with hashed TF-IDF
+        
+        No vocabulary is fitted: documents are hashed into a fixed feature
+        space (in parallel worker processes for large inputs) and weighted by
+        their own document frequencies. Returns the score arrays of
+        relevance_scores.
+        """
+        from itertools import repeat
+        from scipy import sparse
+        from sklearn.metrics.pairwise import cosine_similarity
+        from concurrent.futures import ProcessPoolExecutor
+        
+        term_model = HashingTermModel(max_workers=self.max_workers)
+        chunks = [documents[i:i + chunk_size] for i in range(0, len(documents), chunk_size)]
+        if len(chunks) > 1 and self.max_workers != 1:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                matrices = list(pool.map(_hash_term_counts, chunks, repeat(term_model.n_features)))
+        else:
+            matrices = [_hash_term_counts(chunk, term_model.n_features) for chunk in chunks]
+        counts = sparse.vstack(matrices).tocsr()
+        term_model.add_document("documents", counts)
+        
+        idf = term_model.idf()
+        query_counts = _hash_term_counts([f"{persona} {job}"], term_model.n_features)
+        similarities = cosine_similarity(term_model.tfidf(counts, idf), term_model.tfidf(query_counts, idf)).ravel()
+        return self.combine_scores(similarities, documents, persona, job)
+    
+    def collection_fingerprint(self, texts: List[str]) -> str:
+        """Content key of a span corpus for the current vectorizer mode"""
+        import hashlib
+        
+        digest = hashlib.sha256(f"{self.mode}:{self.lsa_components}:{self.max_features}:{self.ngram_max}".encode("utf-8"))
+        for text in texts:
+            digest.update(text.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+    
+    def collection_projection(self, texts: List[str], query_text: str) -> Tuple:
+        """Query vector and cached LSA projection for a span corpus (tfidf mode)"""
+        key = self.collection_fingerprint(texts)
+        with self._lock:
+            if key not in self.lsa_cache:
+                vectorizer = self.build_vectorizer()
+                tfidf_matrix = vectorizer.fit_transform(texts)
+                self.lsa_cache[key] = (vectorizer, LsaProjection.fit(tfidf_matrix, self.lsa_components))
+            vectorizer, projection = self.lsa_cache[key]
+        return vectorizer.transform([query_text]), projection
+    
+    def lsa_projection(self, document_vectors, sections_df: pd.DataFrame, index=None,
+                       texts=None) -> LsaProjection:
+        """LSA projection of span vectors, computed once per collection and cached
+        
+        Projections of indexed collections are stored alongside the index.
+        """
+        from span_text import frame_texts
+        
+        if index is not None and self.mode != "hashing":
+            with self._lock:
+                if not LsaProjection.exists(index.index_dir, self.lsa_components):
+                    projection = LsaProjection.fit(document_vectors, self.lsa_components)
+                    projection.save(index.index_dir, self.lsa_components)
+            return LsaProjection.load(index.index_dir, self.lsa_components)
+        
+        key = self.collection_fingerprint(list(frame_texts(sections_df, texts)))
+        with self._lock:
+            if key not in self.lsa_cache:
+                self.lsa_cache[key] = (None, LsaProjection.fit(document_vectors, self.lsa_components))
+            return self.lsa_cache[key][1]
+    
+    def calculate_relevance(self, sections_df: pd.DataFrame, persona: str, job: str,
+                            index=None, vectorizer=None, texts=None) -> pd.DataFrame:
+        """Calculate relevance scores for each section
+        
+        Returns a new DataFrame with ``relevance_score``, ``keyword_score``
+        and ``combined_score`` columns; ``sections_df`` is left unchanged.
+        """
+        return sections_df.assign(**self.relevance_scores(sections_df, persona, job, index, vectorizer, texts))
+    
+    def relevance_scores(self, sections_df: pd.DataFrame, persona: str, job: str,
+                         index=None, vectorizer=None, texts=None) -> Dict[str, Any]:
+        """Fresh float32 score arrays of every span for one query
+        
+        With a CollectionIndex the pre-computed span TF-IDF matrix is scored
+        directly against the query projected into the index vocabulary. In
+        "hashing" mode spans are vectorized per document into a fixed feature
+        space and weighted by incrementally maintained IDF counts. A
+        ``vectorizer`` from fit_streaming is only applied, so a collection can
+        be scored one chunk of spans at a time. Otherwise a TF-IDF vectorizer
+        local to this call is fitted on the spans plus the query.
+        
+        Span texts are decoded from ``texts`` (a SpanTexts buffer the frame's
+        text_offset/text_length columns point into) while they are tokenized;
+        without it the frame needs a plain ``text`` column.
+        """
+        import itertools
+        from sklearn.metrics.pairwise import cosine_similarity
+        from span_text import frame_texts
+        
         # Combine persona and job descriptions
         query_text = f"{persona} {job}"
         
-        # Prepare text corpus
-        documents = sections_df['text'].tolist() + [query_text]
-        
-        # Compute TF-IDF
-        tfidf_matrix = self.vectorizer.fit_transform(documents)
+        projection = None
+        normalized = False  # True if both sides are already L2-normalized
+        if self.mode == "hashing":
+            query_vector, document_vectors = self.hashed_vectors(sections_df, query_text, texts)
+        elif index is not None:
+            query_vector = index.query_vector(query_text)
+            document_vectors = index.tfidf_matrix()
+            normalized = True
+        elif vectorizer is not None:
+            query_vector = vectorizer.transform([query_text])
+            document_vectors = vectorizer.transform(frame_texts(sections_df, texts))
+        elif self.scoring == "lsa":
+            # The projection is reused across queries, so fit TF-IDF on the spans only
+            query_vector, projection = self.collection_projection(list(frame_texts(sections_df, texts)), query_text)
+        else:
+            # Prepare text corpus, decoded while it is tokenized
+            documents = itertools.chain(frame_texts(sections_df, texts), [query_text])
+            
+            # Compute TF-IDF
+            tfidf_matrix = self.build_vectorizer().fit_transform(documents)
+            
+            # Calculate similarity with query (last document)
+            query_vector = tfidf_matrix[-1]
+            document_vectors = tfidf_matrix[:-1]
         
-        # Calculate similarity with query (last document)
-        query_vector = tfidf_matrix[-1]
-        document_vectors = tfidf_matrix[:-1]
+        if self.scoring == "lsa":
+            if projection is None:
+                projection = self.lsa_projection(document_vectors, sections_df, index, texts)
+            similarities = projection.score(query_vector)
+        elif normalized:
+            # A plain product; cosine_similarity would normalize a copy of the mapped index matrix
+            similarities = (document_vectors @ query_vector.T).toarray().ravel()
+        else:
+            similarities = cosine_similarity(document_vectors, query_vector).flatten()
+        return self.combine_scores(similarities, frame_texts(sections_df, texts), persona, job)
+    
+    def combine_scores(self, similarities, texts, persona: str, job: str) -> Dict[str, Any]:
+        """Score arrays from span/query similarities plus persona and job keyword matches"""
+        import numpy as np
         
-        similarities = cosine_similarity(document_vectors, query_vector).flatten()
-        sections_df['relevance_score'] = similarities
+        relevance = np.asarray(similarities, dtype=np.float32)
         
         # Add keyword-based scoring
         persona_keywords = self.extract_keywords(persona)
@@ -187,168 +938,1016 @@ class RelevanceAnalyzer:
             matches = sum(1 for kw in all_keywords if kw.lower() in text_lower)
             return matches / len(all_keywords) if all_keywords else 0
         
-        sections_df['keyword_score'] = sections_df['text'].apply(keyword_score)
+        keywords = np.fromiter(map(keyword_score, texts), dtype=np.float32, count=len(relevance))
         
-        # Combined score
-        sections_df['combined_score'] = (
-            0.7 * sections_df['relevance_score'] + 
-            0.3 * sections_df['keyword_score']
-        )
-        
-        return sections_df
+        return {
+            "relevance_score": relevance,
+            "keyword_score": keywords,
+            # Combined score
+            "combined_score": np.float32(0.7) * relevance + np.float32(0.3) * keywords,
+        }
 
 class DocumentAnalyst:
-    """Main system orchestrator"""
+    """Main system orchestrator
     
-    def __init__(self):
+    An analyst holds the state of the analysis it is running (in-memory
+    PDFs, extraction issues, stage timings, the heading classifier trained
+    on the collection), so it runs one analysis at a time: analyses may
+    follow each other, but concurrent requests need an analyst each (the
+    RelevanceAnalyzer and ResultCache can be shared between them).
+    """
+    
+    def __init__(self, vectorizer_mode: str = "tfidf", term_cache_dir: str = None,
+                 scoring: str = "sparse", lsa_components: int = 128, dedupe: bool = False,
+                 result_cache=None, prefetch_depth: int = 2, memory_budget_mb: float = None,
+                 spill_dir: str = None, doc_timeout: float = None, page_timeout: float = None,
+                 extract_workers: int = None, checkpoint=None, granularity: str = "auto",
+                 outlines_dir: str = None, shards: int = None, classifier: str = "model",
+                 max_features: int = 1000, ngram_max: int = 2, top_k: int = 10, analyzer=None):
+        self.result_cache = result_cache
+        self.top_k = top_k
+        self.pdf_data = {}  # In-memory PDF bytes of the current analysis, by path
+        self.shards = shards
+        self.outlines = None
+        if outlines_dir:
+            from outline_store import OutlineStore
+            
+            self.outlines = OutlineStore(outlines_dir)
+        self.granularity = granularity
+        self.checkpoint = checkpoint
+        self.prefetch_depth = prefetch_depth
+        self.doc_timeout = doc_timeout
+        self.page_timeout = page_timeout
+        self.extract_workers = extract_workers
+        self.extraction_issues = []
+        self.stage_seconds = {}  # Wall time per pipeline stage of the current analysis
+        self._stage_started = None
+        self._running = threading.Lock()  # Held while an analysis runs (see analyze_documents)
+        self.spill_dir = spill_dir
+        self.memory_budget = None
+        if memory_budget_mb:
+            from span_spill import MemoryBudget
+            
+            self.memory_budget = MemoryBudget(int(memory_budget_mb * (1 << 20)))
         self.processor = DocumentProcessor()
-        self.classifier = HeadingClassifier()
-        self.analyzer = RelevanceAnalyzer()
+        self.deduplicator = NearDuplicateFilter() if dedupe else None
+        self.classifier = HeadingClassifier(classifier)
+        # A shared analyzer keeps its caches warm across analysts (it is safe for concurrent queries)
+        self.analyzer = analyzer or RelevanceAnalyzer(mode=vectorizer_mode, term_cache_dir=term_cache_dir,
+                                                      scoring=scoring, lsa_components=lsa_components,
+                                                      max_features=max_features, ngram_max=ngram_max)
+        if self.memory_budget is not None and not self.can_spill():
+            print("⚠️  Spilling needs --vectorizer tfidf, --scoring sparse and no --dedupe; tracking memory only")
+        if self.shards and not self.can_shard():
+            print("⚠️  Sharding needs --vectorizer tfidf, --scoring sparse, no --dedupe and span granularity; "
+                  "using a single index")
+    
+    def can_spill(self) -> bool:
+        """Spill mode streams the default TF-IDF path; the other modes need every span at once"""
+        return self.analyzer.mode == "tfidf" and self.analyzer.scoring == "sparse" and self.deduplicator is None
+    
+    def can_shard(self) -> bool:
+        """Shards are scored independently, so sections are ranked from span scores without a collection-wide pass"""
+        return (self.analyzer.mode == "tfidf" and self.analyzer.scoring == "sparse" and self.deduplicator is None
+                and self.granularity != "section")
+    
+    def use_shards(self) -> bool:
+        return bool(self.shards) and self.can_shard()
+    
+    def section_scoring(self, n_spans: int, indexed: bool = False) -> bool:
+        """True if sections are scored as whole documents (--granularity section, or auto on large collections)
+        
+        Section scores come from hashed TF-IDF, so auto only switches in the
+        default sparse TF-IDF mode without an index; an explicit --granularity
+        section overrides the selected scorer and says so.
+        """
+        default_scorer = self.analyzer.mode == "tfidf" and self.analyzer.scoring == "sparse" and not indexed
+        if self.granularity == "auto":
+            return default_scorer and n_spans >= SECTION_SCORING_MIN_SPANS
+        if self.granularity == "section" and not default_scorer:
+            print("⚠️  Section scoring uses hashed TF-IDF; ignoring --vectorizer, --scoring and the index vocabulary")
+        return self.granularity == "section"
+    
+    def end_stage(self, stage: str):
+        """Add the time since the previous stage ended to ``stage_seconds``; sample RSS when a memory budget is set"""
+        now = time.perf_counter()
+        if self._stage_started is not None:
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + now - self._stage_started
+        self._stage_started = now
+        if self.memory_budget is not None:
+            self.memory_budget.checkpoint(stage)
     
-    def group_into_sections(self, df: pd.DataFrame) -> List[Dict]:
+    def group_into_sections(self, df: pd.DataFrame, texts) -> List[Dict]:
         """Group text fragments into logical sections"""
-        sections = []
+        return list(self.iter_sections([(df, texts)]))
+    
+    def iter_sections(self, frames, orphans: List[Dict] = None) -> Iterator[Dict]:
+        """Yield sections from (span frame, SpanTexts) pairs given in document order
+        
+        A section still open at the end of one frame continues into the next,
+        so per-document frames group exactly like one combined frame. Section
+        titles and paragraphs are (SpanTexts, offset, length) references into
+        the text buffer of their frame; see span_text.text_of. Paragraphs
+        before the first heading are dropped, or appended to ``orphans``.
+        
+        Frames from NearDuplicateFilter.collapse_spans carry span provenance:
+        a section lists the copies of its spans under 'duplicates', and a
+        section whose whole body was collapsed into other sections is skipped.
+        """
         current_section = None
         
-        # Sort by document, page, and position
-        df_sorted = df.sort_values(['document', 'page', 'y0'])
+        def finished(section):
+            # Not heading-only because every paragraph was a near-duplicate kept elsewhere
+            return not (section.pop('dropped', 0) and not section['content'])
         
-        for _, row in df_sorted.iterrows():
-            if row['predicted_label'] in ['TITLE', 'H1', 'H2', 'H3']:
-                # Start new section
-                if current_section:
-                    sections.append(current_section)
+        # Iterate typed columns instead of iterrows(), which upcasts every row to object
+        columns = ['document', 'page', 'text_offset', 'text_length', 'length', 'predicted_label', 'combined_score']
+        provenance = ['duplicates', 'dropped_after']
+        for df, texts in frames:
+            # Sort by document, page, and position
+            df_sorted = df.sort_values(['document', 'page', 'y0'])
+            frame_columns = columns + [col for col in provenance if col in df_sorted.columns]
+            
+            for values in zip(*(df_sorted[col].to_numpy() for col in frame_columns)):
+                row = dict(zip(frame_columns, values))
+                row['page'] = int(row['page'])
+                text_ref = (texts, int(row['text_offset']), int(row['text_length']))
+                if row['predicted_label'] in ['TITLE', 'H1', 'H2', 'H3']:
+                    # Start new section
+                    if current_section and finished(current_section):
+                        yield current_section
+                    
+                    current_section = {
+                        'document': row['document'],
+                        'page': row['page'],
+                        'title_ref': text_ref,
+                        'content': [],
+                        'combined_score': row['combined_score'],
+                        'heading_level': row['predicted_label']
+                    }
+                elif row['predicted_label'] == 'P' and (current_section or orphans is not None):
+                    # Add paragraph to current section
+                    (current_section['content'] if current_section else orphans).append({
+                        'text_ref': text_ref,
+                        'length': int(row['length']),
+                        'page': row['page'],
+                        'score': row['combined_score']
+                    })
+                else:
+                    continue
                 
-                current_section = {
-                    'document': row['document'],
-                    'page': row['page'],
-                    'section_title': row['text'],
-                    'content': [],
-                    'combined_score': row['combined_score'],
-                    'heading_level': row['predicted_label']
-                }
-            elif current_section and row['predicted_label'] == 'P':
-                # Add paragraph to current section
-                current_section['content'].append({
-                    'text': row['text'],
-                    'page': row['page'],
-                    'score': row['combined_score']
-                })
+                if current_section is not None and (row.get('duplicates') or row.get('dropped_after')):
+                    current_section['dropped'] = current_section.get('dropped', 0) + int(row['dropped_after'])
+                    duplicates = current_section.setdefault('duplicates', [])
+                    for copy in row['duplicates'] or []:
+                        if copy not in duplicates:
+                            duplicates.append(copy)
         
         # Add final section
-        if current_section:
-            sections.append(current_section)
+        if current_section and finished(current_section):
+            yield current_section
+    
+    def score_section(self, section: Dict) -> Dict:
+        """Set the content statistics and importance score of one section"""
+        import numpy as np
         
-        return sections
+        if section['content']:
+            content_scores = [item['score'] for item in section['content']]
+            section['avg_content_score'] = np.mean(content_scores)
+            section['max_content_score'] = np.max(content_scores)
+            section['content_length'] = sum(item['length'] for item in section['content'])
+        else:
+            section['avg_content_score'] = 0
+            section['max_content_score'] = 0
+            section['content_length'] = 0
+        
+        # Final importance score
+        section['importance_score'] = (
+            0.4 * section['combined_score'] +
+            0.3 * section['avg_content_score'] +
+            0.2 * section['max_content_score'] +
+            0.1 * min(section['content_length'] / 1000, 1.0)  # Normalize content length
+        )
+        return section
     
-    def rank_sections(self, sections: List[Dict], top_k: int = 10) -> List[Dict]:
-        """Rank sections by importance"""
-        # Calculate section scores
-        for section in sections:
-            if section['content']:
-                content_scores = [item['score'] for item in section['content']]
-                section['avg_content_score'] = np.mean(content_scores)
-                section['max_content_score'] = np.max(content_scores)
-                section['content_length'] = sum(len(item['text']) for item in section['content'])
-            else:
-                section['avg_content_score'] = 0
-                section['max_content_score'] = 0
-                section['content_length'] = 0
-            
-            # Final importance score
-            section['importance_score'] = (
-                0.4 * section['combined_score'] +
-                0.3 * section['avg_content_score'] +
-                0.2 * section['max_content_score'] +
-                0.1 * min(section['content_length'] / 1000, 1.0)  # Normalize content length
-            )
+    def rank_sections(self, sections: Iterable[Dict], top_k: int = 10) -> List[Dict]:
+        """Rank sections by importance
         
-        # Sort by importance and return top-k
-        sections_sorted = sorted(sections, key=lambda x: x['importance_score'], reverse=True)
+        ``sections`` may be a stream; only the running top-k is kept, with ties
+        in input order as with a stable sort.
+        """
+        top_sections = heapq.nlargest(top_k, map(self.score_section, sections),
+                                      key=lambda x: x['importance_score'])
         
         # Add ranking
-        for i, section in enumerate(sections_sorted[:top_k]):
+        for i, section in enumerate(top_sections):
+            section['importance_rank'] = i + 1
+        
+        return top_sections
+    
+    def rank_sections_by_text(self, sections: List[Dict], persona: str, job: str,
+                              top_k: int = 10) -> List[Dict]:
+        """Section-level scoring: one TF-IDF document (heading plus body) per section
+        
+        Sections are ranked by their own relevance plus the content-length
+        prior of score_section. Paragraph scores are not needed:
+        subsection_analysis scores the sentences of the top-k sections.
+        """
+        from span_text import text_of
+        
+        documents = [
+            text_of(section['title_ref']) + ' ' + ' '.join(text_of(item['text_ref']) for item in section['content'])
+            for section in sections
+        ]
+        scores = self.analyzer.document_scores(documents, persona, job)
+        del documents
+        
+        for section, combined_score in zip(sections, scores['combined_score']):
+            section['combined_score'] = combined_score
+            section['content_length'] = sum(item['length'] for item in section['content'])
+            section['importance_score'] = 0.9 * combined_score + 0.1 * min(section['content_length'] / 1000, 1.0)
+        
+        top_sections = heapq.nlargest(top_k, sections, key=lambda x: x['importance_score'])
+        for i, section in enumerate(top_sections):
             section['importance_rank'] = i + 1
+        return top_sections
+    
+    def select_candidate_pages(self, pdf_paths: List[str], persona: str, job: str,
+                               top_n: int, neighbors: int = 1) -> Dict[str, set]:
+        """First tier: score plain page texts and keep the top-N pages plus neighbors"""
+        import numpy as np
+        
+        print("🔄 Pre-filtering pages...")
+        pages = []  # (pdf_path, page_number, page_count)
+        texts = []
+        for pdf_path, data in self.read_pdfs(pdf_paths):
+            page_texts = self.processor.extract_page_texts(pdf_path, data)
+            for page_num, text in enumerate(page_texts, 1):
+                pages.append((pdf_path, page_num, len(page_texts)))
+                texts.append(text)
+        
+        candidates = {pdf_path: set() for pdf_path in pdf_paths}
+        if not texts:
+            return candidates
+        
+        scores = self.analyzer.score_texts(texts, f"{persona} {job}")
+        for i in np.argsort(-scores, kind="stable")[:top_n]:
+            pdf_path, page_num, page_count = pages[i]
+            for neighbor in range(page_num - neighbors, page_num + neighbors + 1):
+                if 1 <= neighbor <= page_count:
+                    candidates[pdf_path].add(neighbor)
+        
+        selected = sum(len(p) for p in candidates.values())
+        print(f"📄 Selected {selected}/{len(texts)} candidate pages")
+        return candidates
+    
+    def iter_document_spans(self, pdf_paths: List[str], candidate_pages: Dict[str, set] = None) -> Iterator[List[Dict]]:
+        """Yield the extracted spans of each document, in input order
+        
+        With ``candidate_pages`` only those pages of each PDF get the detailed
+        span-level extraction. Documents with a current Challenge 1a outline
+        are not extracted: their outline spans come already labeled.
+        """
+        def pages_of(pdf_path):
+            return candidate_pages.get(pdf_path, set()) if candidate_pages is not None else None
+        
+        outlined = set()
+        if self.outlines is not None:
+            outlined = {pdf_path for pdf_path in pdf_paths if self.outlines.has(pdf_path)}
+            print(f"📑 Using Challenge 1a outlines for {len(outlined)}/{len(pdf_paths)} documents")
+        
+        extracted = self.iter_extracted_spans([p for p in pdf_paths if p not in outlined], pages_of)
+        for pdf_path in pdf_paths:
+            # Outlines are loaded one document at a time; an unreadable one falls back to extraction
+            spans = self.outlines.spans(pdf_path, pages_of(pdf_path)) if pdf_path in outlined else None
+            if spans is not None:
+                yield spans
+            elif pdf_path in outlined:
+                yield from self.iter_extracted_spans([pdf_path], pages_of)
+            else:
+                yield next(extracted)
+    
+    def iter_extracted_spans(self, pdf_paths: List[str], pages_of) -> Iterator[List[Dict]]:
+        """Yield the extracted spans of each document, in input order
+        
+        With a checkpoint journal, documents it already holds are loaded from
+        it and newly extracted ones are recorded.
+        """
+        if self.checkpoint is None:
+            for pdf_path, sections, issues in self.extract_documents(pdf_paths, pages_of):
+                yield sections
+            return
+        
+        keys = {pdf_path: self.checkpoint.document_key(pdf_path, pages_of(pdf_path)) for pdf_path in pdf_paths}
+        missing = {pdf_path for pdf_path in pdf_paths if not self.checkpoint.has_document(keys[pdf_path])}
+        if len(missing) < len(pdf_paths):
+            print(f"♻️  Reusing {len(pdf_paths) - len(missing)} checkpointed document extractions")
         
-        return sections_sorted[:top_k]
+        extracted = self.extract_documents([p for p in pdf_paths if p in missing], pages_of)
+        for pdf_path in pdf_paths:
+            # Checkpointed spans are loaded one document at a time
+            sections = self.checkpoint.document_spans(keys[pdf_path]) if pdf_path not in missing else None
+            if sections is not None:
+                yield sections
+                continue
+            
+            source = extracted if pdf_path in missing else self.extract_documents([pdf_path], pages_of)
+            _, sections, issues = next(source)
+            if not issues:  # Documents with timeouts are extracted again on resume
+                self.checkpoint.record_document(keys[pdf_path], os.path.basename(pdf_path), sections)
+            yield sections
     
-    def analyze_documents(self, pdf_paths: List[str], persona: str, job: str) -> Dict[str, Any]:
-        """Main analysis pipeline"""
+    def extract_documents(self, pdf_paths: List[str], pages_of) -> Iterator[Tuple[str, List[Dict], List[Dict]]]:
+        """Yield (pdf_path, spans, issues) per document, in input order
+        
+        With a document or page timeout, extraction runs in watchdog-supervised
+        worker processes and timeouts are collected in ``extraction_issues``.
+        """
+        if self.doc_timeout or self.page_timeout:
+            from extraction_watchdog import ExtractionWatchdog
+            
+            watchdog = ExtractionWatchdog(self.processor, self.extract_workers,
+                                          self.doc_timeout, self.page_timeout)
+            tasks = [(p, pages_of(p), self.pdf_data.get(p)) for p in pdf_paths]
+            for pdf_path, sections, issues in watchdog.extract(tasks):
+                self.extraction_issues.extend(issues)
+                yield pdf_path, sections, issues
+            return
+        
+        for pdf_path, data in self.read_pdfs(pdf_paths):
+            yield pdf_path, self.processor.extract_text_with_structure(pdf_path, pages_of(pdf_path), data), []
+    
+    def read_pdfs(self, pdf_paths: List[str]) -> Iterator[Tuple[str, bytes]]:
+        """Yield (path, bytes) in input order: in-memory PDFs directly, the others prefetched from disk"""
+        from_disk = prefetch_pdfs([p for p in pdf_paths if p not in self.pdf_data], self.prefetch_depth)
+        for pdf_path in pdf_paths:
+            if pdf_path in self.pdf_data:
+                yield pdf_path, self.pdf_data[pdf_path]
+            else:
+                yield next(from_disk)
+    
+    def extract_spans(self, pdf_paths: List[str], candidate_pages: Dict[str, set] = None) -> Tuple:
+        """Extract and classify spans from all documents
+        
+        Returns the span table and the SpanTexts buffer its text_offset and
+        text_length columns point into.
+        """
+        from span_text import SpanTexts
+        
         print("🔄 Extracting text from documents...")
         
-        # Extract text from all documents
+        # Extract text from all documents; texts move into one buffer as each document arrives
+        texts = SpanTexts()
         all_sections = []
-        for pdf_path in pdf_paths:
-            sections = self.processor.extract_text_with_structure(pdf_path)
-            all_sections.extend(sections)
+        for sections in self.iter_document_spans(pdf_paths, candidate_pages):
+            all_sections.extend(texts.add_spans(sections))
+        return self.classify_spans(all_sections, texts), texts
+    
+    def extract_spans_progressively(self, pdf_paths: List[str], persona: str, job: str, on_progress,
+                                    candidate_pages: Dict[str, set] = None, top_k: int = 10) -> Tuple:
+        """Extract spans like extract_spans, reporting an interim ranking after each document
+        
+        Interim rankings are cheap estimates: each finished document is
+        classified by a heading model trained on the first one, scored with
+        hashed term counts weighted by the document frequencies seen so far,
+        and its sections are pushed onto a running top-k heap. Earlier
+        sections keep the scores they got on arrival. ``on_progress`` is
+        called with an output dict (see build_output) whose metadata carries
+        ``progress``. The returned span table and texts are the ones
+        extract_spans builds, so the final ranking equals the batch result.
+        """
+        import pandas as pd
+        from sklearn.metrics.pairwise import cosine_similarity
+        from span_text import SpanTexts, frame_texts
+        
+        print("🔄 Extracting text from documents (progressive)...")
+        start_time = time.perf_counter()
+        term_model = HashingTermModel(max_workers=1)
+        query_counts = _hash_term_counts([f"{persona} {job}"], term_model.n_features)
+        classifier = HeadingClassifier(self.classifier.mode)
+        heap = []  # (importance_score, -arrival, section): min-heap of the running top-k
+        arrival = 0
+        total_sections = 0
+        
+        texts = SpanTexts()
+        all_sections = []
+        for done, (pdf_path, sections) in enumerate(
+                zip(pdf_paths, self.iter_document_spans(pdf_paths, candidate_pages)), 1):
+            all_sections.extend(texts.add_spans(sections))
+            if sections:
+                df = self.label_spans(compact_span_frame(pd.DataFrame(sections)), classifier, train=False)
+                counts = _hash_term_counts(list(frame_texts(df, texts)), term_model.n_features).tocsr()
+                term_model.add_document(pdf_path, counts)
+                idf = term_model.idf()
+                similarities = cosine_similarity(term_model.tfidf(counts, idf),
+                                                 term_model.tfidf(query_counts, idf)).ravel()
+                df = df.assign(**self.analyzer.combine_scores(similarities, frame_texts(df, texts), persona, job))
+                
+                for section in map(self.score_section, self.iter_sections([(df, texts)])):
+                    # Ties keep the earlier section, as in rank_sections
+                    item = (section['importance_score'], -arrival, section)
+                    arrival += 1
+                    total_sections += 1
+                    if len(heap) < top_k:
+                        heapq.heappush(heap, item)
+                    elif item[:2] > heap[0][:2]:
+                        heapq.heapreplace(heap, item)
+            
+            ranked = [dict(item[2], importance_rank=rank)
+                      for rank, item in enumerate(sorted(heap, key=lambda item: item[:2], reverse=True), 1)]
+            interim = self.build_output(pdf_paths, persona, job, total_sections, ranked)
+            interim["metadata"]["progress"] = {
+                "documents_done": done,
+                "documents_total": len(pdf_paths),
+                "last_document": os.path.basename(pdf_path),
+                "elapsed_seconds": round(time.perf_counter() - start_time, 3),
+                "final": False,
+            }
+            on_progress(interim)
+        
+        return self.classify_spans(all_sections, texts), texts
+    
+    def extract_spans_within_budget(self, pdf_paths: List[str],
+                                    candidate_pages: Dict[str, set] = None) -> Tuple:
+        """Extract spans in memory until the memory budget is approached, then spill
+        
+        Returns ``(df, texts, None)`` if the collection fit in memory,
+        otherwise ``(None, None, spill)`` with every document's compact spans
+        and texts in a SpanSpill.
+        """
+        import pandas as pd
+        from span_spill import SpanSpill
+        from span_text import SpanTexts
+        
+        print("🔄 Extracting text from documents...")
+        texts = SpanTexts()
+        documents = []
+        spill = None
+        for sections in self.iter_document_spans(pdf_paths, candidate_pages):
+            if not sections:
+                continue
+            documents.append(texts.add_spans(sections))
+            rss = self.memory_budget.checkpoint("extract")
+            if spill is None and not self.memory_budget.approaching(rss):
+                continue
+            
+            if spill is None:
+                spill = SpanSpill(self.spill_dir)
+                print(f"💾 RSS {rss / (1 << 20):.0f} MB is near the "
+                      f"{self.memory_budget.limit_bytes / (1 << 20):.0f} MB budget, spilling spans to {spill.spill_dir}")
+            while documents:
+                spill.append(compact_span_frame(pd.DataFrame(documents.pop(0))), texts)
+            texts = SpanTexts()  # Spilled texts are not kept in memory
+        
+        if spill is not None:
+            return None, None, spill
+        return self.classify_spans([span for sections in documents for span in sections], texts), texts, None
+    
+    def classify_spans(self, all_sections: List[Dict], texts=None) -> pd.DataFrame:
+        """Build the compact span table and classify headings
+        
+        ``texts`` is the SpanTexts buffer the spans' text references point
+        into (spans may instead still carry a plain 'text').
+        """
+        import pandas as pd
         
         if not all_sections:
             raise ValueError("No meaningful text extracted from documents")
+        self.end_stage("extract")
         
         # Convert to DataFrame
-        df = pd.DataFrame(all_sections)
-        df['bold'] = df['bold'].astype(int)
+        df = compact_span_frame(pd.DataFrame(all_sections))
+        
+        if self.deduplicator:
+            df = self.deduplicator.collapse_spans(df, texts)
         
         print("🔄 Classifying headings...")
         # Classify headings
-        self.classifier.train(df)
-        df = self.classifier.predict(df)
+        df = self.label_spans(df, self.classifier)
+        self.end_stage("classify")
+        return df
+    
+    def label_spans(self, df: pd.DataFrame, classifier: HeadingClassifier, train: bool = True) -> pd.DataFrame:
+        """Predict heading labels, keeping those that came with the spans (1a outlines)
+        
+        The heading model is trained on, and applied to, the spans without a
+        label only.
+        """
+        import pandas as pd
+        
+        if 'predicted_label' not in df.columns:
+            if train:
+                classifier.train(df)
+            return classifier.predict(df)
+        
+        outlined = df['predicted_label'].notna().to_numpy()
+        if outlined.all():
+            return df
+        
+        extracted = df.loc[~outlined].drop(columns='predicted_label')
+        if train:
+            classifier.train(extracted)
+        labels = df['predicted_label'].to_numpy(dtype=object, copy=True)
+        labels[~outlined] = classifier.predict(extracted)['predicted_label'].astype(object).to_numpy()
+        df['predicted_label'] = pd.Categorical(labels)
+        return df
+    
+    def analyze_spilled(self, spill, persona: str, job: str) -> Tuple[int, List[Dict]]:
+        """Classify, score, group and rank spilled spans one document at a time
+        
+        The heading model and TF-IDF vocabulary are fitted over the whole
+        collection first, from features and texts streamed off disk, so the
+        ranking equals the in-memory path. Only the running top-k sections
+        are kept. Returns the total section count and the top sections.
+        """
+        import pandas as pd
+        
+        if not spill.chunks:
+            raise ValueError("No meaningful text extracted from documents")
+        
+        print("🔄 Classifying headings...")
+        # Documents spilled from 1a outlines are already labeled
+        unlabeled = [i for i, chunk in enumerate(spill.chunks) if chunk['labels'] is None]
+        if unlabeled:
+            self.classifier.train(pd.concat((spill.frame(i, FEATURE_COLUMNS) for i in unlabeled), ignore_index=True))
+        self.end_stage("classify")
         
         print("🔄 Analyzing relevance...")
-        # Analyze relevance
-        df = self.analyzer.calculate_relevance(df, persona, job)
+        vectorizer = self.analyzer.fit_streaming(spill.texts(), f"{persona} {job}")
+        self.end_stage("relevance")
+        
+        def scored_frames():
+            # Documents in the order group_into_sections sorts them
+            for i in sorted(range(len(spill.chunks)), key=lambda i: spill.chunks[i]['document']):
+                df = spill.frame(i)
+                if spill.chunks[i]['labels'] is None:
+                    df = self.classifier.predict(df)
+                texts = spill.chunk_texts(i)
+                yield self.analyzer.calculate_relevance(df, persona, job, vectorizer=vectorizer, texts=texts), texts
+                self.end_stage("relevance")
+        
+        total_sections = 0
+        
+        def counted(sections):
+            nonlocal total_sections
+            for section in sections:
+                total_sections += 1
+                yield section
+        
+        print("🔄 Grouping and ranking sections...")
+        top_sections = self.rank_sections(counted(self.iter_sections(scored_frames())), self.top_k)
+        self.end_stage("sections")
+        return total_sections, top_sections
+    
+    def build_index(self, pdf_paths: List[str], index_dir: str):
+        """Extract, classify and vectorize a collection into an on-disk index
+        
+        With shards (see use_shards), the TF-IDF vectorizer is still fitted
+        on the whole collection and each shard stores its rows.
+        """
+        from collection_index import CollectionIndex
+        from sharded_index import ShardedIndex
+        from span_text import frame_texts
+        
+        df, texts = self.extract_spans(pdf_paths)
+        
+        print("🔄 Building collection index...")
+        vectorizer = self.analyzer.build_vectorizer()
+        tfidf_matrix = vectorizer.fit_transform(frame_texts(df, texts))
+        if self.use_shards():
+            return ShardedIndex.build(index_dir, df, pdf_paths, vectorizer, tfidf_matrix, self.shards,
+                                      settings=self.index_settings(pdf_paths), texts=texts)
+        return CollectionIndex.build(index_dir, df, pdf_paths, vectorizer, tfidf_matrix,
+                                     settings=self.index_settings(pdf_paths), texts=texts)
+    
+    def index_settings(self, pdf_paths: List[str] = None) -> Dict[str, Any]:
+        """Extraction settings baked into a collection index"""
+        settings = {
+            "dedupe": self.deduplicator is not None,
+            "classifier": self.classifier.mode,
+            "max_features": self.analyzer.max_features,
+            "ngram_max": self.analyzer.ngram_max,
+        }
+        if self.outlines is not None and pdf_paths is not None:
+            settings["outlines"] = self.outlines.fingerprint(pdf_paths)
+        if self.use_shards():
+            settings["shards"] = self.shards
+        return settings
+    
+    def load_index(self, pdf_paths: List[str], index_dir: str):
+        """Open the collection index, rebuilding it if missing or stale
+        
+        A sharded index lives in SHARDED_INDEX_DIRNAME next to ``index_dir``.
+        """
+        from collection_index import CollectionIndex
+        from sharded_index import ShardedIndex
+        
+        index_class = CollectionIndex
+        if self.use_shards():
+            index_class = ShardedIndex
+            index_dir = os.path.join(os.path.dirname(os.path.normpath(index_dir)), SHARDED_INDEX_DIRNAME)
+        if index_class.exists(index_dir):
+            try:
+                index = index_class.open(index_dir)
+            except ValueError as e:
+                print(f"⚠️  {e}; rebuilding")
+            else:
+                if index.matches(pdf_paths, self.index_settings(pdf_paths)):
+                    print(f"📦 Using collection index: {index_dir}")
+                    return index
+        return self.build_index(pdf_paths, index_dir)
+    
+    def analyze_sharded(self, index, persona: str, job: str, top_k: int = 10) -> Tuple[int, List[Dict]]:
+        """Score the shards of a ShardedIndex in worker processes and merge their rankings
         
-        print("🔄 Grouping into sections...")
-        # Group into sections
-        sections = self.group_into_sections(df)
+        Each worker scores and groups one shard and returns its local top-k
+        sections plus the paragraphs that lead into it and the section left
+        open at its end. Stitching those boundary sections in shard order
+        and ranking them with the local top-k lists yields exactly the
+        unsharded top-k: a section in the global top-k is in its shard's.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from itertools import repeat
+        from collection_index import CollectionIndex
         
-        print("🔄 Ranking sections...")
-        # Rank sections
-        top_sections = self.rank_sections(sections)
+        shard_dirs = index.shard_dirs
+        workers = min(len(shard_dirs), os.cpu_count() or 1)
+        print(f"🔄 Scoring {len(shard_dirs)} shards in {workers} worker processes...")
+        args = (shard_dirs, repeat(persona), repeat(job), repeat(top_k))
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_score_shard, *args))
+        else:
+            results = list(map(_score_shard, *args))
+        
+        def attach(item, key, texts):
+            item[key] = (texts,) + tuple(item[key])
+        
+        total_sections = 0
+        candidates = []  # In collection order, as the unsharded ranking sees them
+        open_section = None
+        for shard_dir, result in zip(shard_dirs, results):
+            texts = CollectionIndex.open(shard_dir).span_texts()
+            for section in result['sections'] + ([result['tail']] if result['tail'] else []):
+                attach(section, 'title_ref', texts)
+                for item in section['content']:
+                    attach(item, 'text_ref', texts)
+            for item in result['head']:
+                attach(item, 'text_ref', texts)
+            
+            # Paragraphs before the shard's first heading continue the previous shard's last section
+            if open_section is not None:
+                open_section['content'].extend(result['head'])
+            if result['n_sections'] or result['tail']:
+                if open_section is not None:
+                    candidates.append(open_section)
+                    total_sections += 1
+                candidates.extend(result['sections'])
+                total_sections += result['n_sections']
+                open_section = result['tail']
+        if open_section is not None:
+            candidates.append(open_section)
+            total_sections += 1
+        
+        return total_sections, self.rank_sections(candidates, top_k)
+    
+    def settings(self, index_dir: str = None, candidate_pages: int = None,
+                 pdf_paths: List[str] = None) -> Dict[str, Any]:
+        """Options that influence the analysis result (with ``pdf_paths``, also the outlines used)"""
+        settings = {
+            "vectorizer": self.analyzer.mode,
+            "scoring": self.analyzer.scoring,
+            "lsa_components": self.analyzer.lsa_components,
+            "dedupe": self.deduplicator is not None,
+            "index": bool(index_dir),
+            "candidate_pages": candidate_pages,
+            "granularity": self.granularity,
+            "classifier": self.classifier.mode,
+            "max_features": self.analyzer.max_features,
+            "ngram_max": self.analyzer.ngram_max,
+            "top_k": self.top_k,
+        }
+        if self.outlines is not None and pdf_paths is not None:
+            settings["outlines"] = self.outlines.fingerprint(pdf_paths)
+        if index_dir and self.use_shards():
+            settings["shards"] = self.shards
+        return settings
+    
+    def build_output(self, pdf_paths: List[str], persona: str, job: str, total_sections: int,
+                     top_sections: List[Dict]) -> Dict[str, Any]:
+        """Output JSON structure for ranked sections; the only place section texts are decoded"""
+        from span_text import text_of
         
-        # Prepare output
         output = {
             "metadata": {
                 "input_documents": [os.path.basename(path) for path in pdf_paths],
                 "persona": persona,
                 "job_to_be_done": job,
                 "processing_timestamp": datetime.now().isoformat(),
-                "total_sections_found": len(sections),
+                "total_sections_found": total_sections,
                 "top_sections_returned": len(top_sections)
             },
             "extracted_sections": [],
             "subsection_analysis": []
         }
         
+        titles = [text_of(section['title_ref']) for section in top_sections]
+        
         # Fill extracted sections
-        for section in top_sections:
-            output["extracted_sections"].append({
+        for section, title in zip(top_sections, titles):
+            extracted = {
                 "document": section['document'],
                 "page_number": section['page'],
-                "section_title": section['section_title'],
+                "section_title": title,
                 "importance_rank": section['importance_rank'],
-                "importance_score": round(section['importance_score'], 4)
-            })
+                "importance_score": round(float(section['importance_score']), 4)
+            }
+            if section.get('duplicates'):
+                extracted["duplicates"] = section['duplicates']
+            output["extracted_sections"].append(extracted)
         
         # Fill subsection analysis
-        for section in top_sections:
-            for i, content_item in enumerate(section['content'][:3]):  # Top 3 paragraphs per section
-                refined_text = content_item['text']
-                if len(refined_text) > 500:
-                    refined_text = refined_text[:500] + "..."
-                
-                output["subsection_analysis"].append({
-                    "document": section['document'],
-                    "section_title": section['section_title'],
-                    "refined_text": refined_text,
-                    "page_number": content_item['page'],
-                    "relevance_score": round(content_item['score'], 4)
-                })
+        output["subsection_analysis"] = self.refine_sections(top_sections, titles, persona, job)
+        
+        return output
+    
+    def refine_sections(self, sections: List[Dict], titles: List[str], persona: str, job: str,
+                        char_budget: int = REFINED_TEXT_CHARS) -> List[Dict]:
+        """Extractive refined_text for each section: its best sentences, in reading order
+        
+        The paragraphs of each section are joined and split into sentences,
+        and the sentences of all given sections are scored against the query
+        in one sparse matrix product (hashed TF-IDF, see document_scores).
+        Per section the top REFINED_MAX_SENTENCES sentences are selected with
+        argpartition and kept best-first while they fit ``char_budget``. The
+        best sentence is always kept (page and score are its); if it alone is
+        longer than the budget it is cut and stands alone. Only the content of
+        these sections is read, so the cost is linear in it.
+        """
+        import numpy as np
+        from span_text import text_of
+        
+        sentences, pages, bounds = [], [], []
+        for section in sections:
+            start = len(sentences)
+            texts = [text_of(item['text_ref']) for item in section['content']]
+            # Paragraph start offsets in the joined section text, to find each sentence's page
+            starts = np.cumsum([0] + [len(text) + 1 for text in texts[:-1]])
+            for match in SENTENCE_PATTERN.finditer(' '.join(texts)):
+                sentences.append(match.group())
+                pages.append(section['content'][np.searchsorted(starts, match.start(), side='right') - 1]['page'])
+            bounds.append((start, len(sentences)))
+        if not sentences:
+            return []
+        
+        scores = self.analyzer.document_scores(sentences, persona, job)['combined_score']
+        
+        refined = []
+        for section, title, (start, end) in zip(sections, titles, bounds):
+            if start == end:
+                continue
+            section_scores = scores[start:end]
+            k = min(REFINED_MAX_SENTENCES, end - start)
+            top = np.argpartition(-section_scores, k - 1)[:k]
+            # Best first, ties in reading order
+            top = top[np.lexsort((top, -section_scores[top]))]
+            
+            best = int(top[0])
+            if len(sentences[start + best]) > char_budget:
+                # The best sentence always leads (it sets page and score), cut to the budget
+                refined_text = sentences[start + best][:char_budget] + "..."
+            else:
+                chosen, used = [best], len(sentences[start + best])
+                for i in top[1:].tolist():
+                    length = len(sentences[start + i]) + 1
+                    if used + length <= char_budget:
+                        chosen.append(i)
+                        used += length
+                refined_text = ' '.join(sentences[start + i] for i in sorted(chosen))
+            
+            refined.append({
+                "document": section['document'],
+                "section_title": title,
+                "refined_text": refined_text,
+                "page_number": pages[start + best],
+                "relevance_score": round(float(section_scores[best]), 4)
+            })
+        return refined
+    
+    def analyze_documents(self, pdf_paths: List[str], persona: str, job: str,
+                          index_dir: str = None, candidate_pages: int = None,
+                          on_progress=None, pdf_data: Dict[str, bytes] = None) -> Dict[str, Any]:
+        """Main analysis pipeline
+        
+        If ``index_dir`` is given, spans, labels and TF-IDF vectors are read
+        from a memory-mapped collection index instead of being recomputed.
+        Otherwise ``candidate_pages`` enables two-tier extraction: only the
+        top-N pages by plain-text relevance (and their neighbors) are
+        extracted in detail.
+        
+        With a ResultCache, a repeated request for the same PDF contents,
+        persona, job and settings returns the stored output directly. With a
+        memory budget, spans are spilled to disk once RSS approaches it and
+        the remaining stages stream one document at a time. Extraction
+        timeouts and errors are listed in ``metadata.extraction_issues``.
+        The wall time of each stage is left in ``stage_seconds``.
+        
+        With section granularity (see section_scoring) spans are grouped
+        first and each section is scored as one document; spilled
+        collections are always scored span by span. With shards (see
+        use_shards) an indexed collection is scored one shard per worker
+        process, span by span.
+        
+        ``on_progress`` receives an interim ranking after every extracted
+        document (see extract_spans_progressively) and finally the result
+        itself, marked ``final`` in ``metadata.progress``.
+        
+        ``pdf_data`` maps paths to PDF bytes already in memory; those paths
+        are only names and nothing is read from disk for them. In-memory
+        PDFs cannot be indexed.
+        
+        Raises RuntimeError if this analyst is already running an analysis.
+        """
+        if not self._running.acquire(blocking=False):
+            raise RuntimeError("DocumentAnalyst is already running an analysis; use one analyst per request")
+        try:
+            return self._analyze_documents(pdf_paths, persona, job, index_dir, candidate_pages, on_progress,
+                                           pdf_data)
+        finally:
+            self._running.release()
+    
+    def _analyze_documents(self, pdf_paths: List[str], persona: str, job: str, index_dir: str,
+                           candidate_pages: int, on_progress, pdf_data: Dict[str, bytes]) -> Dict[str, Any]:
+        self.pdf_data = dict(pdf_data or {})
+        if index_dir and self.pdf_data:
+            raise ValueError("In-memory PDFs cannot be used with a collection index")
+        
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = self.result_cache.key(pdf_paths, persona, job, PIPELINE_VERSION,
+                                              self.settings(index_dir, candidate_pages, pdf_paths),
+                                              pdf_data=self.pdf_data)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                print("⚡ Returning cached result")
+                if on_progress is not None:
+                    on_progress(self.final_progress(cached, len(pdf_paths)))
+                return cached
+        
+        if self.memory_budget is not None:
+            self.memory_budget.reset()
+        self.extraction_issues = []
+        self.stage_seconds = {}
+        self._stage_started = time.perf_counter()
+        
+        spill = None
+        sharded = bool(index_dir) and self.use_shards()
+        if sharded:
+            # Workers read the shards; nothing is loaded here
+            index = self.load_index(pdf_paths, index_dir)
+            df = texts = None
+        elif index_dir:
+            index = self.load_index(pdf_paths, index_dir)
+            df = index.to_frame()
+            texts = index.span_texts()
+        else:
+            index = None
+            pages = None
+            if candidate_pages:
+                pages = self.select_candidate_pages(pdf_paths, persona, job, candidate_pages)
+                self.end_stage("pages")
+            if self.memory_budget is not None and self.can_spill():
+                df, texts, spill = self.extract_spans_within_budget(pdf_paths, pages)
+            elif on_progress is not None:
+                df, texts = self.extract_spans_progressively(pdf_paths, persona, job, on_progress, pages,
+                                                             self.top_k)
+            else:
+                df, texts = self.extract_spans(pdf_paths, pages)
+        self.end_stage("extract")
+        
+        if spill is not None:
+            with spill:
+                total_sections, top_sections = self.analyze_spilled(spill, persona, job)
+        elif sharded:
+            total_sections, top_sections = self.analyze_sharded(index, persona, job, self.top_k)
+            self.end_stage("sections")
+        elif self.section_scoring(len(df), indexed=index is not None):
+            print("🔄 Grouping into sections...")
+            # Group first; spans carry no scores yet
+            sections = self.group_into_sections(df.assign(combined_score=0.0), texts)
+            if self.deduplicator:
+                sections = self.deduplicator.collapse_sections(sections)
+            
+            print("🔄 Scoring sections...")
+            total_sections = len(sections)
+            top_sections = self.rank_sections_by_text(sections, persona, job, self.top_k) if sections else []
+            self.end_stage("sections")
+        else:
+            print("🔄 Analyzing relevance...")
+            # Analyze relevance
+            df = self.analyzer.calculate_relevance(df, persona, job, index=index, texts=texts)
+            self.end_stage("relevance")
+            
+            print("🔄 Grouping into sections...")
+            # Group into sections
+            sections = self.group_into_sections(df, texts)
+            if self.deduplicator:
+                sections = self.deduplicator.collapse_sections(sections)
+            
+            print("🔄 Ranking sections...")
+            # Rank sections
+            total_sections = len(sections)
+            top_sections = self.rank_sections(sections, self.top_k)
+            self.end_stage("sections")
+        
+        output = self.build_output(pdf_paths, persona, job, total_sections, top_sections)
+        self.end_stage("output")
+        if self.memory_budget is not None:
+            output["metadata"]["memory"] = self.memory_budget.report(spilled=spill is not None)
+        if self.doc_timeout or self.page_timeout:
+            output["metadata"]["extraction_issues"] = list(self.extraction_issues)
+        
+        # Results missing timed-out pages are not cached, so a later run can retry them
+        if cache_key is not None and not self.extraction_issues:
+            self.result_cache.put(cache_key, output)
         
+        if on_progress is not None:
+            on_progress(self.final_progress(output, len(pdf_paths)))
         return output
+    
+    def final_progress(self, output: Dict[str, Any], n_documents: int) -> Dict[str, Any]:
+        """Progress record of a finished result (the result itself is left unchanged)"""
+        metadata = dict(output["metadata"], progress={
+            "documents_done": n_documents,
+            "documents_total": n_documents,
+            "final": True,
+        })
+        return dict(output, metadata=metadata)
 
-def process_collection(collection_dir: str) -> bool:
-    """Process a single collection directory"""
+def _score_shard(shard_dir: str, persona: str, job: str, top_k: int) -> Dict[str, Any]:
+    """Scatter step of DocumentAnalyst.analyze_sharded, run in a worker process
+    
+    Returns the shard's section count, its top-k sections other than the
+    last one (in shard order), the last section still open for the next
+    shard's leading paragraphs, and this shard's own leading paragraphs.
+    Text references are returned as (offset, length) into the shard buffer.
+    """
+    from collection_index import CollectionIndex
+    
+    index = CollectionIndex.open(shard_dir)
+    texts = index.span_texts()
+    analyst = DocumentAnalyst()
+    df = analyst.analyzer.calculate_relevance(index.to_frame(), persona, job,
+                                              index=index, texts=texts)
+    head = []
+    sections = list(analyst.iter_sections([(df, texts)], orphans=head))
+    tail = sections.pop() if sections else None
+    closed = [analyst.score_section(section) for section in sections]
+    top = sorted(heapq.nlargest(top_k, range(len(closed)), key=lambda i: closed[i]['importance_score']))
+    
+    def detach(item, key):
+        item[key] = item[key][1:]
+    
+    result = {"n_sections": len(closed), "sections": [closed[i] for i in top], "head": head, "tail": tail}
+    for section in result['sections'] + ([tail] if tail else []):
+        detach(section, 'title_ref')
+        for item in section['content']:
+            detach(item, 'text_ref')
+    for item in head:
+        detach(item, 'text_ref')
+    return result
+
+def build_analyst(pdf_dir: str, result_cache=None, **analyst_options) -> DocumentAnalyst:
+    """DocumentAnalyst for one collection; per-collection caches live next to its PDFs"""
+    if analyst_options.get("vectorizer_mode") == "hashing":
+        analyst_options.setdefault("term_cache_dir", os.path.join(pdf_dir, TERM_CACHE_DIRNAME))
+    if analyst_options.get("outlines_dir"):
+        # Relative outline directories are looked up inside each collection
+        analyst_options["outlines_dir"] = os.path.join(pdf_dir, analyst_options["outlines_dir"])
+    return DocumentAnalyst(result_cache=result_cache, **analyst_options)
+
+def progress_writer(stream, collection: str):
+    """on_progress callback appending one JSON line per interim or final ranking to ``stream``"""
+    def write(result):
+        stream.write(json.dumps(dict(result, collection=collection), ensure_ascii=False) + "\n")
+        stream.flush()
+        progress = result["metadata"]["progress"]
+        if not progress["final"] and result["extracted_sections"]:
+            top = result["extracted_sections"][0]
+            print(f"📈 {progress['documents_done']}/{progress['documents_total']} documents, "
+                  f"current top section: {top['section_title'][:60]} ({top['document']})")
+    return write
+
+def process_collection(collection_dir: str, use_index: bool = False, candidate_pages: int = None,
+                       result_cache=None, journal=None, progress=None, **analyst_options) -> bool:
+    """Process a single collection directory
+    
+    ``analyst_options`` are passed on to DocumentAnalyst. With a
+    CheckpointJournal, a collection that already finished with the same
+    inputs and settings is skipped, and document extractions are reused.
+    With a ``progress`` stream, interim rankings are appended to it as JSON
+    lines while the documents are processed.
+    """
     # Look for input JSON file
     input_file = os.path.join(collection_dir, "challenge1b_input.json")
     if not os.path.exists(input_file):
@@ -385,12 +1984,24 @@ def process_collection(collection_dir: str) -> bool:
     print(f"🎯 Job: {job}")
     
     # Initialize system
-    analyst = DocumentAnalyst()
+    analyst = build_analyst(collection_dir, result_cache, checkpoint=journal, **analyst_options)
+    index_dir = os.path.join(collection_dir, INDEX_DIRNAME) if use_index else None
+    output_file = os.path.join(collection_dir, "challenge1b_output.json")
+    
+    journal_key = None
+    if journal is not None:
+        settings = dict(analyst.settings(index_dir, candidate_pages, pdf_files), pipeline_version=PIPELINE_VERSION)
+        journal_key = journal.collection_key(input_file, pdf_files, settings)
+        if journal.collection_done(os.path.basename(collection_dir), journal_key):
+            print(f"⏭️  Already completed in checkpoint, keeping {output_file}")
+            return True
     
     try:
         # Analyze documents
         start_time = datetime.now()
-        result = analyst.analyze_documents(pdf_files, persona, job)
+        on_progress = progress_writer(progress, os.path.basename(collection_dir)) if progress else None
+        result = analyst.analyze_documents(pdf_files, persona, job, index_dir=index_dir,
+                                           candidate_pages=candidate_pages, on_progress=on_progress)
         end_time = datetime.now()
         
         processing_time = (end_time - start_time).total_seconds()
@@ -401,10 +2012,13 @@ def process_collection(collection_dir: str) -> bool:
             result["metadata"]["challenge_info"] = config["challenge_info"]
         
         # Save output
-        output_file = os.path.join(collection_dir, "challenge1b_output.json")
         with open(output_file, 'w', encoding='utf-8') as f:
             json.dump(result, f, indent=2, ensure_ascii=False)
         
+        # Collections with extraction issues stay unfinished, so --resume retries them
+        if journal is not None and not result["metadata"].get("extraction_issues"):
+            journal.record_collection(os.path.basename(collection_dir), journal_key, output_file)
+        
         print(f"✅ Analysis complete in {processing_time:.2f} seconds")
         print(f"📊 Found {len(result['extracted_sections'])} relevant sections")
         print(f"💾 Output saved to: {output_file}")
@@ -421,70 +2035,152 @@ def main():
     parser.add_argument("--persona", help="Persona description (single collection mode)")
     parser.add_argument("--job", help="Job to be done (single collection mode)")
     parser.add_argument("--output", default="output.json", help="Output JSON file (single collection mode)")
+    parser.add_argument("--index", action="store_true",
+                        help=f"Build/reuse a memory-mapped collection index in each collection's {INDEX_DIRNAME}/ directory")
+    parser.add_argument("--vectorizer", choices=["tfidf", "hashing"], default="tfidf",
+                        help="Span vectorizer: fitted TF-IDF vocabulary or fixed-size hashing with per-PDF caching")
+    parser.add_argument("--scoring", choices=["sparse", "lsa"], default="sparse",
+                        help="Relevance scoring: sparse cosine or low-rank LSA embeddings (cached per collection)")
+    parser.add_argument("--profile", choices=list(PROFILES), default="balanced",
+                        help="Speed/quality profile setting granularity, candidate pages, classifier, vectorizer "
+                             "size and top-k together; the flags below override single settings")
+    parser.add_argument("--granularity", choices=["auto", "span", "section"],
+                        help="Relevance unit: every span, or one document per section with spans scored only in the "
+                             f"top sections (auto: sections from {SECTION_SCORING_MIN_SPANS} spans)")
+    parser.add_argument("--classifier", choices=["rules", "model"],
+                        help="Heading labels: rule-based, or a RandomForest trained on them per collection")
+    parser.add_argument("--max_features", type=int, help="TF-IDF vocabulary size")
+    parser.add_argument("--ngram_max", type=int, help="Longest TF-IDF n-gram")
+    parser.add_argument("--top_k", type=int, help="Number of ranked sections returned")
+    parser.add_argument("--shards", type=int,
+                        help="With --index, partition the index into this many shards by document and score them "
+                             "in parallel worker processes")
+    parser.add_argument("--outlines", nargs="?", const=OUTLINES_DIRNAME,
+                        help="Reuse Challenge 1a *_labels.json outlines from this directory (relative paths are "
+                             f"inside each collection, default {OUTLINES_DIRNAME}/) instead of extracting and classifying")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Collapse near-duplicate spans and sections (MinHash/LSH) before scoring")
+    parser.add_argument("--candidate_pages", type=int,
+                        help="Two-tier extraction: detailed extraction only for the N most relevant pages and their "
+                             "neighbors (0 disables)")
+    parser.add_argument("--prefetch", type=int, default=2,
+                        help="PDFs read ahead in the background while extracting (0 disables)")
+    parser.add_argument("--result_cache", help="Directory for the on-disk tier of the query result cache")
+    parser.add_argument("--cache_size", type=int, default=128, help="Maximum in-memory cached results")
+    parser.add_argument("--cache_ttl", type=float, help="Seconds before a cached result expires")
+    parser.add_argument("--memory_budget", type=float,
+                        help="Memory budget in MB; spans spill to disk and are scored per document when RSS nears it")
+    parser.add_argument("--spill_dir", help="Parent directory for spilled span chunks (default: system temp dir)")
+    parser.add_argument("--doc_timeout", type=float,
+                        help="Seconds per PDF before its extraction worker is killed (the document is reported, the rest continue)")
+    parser.add_argument("--page_timeout", type=float,
+                        help="Seconds per page before its extraction worker is killed and the document resumes on the next page")
+    parser.add_argument("--extract_workers", type=int,
+                        help="Extraction worker processes when a timeout is set (default: up to 4)")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help=f"Journal finished collections and document extractions in --collections_dir/{CHECKPOINT_DIRNAME}/")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted --collections_dir run from its checkpoint journal")
+    parser.add_argument("--progress",
+                        help="Append interim top-k rankings to this file as JSON lines while documents are processed")
     
     args = parser.parse_args()
     
-    if args.collections_dir:
-        # Multi-collection mode
-        print("🚀 Running Multi-Collection Analysis")
-        
-        collections = []
-        for item in os.listdir(args.collections_dir):
-            item_path = os.path.join(args.collections_dir, item)
-            if os.path.isdir(item_path) and item.startswith("Collection"):
-                collections.append(item_path)
-        
-        if not collections:
-            print("❌ No collection directories found")
-            return
-        
-        print(f"📁 Found {len(collections)} collections")
-        
-        success_count = 0
-        for collection_dir in sorted(collections):
-            print(f"\n{'='*50}")
-            if process_collection(collection_dir):
-                success_count += 1
-        
-        print(f"\n🎉 Successfully processed {success_count}/{len(collections)} collections")
-        
-    elif args.input_dir and args.persona and args.job:
-        # Single collection mode (legacy)
-        pdf_files = []
-        for file in os.listdir(args.input_dir):
-            if file.lower().endswith('.pdf'):
-                pdf_files.append(os.path.join(args.input_dir, file))
-        
-        if not pdf_files:
-            print("❌ No PDF files found in input directory")
-            return
-        
-        print(f"📄 Found {len(pdf_files)} PDF files")
-        print(f"👤 Persona: {args.persona}")
-        print(f"🎯 Job: {args.job}")
-        
-        analyst = DocumentAnalyst()
-        
-        try:
-            start_time = datetime.now()
-            result = analyst.analyze_documents(pdf_files, args.persona, args.job)
-            end_time = datetime.now()
+    from result_cache import ResultCache
+    
+    result_cache = ResultCache(max_entries=args.cache_size, ttl_seconds=args.cache_ttl,
+                               cache_dir=args.result_cache)
+    profile = profile_settings(args.profile, granularity=args.granularity, candidate_pages=args.candidate_pages,
+                               classifier=args.classifier, max_features=args.max_features,
+                               ngram_max=args.ngram_max, top_k=args.top_k)
+    candidate_pages = profile.pop("candidate_pages")
+    analyst_options = {"vectorizer_mode": args.vectorizer, "scoring": args.scoring, "dedupe": args.dedupe,
+                       "prefetch_depth": args.prefetch, "memory_budget_mb": args.memory_budget,
+                       "spill_dir": args.spill_dir, "doc_timeout": args.doc_timeout,
+                       "page_timeout": args.page_timeout, "extract_workers": args.extract_workers,
+                       "outlines_dir": args.outlines, "shards": args.shards, **profile}
+    # Appended to, so consumers can tail it
+    progress = open(args.progress, 'a', encoding='utf-8') if args.progress else None
+    
+    try:
+        if args.collections_dir:
+            # Multi-collection mode
+            print("🚀 Running Multi-Collection Analysis")
+            
+            collections = []
+            for item in os.listdir(args.collections_dir):
+                item_path = os.path.join(args.collections_dir, item)
+                if os.path.isdir(item_path) and item.startswith("Collection"):
+                    collections.append(item_path)
+            
+            if not collections:
+                print("❌ No collection directories found")
+                return
             
-            processing_time = (end_time - start_time).total_seconds()
-            result["metadata"]["processing_time_seconds"] = round(processing_time, 2)
+            print(f"📁 Found {len(collections)} collections")
             
-            with open(args.output, 'w', encoding='utf-8') as f:
-                json.dump(result, f, indent=2, ensure_ascii=False)
+            journal = None
+            if args.checkpoint or args.resume:
+                from checkpoint import CheckpointJournal
+                
+                journal = CheckpointJournal(os.path.join(args.collections_dir, CHECKPOINT_DIRNAME), resume=args.resume)
+                if args.resume:
+                    print(f"♻️  Resuming: {len(journal.collections)} collections and "
+                          f"{len(journal.documents)} documents in checkpoint")
+            
+            success_count = 0
+            for collection_dir in sorted(collections):
+                print(f"\n{'='*50}")
+                if process_collection(collection_dir, use_index=args.index, candidate_pages=candidate_pages,
+                                      result_cache=result_cache, journal=journal, progress=progress,
+                                      **analyst_options):
+                    success_count += 1
+            
+            print(f"\n🎉 Successfully processed {success_count}/{len(collections)} collections")
+            
+        elif args.input_dir and args.persona and args.job:
+            # Single collection mode (legacy)
+            pdf_files = []
+            for file in os.listdir(args.input_dir):
+                if file.lower().endswith('.pdf'):
+                    pdf_files.append(os.path.join(args.input_dir, file))
+            
+            if not pdf_files:
+                print("❌ No PDF files found in input directory")
+                return
             
-            print(f"✅ Analysis complete in {processing_time:.2f} seconds")
-            print(f"📊 Found {len(result['extracted_sections'])} relevant sections")
-            print(f"💾 Output saved to: {args.output}")
+            print(f"📄 Found {len(pdf_files)} PDF files")
+            print(f"👤 Persona: {args.persona}")
+            print(f"🎯 Job: {args.job}")
             
-        except Exception as e:
-            print(f"❌ Error during analysis: {e}")
-            raise
-    else:
-        parser.print_help()
+            analyst = build_analyst(args.input_dir, result_cache, **analyst_options)
+            
+            try:
+                start_time = datetime.now()
+                index_dir = os.path.join(args.input_dir, INDEX_DIRNAME) if args.index else None
+                on_progress = progress_writer(progress, os.path.basename(os.path.normpath(args.input_dir))) if progress else None
+                result = analyst.analyze_documents(pdf_files, args.persona, args.job, index_dir=index_dir,
+                                                   candidate_pages=candidate_pages, on_progress=on_progress)
+                end_time = datetime.now()
+                
+                processing_time = (end_time - start_time).total_seconds()
+                result["metadata"]["processing_time_seconds"] = round(processing_time, 2)
+                
+                with open(args.output, 'w', encoding='utf-8') as f:
+                    json.dump(result, f, indent=2, ensure_ascii=False)
+                
+                print(f"✅ Analysis complete in {processing_time:.2f} seconds")
+                print(f"📊 Found {len(result['extracted_sections'])} relevant sections")
+                print(f"💾 Output saved to: {args.output}")
+                
+            except Exception as e:
+                print(f"❌ Error during analysis: {e}")
+                raise
+        else:
+            parser.print_help()
+    finally:
+        if progress is not None:
+            progress.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
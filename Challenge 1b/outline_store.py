@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Challenge 1a outlines as a precomputed structure layer for DocumentAnalyst
+
+Challenge 1a writes ``<name>_labels.json`` for every ``<name>.pdf``:
+
+    {"title": "...", "outline": [{"level": "H1", "text": "...", "page": 1}, ...]}
+
+The outline lists every classified text line in reading order, paragraphs
+("P") included. An outline that is at least as new as its PDF is turned into
+spans that already carry ``predicted_label``, so the document is neither
+extracted nor classified again. Layout features 1a does not record get neutral
+values; the outline position stands in for ``y0`` to keep reading order.
+"""
+
+import os
+import json
+from typing import List, Dict, Any, Optional
+
+OUTLINE_SUFFIX = "_labels.json"
+# 1b groups sections under TITLE/H1-H3; deeper 1a headings become H3
+LEVELS = {"TITLE": "TITLE", "H1": "H1", "H2": "H2", "H3": "H3", "H4": "H3", "P": "P"}
+
+class OutlineStore:
+    """Outline files of one directory, looked up by PDF name"""
+
+    def __init__(self, outlines_dir: str):
+        self.outlines_dir = outlines_dir
+
+    def path(self, pdf_path: str) -> str:
+        stem = os.path.splitext(os.path.basename(pdf_path))[0]
+        return os.path.join(self.outlines_dir, stem + OUTLINE_SUFFIX)
+
+    def has(self, pdf_path: str) -> bool:
+        """True if an outline exists and is not older than the PDF"""
+        path = self.path(pdf_path)
+        try:
+            return os.path.getmtime(path) >= os.path.getmtime(pdf_path)
+        except OSError:
+            return False
+
+    def fingerprint(self, pdf_paths: List[str]) -> Dict[str, Any]:
+        """Content hashes of the outlines used for these PDFs, for cache keys"""
+        from collection_index import file_sha256
+
+        return {os.path.basename(p): file_sha256(self.path(p)) for p in pdf_paths if self.has(p)}
+
+    def spans(self, pdf_path: str, pages: set = None) -> Optional[List[Dict]]:
+        """Labeled spans of a PDF's outline (optionally only 1-based ``pages``), or None"""
+        if not self.has(pdf_path):
+            return None
+        try:
+            with open(self.path(pdf_path), 'r', encoding='utf-8') as f:
+                outline = json.load(f)
+            entries = [(entry["level"], entry["text"].strip(), int(entry["page"])) for entry in outline["outline"]]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+        title = (outline.get("title") or "").strip()
+        if title and title != "Untitled Document":
+            # 1a reports the title without a page; it opens the document
+            entries.insert(0, ("TITLE", title, entries[0][2] if entries else 1))
+
+        document = os.path.basename(pdf_path)
+        spans = []
+        for position, (level, text, page) in enumerate(entries):
+            if not text or level not in LEVELS or (pages is not None and page not in pages):
+                continue
+            spans.append({
+                "document": document,
+                "page": page,
+                "text": text,
+                "font_size": 0.0,
+                "font_name": "",
+                "bold": False,
+                "x0": 0.0,
+                "y0": float(position),
+                "x1": 0.0,
+                "y1": float(position),
+                "uppercase_ratio": sum(1 for c in text if c.isupper()) / len(text),
+                "length": len(text),
+                "predicted_label": LEVELS[level],
+            })
+        return spans
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Query result cache for DocumentAnalyst.analyze_documents
+
+Results are keyed on the content hashes of the input PDFs, the normalized
+persona and job text, the pipeline version and the analysis settings. Entries
+live in an in-memory LRU and, optionally, in an on-disk tier of JSON files;
+both tiers evict by size and TTL.
+"""
+
+import os
+import copy
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+def normalize_query_text(text: str) -> str:
+    """Case- and whitespace-insensitive form of persona/job text"""
+    return " ".join(text.lower().split())
+
+class ResultCache:
+    """Two-tier (memory LRU + optional disk) cache of analysis results"""
+
+    def __init__(self, max_entries: int = 128, ttl_seconds: float = None,
+                 cache_dir: str = None, max_disk_entries: int = 1024):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self.entries = OrderedDict()  # key -> (created, result)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()  # Cache instances are shared by concurrent queries
+
+    def content_hash(self, path: str, data: bytes = None) -> str:
+        """SHA-256 of a file (memoized, see content_sha256), or of its in-memory ``data``"""
+        from collection_index import content_sha256
+
+        if data is not None:
+            return hashlib.sha256(data).hexdigest()
+        return content_sha256(path)
+
+    def key(self, pdf_paths: List[str], persona: str, job: str, version: str,
+            settings: Dict[str, Any] = None, pdf_data: Dict[str, bytes] = None) -> str:
+        """Cache key for one analysis request (``pdf_data``: bytes of in-memory PDFs by path)"""
+        pdf_data = pdf_data or {}
+        payload = {
+            "documents": [[os.path.basename(p), self.content_hash(p, pdf_data.get(p))] for p in pdf_paths],
+            "persona": normalize_query_text(persona),
+            "job": normalize_query_text(job),
+            "version": version,
+            "settings": settings or {},
+        }
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached result with a fresh timestamp, or None"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self.entries[key]
+                entry = None
+
+            if entry is None and self.cache_dir and os.path.exists(self._disk_path(key)):
+                try:
+                    with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                        stored = json.load(f)
+                    entry = (stored["created"], stored["result"])
+                except (OSError, ValueError, KeyError):
+                    entry = None
+                if entry is not None and self._expired(entry[0]):
+                    os.remove(self._disk_path(key))
+                    entry = None
+                elif entry is not None:
+                    os.utime(self._disk_path(key))  # Disk tier is LRU by mtime
+                    self._remember(key, entry)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+            result = copy.deepcopy(entry[1])
+            result["metadata"]["processing_timestamp"] = datetime.now().isoformat()
+            result["metadata"]["cache_hit"] = True
+            return result
+
+    def _remember(self, key: str, entry: tuple):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """Store a result in both tiers"""
+        with self._lock:
+            entry = (time.time(), copy.deepcopy(result))
+            self._remember(key, entry)
+
+            if self.cache_dir:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(prefix=".entry-", suffix=".json", dir=self.cache_dir)
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump({"created": entry[0], "result": entry[1]}, f, ensure_ascii=False)
+                os.replace(tmp_path, self._disk_path(key))
+                self._evict_disk()
+
+    def _evict_disk(self):
+        files = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir)
+                 if f.endswith(".json") and not f.startswith(".")]
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_disk_entries]:
+            os.remove(path)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Collection index partitioned into shards by document
+
+A sharded index is a directory of CollectionIndex shards plus a manifest:
+
+    meta.json               shard list, span counts, source hashes, settings
+    shard_<n>/              one CollectionIndex over a run of documents
+
+Documents are assigned to shards in sorted name order, in contiguous runs of
+about equal span count, so concatenating the shards' sections in shard order
+gives the section order of the whole collection. Every shard holds its rows of
+one TF-IDF matrix fitted on the whole collection, with the same vocabulary and
+IDF weights, so a span scores exactly as it would in an unsharded index and
+shards can be scored independently in separate processes.
+"""
+
+import os
+import json
+from typing import List, Dict, Any
+
+import numpy as np
+
+SHARDED_INDEX_VERSION = 2
+
+def partition_documents(documents: List[str], span_counts: List[int], n_shards: int) -> List[List[str]]:
+    """Split documents (in sorted order) into up to ``n_shards`` contiguous runs of similar span count"""
+    order = sorted(range(len(documents)), key=lambda i: documents[i])
+    counts = np.asarray([span_counts[i] for i in order], dtype=np.int64)
+    # Shard of each document: where the middle of its spans falls in the collection
+    middles = np.cumsum(counts) - counts / 2.0
+    assignment = np.minimum((middles * n_shards / max(counts.sum(), 1)).astype(int), n_shards - 1)
+
+    shards = [[] for _ in range(n_shards)]
+    for i, shard in zip(order, assignment):
+        shards[shard].append(documents[i])
+    return [documents for documents in shards if documents]
+
+class ShardedIndex:
+    """Manifest and shard directories of a sharded collection index"""
+
+    def __init__(self, index_dir: str, meta: Dict[str, Any]):
+        self.index_dir = index_dir
+        self.meta = meta
+
+    @property
+    def n_spans(self) -> int:
+        return self.meta["n_spans"]
+
+    @property
+    def shard_dirs(self) -> List[str]:
+        return [os.path.join(self.index_dir, shard["dir"]) for shard in self.meta["shards"]]
+
+    @classmethod
+    def build(cls, index_dir: str, df, pdf_paths: List[str], vectorizer, tfidf_matrix, n_shards: int,
+              settings: Dict[str, Any] = None, texts=None) -> "ShardedIndex":
+        """Write a sharded index for an extracted, classified span DataFrame
+
+        Arguments are those of CollectionIndex.build; ``vectorizer`` and
+        ``tfidf_matrix`` are fitted on the whole collection and every shard
+        gets its rows of the matrix.
+        """
+        from scipy import sparse
+        from collection_index import CollectionIndex, source_stamp, staged_index_dir
+
+        documents = df["document"].astype(str).to_numpy()
+        names, counts = np.unique(documents, return_counts=True)
+        groups = partition_documents(names.tolist(), counts.tolist(), n_shards)
+        paths_by_name = {os.path.basename(p): p for p in pdf_paths}
+        tfidf_matrix = sparse.csr_matrix(tfidf_matrix)
+
+        with staged_index_dir(index_dir, prefix=".shards-") as tmp_dir:
+            shards = []
+            for n, group in enumerate(groups):
+                # Rows keep their collection order within the shard
+                rows = np.flatnonzero(np.isin(documents, group))
+                shard_dir = f"shard_{n:03d}"
+                CollectionIndex.build(os.path.join(tmp_dir, shard_dir), df.iloc[rows].reset_index(drop=True),
+                                      [paths_by_name[name] for name in group if name in paths_by_name],
+                                      vectorizer, tfidf_matrix[rows], settings=settings, texts=texts)
+                shards.append({"dir": shard_dir, "documents": group, "n_spans": len(rows)})
+
+            meta = {
+                "version": SHARDED_INDEX_VERSION,
+                "n_spans": len(df),
+                "shards": shards,
+                "sources": {os.path.basename(p): source_stamp(p) for p in pdf_paths},
+                "settings": settings or {},
+            }
+            with open(os.path.join(tmp_dir, "meta.json"), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+        return cls.open(index_dir)
+
+    @classmethod
+    def open(cls, index_dir: str) -> "ShardedIndex":
+        with open(os.path.join(index_dir, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("version") != SHARDED_INDEX_VERSION:
+            raise ValueError(f"Unsupported sharded index version {meta.get('version')} in {index_dir}")
+        return cls(index_dir, meta)
+
+    @classmethod
+    def exists(cls, index_dir: str) -> bool:
+        return os.path.exists(os.path.join(index_dir, "meta.json"))
+
+    def matches(self, pdf_paths: List[str], settings: Dict[str, Any] = None) -> bool:
+        """True if the index was built from exactly these PDF contents and settings"""
+        from collection_index import manifest_matches
+
+        return manifest_matches(self.meta, pdf_paths, settings)
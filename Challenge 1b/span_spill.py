@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Memory budget guard and on-disk span spill for DocumentAnalyst
+
+MemoryBudget samples the process RSS after each pipeline stage. When
+extraction brings it close to the budget, spans are moved into a SpanSpill,
+one directory per document with columnar ``.npy`` files:
+
+    col_<name>.npy          one file per numeric span column (SPAN_DTYPES dtypes)
+    font_codes.npy          int32 codes into the document's font list
+    label_codes.npy         int8 codes into the document's label list (labeled spans only)
+    text_buffer.npy         UTF-8 bytes of every span text, concatenated
+    text_offsets.npy        int64 offsets into text_buffer (n_spans + 1)
+
+Later stages then stream the collection one document at a time.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+from typing import List, Dict, Any, Iterator
+
+import numpy as np
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class MemoryBudget:
+    """RSS budget with per-stage peak samples"""
+
+    def __init__(self, limit_bytes: int, spill_fraction: float = 0.8):
+        self.limit_bytes = limit_bytes
+        self.spill_fraction = spill_fraction
+        self.stages = {}  # stage -> peak RSS seen at its checkpoints
+
+    def reset(self):
+        self.stages = {}
+
+    def checkpoint(self, stage: str) -> int:
+        """Sample RSS and record it under a stage name"""
+        rss = current_rss()
+        self.stages[stage] = max(rss, self.stages.get(stage, 0))
+        return rss
+
+    def approaching(self, rss: int = None) -> bool:
+        """True once RSS reaches the spill fraction of the budget"""
+        rss = current_rss() if rss is None else rss
+        return rss >= self.spill_fraction * self.limit_bytes
+
+    def report(self, spilled: bool) -> Dict[str, Any]:
+        """Budget, spill decision and per-stage RSS (MB) for output metadata"""
+        mb = float(1 << 20)
+        return {
+            "budget_mb": round(self.limit_bytes / mb, 1),
+            "spilled": spilled,
+            "stage_rss_mb": {stage: round(rss / mb, 1) for stage, rss in self.stages.items()},
+        }
+
+class SpanSpill:
+    """Compact per-document span frames spilled to a temporary directory"""
+
+    def __init__(self, parent_dir: str = None):
+        if parent_dir:
+            os.makedirs(parent_dir, exist_ok=True)
+        self.spill_dir = tempfile.mkdtemp(prefix="spans-", dir=parent_dir)
+        self.chunks = []  # one dict per document, in append order
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def append(self, df, texts):
+        """Write one document's compact span frame (categorical document/font_name)
+
+        ``texts`` is the SpanTexts buffer of the frame's text_offset and
+        text_length columns; the document's texts are copied out of it.
+        """
+        path = os.path.join(self.spill_dir, f"doc_{len(self.chunks):05d}")
+        os.makedirs(path)
+
+        text_buffer, offsets = texts.pack(df["text_offset"].to_numpy(), df["text_length"].to_numpy())
+        arrays = {f"col_{name}": df[name].to_numpy() for name in df.columns
+                  if name not in ("document", "font_name", "predicted_label", "text_offset", "text_length")}
+        arrays.update({
+            "font_codes": df["font_name"].cat.codes.to_numpy().astype(np.int32),
+            "text_buffer": text_buffer,
+            "text_offsets": offsets,
+        })
+        labels = None
+        if "predicted_label" in df.columns:
+            # Spans of 1a outlines arrive labeled
+            arrays["label_codes"] = df["predicted_label"].cat.codes.to_numpy().astype(np.int8)
+            labels = list(df["predicted_label"].cat.categories)
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), array, allow_pickle=False)
+
+        self.chunks.append({
+            "document": str(df["document"].iloc[0]),
+            "path": path,
+            "columns": list(df.columns),
+            "fonts": list(df["font_name"].cat.categories),
+            "labels": labels,
+            "n_spans": len(df),
+        })
+
+    def _load(self, chunk: Dict[str, Any], name: str, mmap: bool = False) -> np.ndarray:
+        return np.load(os.path.join(chunk["path"], f"{name}.npy"), mmap_mode='r' if mmap else None,
+                       allow_pickle=False)
+
+    def _texts(self, chunk: Dict[str, Any]) -> List[str]:
+        buffer = bytes(self._load(chunk, "text_buffer", mmap=True))
+        offsets = self._load(chunk, "text_offsets").tolist()
+        return [buffer[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(chunk["n_spans"])]
+
+    def chunk_texts(self, i: int):
+        """SpanTexts of the i-th spilled document, read into memory"""
+        from span_text import SpanTexts
+
+        return SpanTexts(self._load(self.chunks[i], "text_buffer"))
+
+    def frame(self, i: int, columns: List[str] = None):
+        """Span frame of the i-th spilled document, optionally only some columns
+
+        Texts are text_offset/text_length references into chunk_texts(i).
+        """
+        import pandas as pd
+
+        chunk = self.chunks[i]
+        data = {}
+        for name in columns or chunk["columns"]:
+            if name == "document":
+                data[name] = pd.Categorical.from_codes(np.zeros(chunk["n_spans"], dtype=np.int8),
+                                                       [chunk["document"]])
+            elif name == "font_name":
+                data[name] = pd.Categorical.from_codes(self._load(chunk, "font_codes"), chunk["fonts"])
+            elif name == "predicted_label":
+                data[name] = pd.Categorical.from_codes(self._load(chunk, "label_codes"), chunk["labels"])
+            elif name == "text_offset":
+                data[name] = self._load(chunk, "text_offsets")[:-1]
+            elif name == "text_length":
+                data[name] = np.diff(self._load(chunk, "text_offsets")).astype(np.int32)
+            else:
+                data[name] = self._load(chunk, f"col_{name}")
+        return pd.DataFrame(data)
+
+    def frames(self, columns: List[str] = None) -> Iterator:
+        """Span frames of every spilled document, in append order"""
+        for i in range(len(self.chunks)):
+            yield self.frame(i, columns)
+
+    def texts(self) -> Iterator[List[str]]:
+        """Span texts of every spilled document, in append order"""
+        for chunk in self.chunks:
+            yield self._texts(chunk)
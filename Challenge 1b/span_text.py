@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Contiguous span text storage for DocumentAnalyst
+
+Span texts of a collection are appended, document by document, to one UTF-8
+buffer. The span table refers to a text by its ``(offset, length)`` in bytes:
+
+    text_offset             int64 byte offset of the span text in the buffer
+    text_length             int32 byte length of the span text
+
+Section titles and paragraphs carry ``(SpanTexts, offset, length)`` references,
+since a section streamed from spilled documents can span several buffers.
+
+Stages that tokenize texts decode them one at a time while they stream over
+the spans; full strings are otherwise only built for the output JSON. The
+collection index and the span spill store the same layout on disk
+(``text_buffer.npy`` plus ``text_offsets.npy``), so both can hand out their
+buffers without decoding anything.
+"""
+
+from typing import List, Dict, Tuple, Iterable, Iterator
+
+import numpy as np
+
+class SpanTexts:
+    """UTF-8 span texts in one buffer, addressed by (offset, length)"""
+
+    def __init__(self, buffer=None):
+        # A growing bytearray while extracting, or a (memory-mapped) uint8 array
+        self.buffer = bytearray() if buffer is None else buffer
+        self._view = None
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.buffer)
+
+    def _view_of_array(self) -> memoryview:
+        if self._view is None:
+            self._view = memoryview(self.buffer).cast("B")
+        return self._view
+
+    def append(self, text: str) -> Tuple[int, int]:
+        """Store one text and return its (offset, length)"""
+        encoded = text.encode("utf-8")
+        offset = len(self.buffer)
+        self.buffer.extend(encoded)
+        return offset, len(encoded)
+
+    def add_spans(self, spans: List[Dict]) -> List[Dict]:
+        """Move the 'text' of extracted span dicts into the buffer, in place"""
+        for span in spans:
+            span["text_offset"], span["text_length"] = self.append(span.pop("text"))
+        return spans
+
+    def text(self, offset: int, length: int) -> str:
+        """Decode one text"""
+        if isinstance(self.buffer, bytearray):
+            # No lasting buffer export, so the bytearray can keep growing
+            return self.buffer[offset:offset + length].decode("utf-8")
+        return str(self._view_of_array()[offset:offset + length], "utf-8")
+
+    def iter_texts(self, offsets: Iterable[int], lengths: Iterable[int]) -> Iterator[str]:
+        """Decode texts one at a time"""
+        for offset, length in zip(offsets, lengths):
+            yield self.text(offset, length)
+
+    def pack(self, offsets: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Copy some texts into a new (uint8 buffer, n + 1 int64 offsets) pair, in the given order"""
+        offsets = np.asarray(offsets, dtype=np.int64)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        packed_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=packed_offsets[1:])
+
+        source = np.frombuffer(self.buffer, dtype=np.uint8)
+        if len(lengths) and np.array_equal(offsets[1:], offsets[:-1] + lengths[:-1]):
+            # Already contiguous (e.g. one whole document): a single slice
+            return source[offsets[0]:offsets[0] + packed_offsets[-1]].copy(), packed_offsets
+        # Byte positions of every selected text, gathered in one indexing pass
+        starts = np.repeat(offsets - packed_offsets[:-1], lengths)
+        return source[starts + np.arange(packed_offsets[-1])], packed_offsets
+
+def frame_texts(df, texts: SpanTexts = None) -> Iterator[str]:
+    """Span texts of a frame: decoded by (offset, length) from ``texts``, or its plain 'text' column"""
+    if texts is None:
+        return iter(df["text"].tolist())
+    return texts.iter_texts(df["text_offset"].tolist(), df["text_length"].tolist())
+
+def text_of(ref: Tuple[SpanTexts, int, int]) -> str:
+    """Decode a (SpanTexts, offset, length) reference"""
+    texts, offset, length = ref
+    return texts.text(offset, length)
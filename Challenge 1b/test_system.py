@@ -152,6 +152,723 @@ def test_all_collections():
         print(f"Error: {result.stderr}")
         return False
 
+def test_library_api():
+    """Test the in-process API on file paths and in-memory PDF bytes"""
+    print("\n🧪 Testing Library API")
+    
+    collection_dir = "Challenge_1b/Collection 1"
+    pdfs_dir = os.path.join(collection_dir, "PDFs")
+    if not os.path.exists(pdfs_dir) or not any(f.lower().endswith('.pdf') for f in os.listdir(pdfs_dir)):
+        print("⚠️  No PDF files found in Collection 1/PDFs/")
+        return True
+    
+    from api import PdfAnalyzer, AnalystConfig, AnalysisRequest, PdfDocument
+    
+    analyzer = PdfAnalyzer(AnalystConfig(cache_size=0))
+    request = AnalysisRequest.from_collection(collection_dir)
+    from_files = analyzer.analyze(request)
+    
+    in_memory = []
+    for document in request.documents:
+        with open(document.path, 'rb') as f:
+            in_memory.append(PdfDocument(document.name, data=f.read()))
+    start_time = time.time()
+    from_bytes = analyzer.analyze(AnalysisRequest(request.persona, request.job, in_memory))
+    print(f"⏱️  Warm in-memory request: {time.time() - start_time:.2f} seconds")
+    
+    if not from_files.sections:
+        print("❌ No sections returned")
+        return False
+    if from_files.sections != from_bytes.sections or from_files.subsections != from_bytes.subsections:
+        print("❌ In-memory PDFs ranked differently from the same files")
+        return False
+    output = from_bytes.to_dict()
+    if not all(key in output for key in ["metadata", "extracted_sections", "subsection_analysis"]):
+        print("❌ Result does not have the output structure")
+        return False
+    
+    print(f"✅ Same {len(from_files.sections)} sections from files and from bytes")
+    return True
+
+def test_near_duplicates():
+    """Test that a copied PDF is collapsed into the original with provenance (--dedupe)"""
+    print("\n🧪 Testing Near-Duplicate Suppression")
+    
+    import shutil
+    import tempfile
+    from benchmark import make_collection
+    from main import DocumentAnalyst
+    
+    with tempfile.TemporaryDirectory(prefix="test-dedupe-") as tmp_dir:
+        collection_dir = make_collection(os.path.join(tmp_dir, "collection"), documents=2, pages=2,
+                                         spans_per_page=18, persona_words=3)
+        pdf_dir = os.path.join(collection_dir, "PDFs")
+        original = sorted(os.listdir(pdf_dir))[0]
+        # Sorted after the original, so the original is the occurrence that is kept
+        shutil.copy(os.path.join(pdf_dir, original), os.path.join(pdf_dir, "zz_copy.pdf"))
+        pdf_paths = sorted(os.path.join(pdf_dir, f) for f in os.listdir(pdf_dir))
+        with open(os.path.join(collection_dir, "challenge1b_input.json"), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        
+        analyst = DocumentAnalyst(dedupe=True, top_k=100)
+        df, texts = analyst.extract_spans(pdf_paths)
+        sections = analyst.deduplicator.collapse_sections(
+            analyst.group_into_sections(df.assign(combined_score=0.0), texts))
+        result = analyst.analyze_documents(pdf_paths, config["persona"]["role"], config["job_to_be_done"]["task"])
+    
+    if any(section['document'] == "zz_copy.pdf" for section in sections):
+        print("❌ Sections of the copied PDF survived deduplication")
+        return False
+    if any(section['document'] == "zz_copy.pdf" for section in result["extracted_sections"]):
+        print("❌ The copied PDF was ranked")
+        return False
+    provenance = [duplicate for section in result["extracted_sections"] for duplicate in section.get("duplicates", [])]
+    if not any(duplicate["document"] == "zz_copy.pdf" for duplicate in provenance):
+        print("❌ No section reports the copy in 'duplicates'")
+        return False
+    
+    print(f"✅ Copy collapsed into {original}, {len(provenance)} duplicate locations reported")
+    return True
+
+def synthetic_request(tmp_dir: str) -> tuple:
+    """PDF paths, persona and job of a small generated collection in ``tmp_dir``"""
+    from benchmark import make_collection
+    
+    collection_dir = make_collection(os.path.join(tmp_dir, "collection"), documents=4, pages=3,
+                                     spans_per_page=18, persona_words=3)
+    pdf_dir = os.path.join(collection_dir, "PDFs")
+    with open(os.path.join(collection_dir, "challenge1b_input.json"), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return (sorted(os.path.join(pdf_dir, f) for f in os.listdir(pdf_dir)),
+            config["persona"]["role"], config["job_to_be_done"]["task"])
+
+def ranking(output: dict) -> tuple:
+    """The parts of an output that must not depend on caching, spilling or sharding"""
+    return output["extracted_sections"], output["subsection_analysis"]
+
+def test_result_cache():
+    """Test that a result cache hit returns the uncached output"""
+    print("\n🧪 Testing Result Cache Equivalence")
+    
+    import tempfile
+    from main import DocumentAnalyst
+    from result_cache import ResultCache
+    
+    with tempfile.TemporaryDirectory(prefix="test-cache-") as tmp_dir:
+        pdf_paths, persona, job = synthetic_request(tmp_dir)
+        reference = ranking(DocumentAnalyst().analyze_documents(pdf_paths, persona, job))
+        cache = ResultCache(cache_dir=os.path.join(tmp_dir, "cache"))
+        miss = ranking(DocumentAnalyst(result_cache=cache).analyze_documents(pdf_paths, persona, job))
+        hit = ranking(DocumentAnalyst(result_cache=cache).analyze_documents(pdf_paths, persona, job))
+    
+    if cache.hits != 1:
+        print(f"❌ Expected one cache hit, got {cache.hits}")
+        return False
+    if miss != reference or hit != reference:
+        print("❌ Cached result differs from the uncached analysis")
+        return False
+    
+    print("✅ Cache miss and hit match the uncached output")
+    return True
+
+def test_checkpoint_resume():
+    """Test that resuming from a checkpoint journal reproduces the uncheckpointed output
+    
+    The collection includes a byte-identical copy under another name, which
+    must keep its own journal entry and document name.
+    """
+    print("\n🧪 Testing Checkpoint/Resume Equivalence")
+    
+    import shutil
+    import tempfile
+    from main import DocumentAnalyst
+    from checkpoint import CheckpointJournal
+    
+    with tempfile.TemporaryDirectory(prefix="test-checkpoint-") as tmp_dir:
+        pdf_paths, persona, job = synthetic_request(tmp_dir)
+        copy_path = os.path.join(os.path.dirname(pdf_paths[0]), "zz_copy.pdf")
+        shutil.copy(pdf_paths[0], copy_path)
+        pdf_paths.append(copy_path)
+        journal_dir = os.path.join(tmp_dir, "journal")
+        reference = ranking(DocumentAnalyst().analyze_documents(pdf_paths, persona, job))
+        recorded = ranking(DocumentAnalyst(checkpoint=CheckpointJournal(journal_dir))
+                           .analyze_documents(pdf_paths, persona, job))
+        journal = CheckpointJournal(journal_dir, resume=True)
+        resumed = ranking(DocumentAnalyst(checkpoint=journal).analyze_documents(pdf_paths, persona, job))
+    
+    if len(journal.documents) != len(pdf_paths):
+        print(f"❌ Journal holds {len(journal.documents)} of {len(pdf_paths)} documents")
+        return False
+    if recorded != reference or resumed != reference:
+        print("❌ Checkpointed or resumed output differs from the plain analysis")
+        return False
+    
+    print(f"✅ Resumed from {len(journal.documents)} journaled documents with identical output")
+    return True
+
+def test_spill():
+    """Test that spilling spans under a memory budget does not change the output"""
+    print("\n🧪 Testing Memory Budget Spill Equivalence")
+    
+    import tempfile
+    from main import DocumentAnalyst
+    
+    with tempfile.TemporaryDirectory(prefix="test-spill-") as tmp_dir:
+        pdf_paths, persona, job = synthetic_request(tmp_dir)
+        reference = ranking(DocumentAnalyst().analyze_documents(pdf_paths, persona, job))
+        # A 1 MB budget is exceeded at once, so every document is spilled
+        output = DocumentAnalyst(memory_budget_mb=1, spill_dir=os.path.join(tmp_dir, "spill")).analyze_documents(
+            pdf_paths, persona, job)
+    
+    if not output["metadata"]["memory"]["spilled"]:
+        print("❌ Spans were not spilled under a 1 MB budget")
+        return False
+    if ranking(output) != reference:
+        print("❌ Spilled output differs from the in-memory analysis")
+        return False
+    
+    print("✅ Spilled and in-memory analyses match")
+    return True
+
+def test_sharded_index():
+    """Test that scoring a sharded index gives the output of the single index"""
+    print("\n🧪 Testing Sharded Index Equivalence")
+    
+    import tempfile
+    from main import DocumentAnalyst, INDEX_DIRNAME
+    
+    with tempfile.TemporaryDirectory(prefix="test-shards-") as tmp_dir:
+        pdf_paths, persona, job = synthetic_request(tmp_dir)
+        index_dir = os.path.join(os.path.dirname(pdf_paths[0]), "..", INDEX_DIRNAME)
+        reference = ranking(DocumentAnalyst().analyze_documents(pdf_paths, persona, job, index_dir=index_dir))
+        for shards in (2, 3):
+            sharded = ranking(DocumentAnalyst(shards=shards).analyze_documents(pdf_paths, persona, job,
+                                                                               index_dir=index_dir))
+            if sharded != reference:
+                print(f"❌ {shards} shards rank differently from the single index")
+                return False
+    
+    print("✅ 2 and 3 shards match the single index")
+    return True
+
+def challenge_1a():
+    """The Challenge 1a pipeline module (Challenge 1a/src/main.py)"""
+    import importlib.util
+    from benchmark import ENTRY_POINTS
+    
+    spec = importlib.util.spec_from_file_location("challenge1a_main", ENTRY_POINTS["challenge1a"])
+    pipeline = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(pipeline)
+    return pipeline
+
+def test_1a_model_labels():
+    """Test that 1a's batched model labels need no per-line rule pass and keep --stream - clean"""
+    print("\n🧪 Testing 1a Batched Model Labels")
+    
+    import sys
+    import tempfile
+    import joblib
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+    from benchmark import make_collection, ENTRY_POINTS
+    pipeline = challenge_1a()
+    
+    with tempfile.TemporaryDirectory(prefix="test-1a-model-") as tmp_dir:
+        collection_dir = make_collection(os.path.join(tmp_dir, "collection"), documents=2, pages=2,
+                                         spans_per_page=18, persona_words=3)
+        pdf_dir = os.path.join(collection_dir, "PDFs")
+        pdf_paths = sorted(os.path.join(pdf_dir, f) for f in os.listdir(pdf_dir))
+        # A small model fitted on the rule labels stands in for the trained heading model
+        ruled = [pipeline.process_pdf(path) for path in pdf_paths]
+        training = pd.concat(ruled, ignore_index=True)
+        model = RandomForestClassifier(n_estimators=10, random_state=42)
+        model.fit(training[pipeline.FEATURES], training["predicted"])
+        unruled = [pipeline.process_pdf(path, rules=False) for path in pdf_paths]
+        pipeline.predict_batch(model, ruled)
+        pipeline.predict_batch(model, unruled)
+        same_labels = all(a["predicted"].tolist() == b["predicted"].tolist() for a, b in zip(ruled, unruled))
+        
+        model_path = os.path.join(tmp_dir, "heading_model.joblib")
+        joblib.dump(model, model_path)
+        run = subprocess.run([sys.executable, ENTRY_POINTS["challenge1a"], "--input_dir", pdf_dir,
+                              "--output_dir", os.path.join(tmp_dir, "out"), "--classifier", "model",
+                              "--model_path", model_path, "--stream", "-"],
+                             capture_output=True, text=True, timeout=300)
+    
+    if not same_labels:
+        print("❌ Skipping the rule pass changed the model's labels")
+        return False
+    lines = run.stdout.splitlines()
+    try:
+        records = [json.loads(line) for line in lines]
+    except ValueError:
+        print(f"❌ --stream - stdout is not pure NDJSON: {lines[:3]}")
+        return False
+    if run.returncode != 0 or [record["status"] for record in records] != ["ok"] * len(pdf_paths):
+        print(f"❌ Model run failed: {run.stderr[-500:]}")
+        return False
+    
+    print(f"✅ Same labels without the rule pass, {len(records)} clean NDJSON records")
+    return True
+
+def test_1a_atomic_write():
+    """Test that 1a label files are replaced atomically, with the normal file mode"""
+    print("\n🧪 Testing 1a Atomic Output Writes")
+    
+    import stat
+    import tempfile
+    pipeline = challenge_1a()
+    
+    with tempfile.TemporaryDirectory(prefix="test-1a-write-") as tmp_dir:
+        path = os.path.join(tmp_dir, "doc_labels.json")
+        pipeline.write_output({"title": "First", "outline": []}, path)
+        pipeline.write_output({"title": "Second", "outline": []}, path)
+        try:
+            # Not JSON serializable: the write fails before anything is replaced
+            pipeline.write_output({"title": object()}, path)
+            print("❌ Writing an unserializable result did not fail")
+            return False
+        except TypeError:
+            pass
+        with open(path, 'r', encoding='utf-8') as f:
+            title = json.load(f)["title"]
+        leftovers = [f for f in os.listdir(tmp_dir) if f != "doc_labels.json"]
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    
+    umask = os.umask(0)
+    os.umask(umask)
+    if title != "Second":
+        print(f"❌ Expected the last complete write, found title {title!r}")
+        return False
+    if leftovers:
+        print(f"❌ Temporary files left behind: {leftovers}")
+        return False
+    if mode != 0o666 & ~umask:
+        print(f"❌ Output mode {oct(mode)}, expected {oct(0o666 & ~umask)}")
+        return False
+    
+    print(f"✅ Replaced atomically, no temp files, mode {oct(mode)}")
+    return True
+
+_real_extract_job = None  # The 1a extract_job wrapped by crashing_extract_job (set before the pool forks)
+
+def crashing_extract_job(path, max_pages=None, doc_timeout=None, rules=True):
+    """1a watch job whose worker process dies on files named crash*.pdf"""
+    if os.path.basename(path).startswith("crash"):
+        os._exit(3)
+    return _real_extract_job(path, max_pages, doc_timeout, rules)
+
+def test_1a_watch_requeue():
+    """Test that a worker crash in 1a watch mode is pinned on its document and the others are retried"""
+    print("\n🧪 Testing 1a Watch Mode Crash Requeue")
+    
+    global _real_extract_job
+    import shutil
+    import signal
+    import tempfile
+    import threading
+    from benchmark import make_collection
+    pipeline = challenge_1a()
+    
+    with tempfile.TemporaryDirectory(prefix="test-1a-watch-") as tmp_dir:
+        collection_dir = make_collection(os.path.join(tmp_dir, "collection"), documents=1, pages=1,
+                                         spans_per_page=18, persona_words=3)
+        pdf_dir = os.path.join(collection_dir, "PDFs")
+        source = os.path.join(pdf_dir, os.listdir(pdf_dir)[0])
+        input_dir, output_dir = os.path.join(tmp_dir, "in"), os.path.join(tmp_dir, "out")
+        os.makedirs(input_dir)
+        # Both files are in flight when the crash breaks the pool
+        shutil.copy(source, os.path.join(input_dir, "crash.pdf"))
+        shutil.copy(source, os.path.join(input_dir, "healthy.pdf"))
+        stream_path = os.path.join(tmp_dir, "results.ndjson")
+        
+        def records():
+            if not os.path.exists(stream_path):
+                return []
+            with open(stream_path, 'r', encoding='utf-8') as f:
+                return [json.loads(line) for line in f]
+        
+        def stop_when_done():
+            deadline = time.time() + 60
+            while len(records()) < 2 and time.time() < deadline:
+                time.sleep(0.2)
+            os.kill(os.getpid(), signal.SIGTERM)  # run_watch stops on SIGTERM
+        
+        _real_extract_job, pipeline.extract_job = pipeline.extract_job, crashing_extract_job
+        previous_handler = signal.getsignal(signal.SIGTERM)
+        threading.Thread(target=stop_when_done, daemon=True).start()
+        try:
+            pipeline.run_watch(input_dir, output_dir, stream_path=stream_path, workers=2, settle=0.2,
+                               poll_interval=0.1)
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+        results = {record["file"]: record for record in records()}
+    
+    if len(results) != 2:
+        print(f"❌ Expected results for both files, got {sorted(results)}")
+        return False
+    if results["crash.pdf"].get("error") != "worker_died":
+        print(f"❌ crash.pdf was not reported as worker_died: {results['crash.pdf']}")
+        return False
+    if results["healthy.pdf"]["status"] != "ok":
+        print(f"❌ healthy.pdf was not retried after the crash: {results['healthy.pdf']}")
+        return False
+    
+    print("✅ Crash pinned on crash.pdf, healthy.pdf retried and labeled")
+    return True
+
+def test_hashing_document_frequencies():
+    """Test that adding and removing documents keeps the hashing model's counts exact"""
+    print("\n🧪 Testing Hashing Model Document Frequencies")
+    
+    import numpy as np
+    from main import HashingTermModel, _hash_term_counts
+    
+    spans = {
+        "a.pdf": ["Coastal towns and beaches", "Budget hotels near the old port"],
+        "b.pdf": ["Local cuisine and wine tasting", "Night markets", "Museum passes"],
+        "copy.pdf": ["Coastal towns and beaches", "Budget hotels near the old port"],
+    }
+    
+    def recounted(names):
+        # Document frequencies of these documents counted from scratch
+        counts = _hash_term_counts([text for name in names for text in spans[name]], 2 ** 12)
+        return np.asarray((counts > 0).sum(axis=0)).ravel(), counts.shape[0]
+    
+    model = HashingTermModel(n_features=2 ** 12, max_workers=1)
+    for names in (["a.pdf", "b.pdf", "copy.pdf"], ["a.pdf", "copy.pdf"], ["b.pdf"], ["a.pdf", "b.pdf"]):
+        model.sync({name: spans[name] for name in names})
+        doc_freq, n_spans = recounted(names)
+        if model.n_spans != n_spans or not np.array_equal(model.doc_freq, doc_freq):
+            print(f"❌ Counts after syncing {names} differ from a fresh count")
+            return False
+    
+    print("✅ Counts stay exact through adds, removals and an identical copy")
+    return True
+
+def test_lsa_projection_reuse():
+    """Test that a cached or stored LSA projection ranks a new query like a freshly fitted one"""
+    print("\n🧪 Testing LSA Projection Reuse")
+    
+    import tempfile
+    from main import DocumentAnalyst, INDEX_DIRNAME
+    
+    with tempfile.TemporaryDirectory(prefix="test-lsa-") as tmp_dir:
+        pdf_paths, persona, job = synthetic_request(tmp_dir)
+        index_dir = os.path.join(os.path.dirname(pdf_paths[0]), "..", INDEX_DIRNAME)
+        analyst = DocumentAnalyst(scoring="lsa")
+        reference = ranking(analyst.analyze_documents(pdf_paths, persona, job))
+        reused = ranking(analyst.analyze_documents(pdf_paths, "Chef", "Plan a dinner menu"))
+        fresh = ranking(DocumentAnalyst(scoring="lsa").analyze_documents(pdf_paths, "Chef", "Plan a dinner menu"))
+        projections = len(analyst.analyzer.lsa_cache)
+        fitted = ranking(DocumentAnalyst(scoring="lsa").analyze_documents(pdf_paths, persona, job,
+                                                                          index_dir=index_dir))
+        stored = ranking(DocumentAnalyst(scoring="lsa").analyze_documents(pdf_paths, persona, job,
+                                                                          index_dir=index_dir))
+    
+    if projections != 1:
+        print(f"❌ Expected one projection for two queries, got {projections}")
+        return False
+    if reused != fresh:
+        print("❌ The cached projection ranks a new query differently")
+        return False
+    if fitted != reference or stored != reference:
+        print("❌ The index projection ranks differently from the in-memory one")
+        return False
+    
+    print("✅ One projection per collection, reused and stored projections rank alike")
+    return True
+
+def test_candidate_pages():
+    """Test that two-tier extraction ranks only candidate pages and matches the plain analysis when all pages qualify"""
+    print("\n🧪 Testing Two-Tier Extraction")
+    
+    import tempfile
+    from main import DocumentAnalyst
+    
+    with tempfile.TemporaryDirectory(prefix="test-candidates-") as tmp_dir:
+        pdf_paths, persona, job = synthetic_request(tmp_dir)
+        reference = ranking(DocumentAnalyst().analyze_documents(pdf_paths, persona, job))
+        # 4 documents of 3 pages: 12 candidate pages are all of them
+        every_page = ranking(DocumentAnalyst().analyze_documents(pdf_paths, persona, job, candidate_pages=12))
+        candidates = DocumentAnalyst().select_candidate_pages(pdf_paths, persona, job, 2)
+        filtered = DocumentAnalyst().analyze_documents(pdf_paths, persona, job, candidate_pages=2)
+    
+    allowed = {(os.path.basename(path), page) for path, pages in candidates.items() for page in pages}
+    if len(allowed) > 2 * 3:
+        print(f"❌ 2 top pages plus neighbors gave {len(allowed)} candidate pages")
+        return False
+    ranked = {(section["document"], section["page_number"])
+              for section in filtered["extracted_sections"] + filtered["subsection_analysis"]}
+    if not ranked or not ranked <= allowed:
+        print(f"❌ Ranked pages outside the candidates: {sorted(ranked - allowed)}")
+        return False
+    if every_page != reference:
+        print("❌ Selecting every page ranks differently from the plain analysis")
+        return False
+    
+    print(f"✅ Ranked {len(ranked)} of {len(allowed)} candidate pages; all pages match the plain analysis")
+    return True
+
+def test_progressive_results():
+    """Test that progressive analysis reports every document and ends on the batch result"""
+    print("\n🧪 Testing Progressive Results")
+    
+    import tempfile
+    from main import DocumentAnalyst
+    
+    with tempfile.TemporaryDirectory(prefix="test-progress-") as tmp_dir:
+        pdf_paths, persona, job = synthetic_request(tmp_dir)
+        reference = ranking(DocumentAnalyst().analyze_documents(pdf_paths, persona, job))
+        updates = []
+        output = DocumentAnalyst().analyze_documents(pdf_paths, persona, job, on_progress=updates.append)
+    
+    done = [update["metadata"]["progress"]["documents_done"] for update in updates[:-1]]
+    if done != list(range(1, len(pdf_paths) + 1)):
+        print(f"❌ Interim rankings after {done} documents, expected one per document")
+        return False
+    if not updates[-1]["metadata"]["progress"]["final"] or any(
+            update["metadata"]["progress"]["final"] for update in updates[:-1]):
+        print("❌ Only the last update should be final")
+        return False
+    if ranking(updates[-1]) != reference or ranking(output) != reference:
+        print("❌ The final progressive result differs from the batch analysis")
+        return False
+    
+    print(f"✅ {len(done)} interim rankings, final result identical to the batch analysis")
+    return True
+
+def test_progress_stream_closed():
+    """Test that the --progress file is closed when the analysis fails"""
+    print("\n🧪 Testing Progress Stream on Error")
+    
+    import sys
+    import tempfile
+    from unittest import mock
+    import main as pipeline
+    
+    analyze_documents = pipeline.DocumentAnalyst.analyze_documents
+    opened = []
+    
+    def recording_open(*args, **kwargs):
+        f = open(*args, **kwargs)
+        opened.append(f)
+        return f
+    
+    def failing_analysis(self, *args, **kwargs):
+        analyze_documents(self, *args, **kwargs)
+        raise RuntimeError("analysis failed after the last progress line")
+    
+    with tempfile.TemporaryDirectory(prefix="test-progress-error-") as tmp_dir:
+        pdf_paths, persona, job = synthetic_request(tmp_dir)
+        progress_path = os.path.join(tmp_dir, "progress.ndjson")
+        argv = ["main.py", "--input_dir", os.path.dirname(pdf_paths[0]), "--persona", persona, "--job", job,
+                "--output", os.path.join(tmp_dir, "output.json"), "--progress", progress_path]
+        with mock.patch.object(sys, "argv", argv), \
+                mock.patch.object(pipeline, "open", recording_open, create=True), \
+                mock.patch.object(pipeline.DocumentAnalyst, "analyze_documents", failing_analysis):
+            try:
+                pipeline.main()
+                print("❌ The failing analysis did not raise")
+                return False
+            except RuntimeError:
+                pass
+        with open(progress_path, 'r', encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f]
+    
+    streams = [f for f in opened if f.name == progress_path]
+    if len(streams) != 1 or not streams[0].closed:
+        print("❌ The progress stream was left open")
+        return False
+    if not lines or not lines[-1]["metadata"]["progress"]["final"]:
+        print("❌ Progress lines written before the error were lost")
+        return False
+    
+    print(f"✅ Progress stream closed after the error, {len(lines)} lines kept")
+    return True
+
+def test_section_scoring():
+    """Test section-level scoring and when --granularity auto switches to it"""
+    print("\n🧪 Testing Section-Level Scoring")
+    
+    import tempfile
+    from main import DocumentAnalyst, SECTION_SCORING_MIN_SPANS
+    
+    with tempfile.TemporaryDirectory(prefix="test-sections-") as tmp_dir:
+        pdf_paths, persona, job = synthetic_request(tmp_dir)
+        by_span = DocumentAnalyst(granularity="span").analyze_documents(pdf_paths, persona, job)
+        by_section = DocumentAnalyst(granularity="section").analyze_documents(pdf_paths, persona, job)
+    
+    if by_section["metadata"]["total_sections_found"] != by_span["metadata"]["total_sections_found"]:
+        print("❌ Section scoring grouped the spans into different sections")
+        return False
+    sections = by_section["extracted_sections"]
+    if [section["importance_rank"] for section in sections] != list(range(1, len(sections) + 1)):
+        print("❌ Section ranks are not 1..n")
+        return False
+    if ([(s["document"], s["page_number"]) for s in by_section["subsection_analysis"]]
+            != [(s["document"], s["page_number"]) for s in sections]):
+        print("❌ subsection_analysis does not follow the ranked sections")
+        return False
+    
+    # Auto only switches for large collections scored with the default sparse TF-IDF and no index
+    cases = [
+        ({}, SECTION_SCORING_MIN_SPANS, False, True),
+        ({}, SECTION_SCORING_MIN_SPANS - 1, False, False),
+        ({}, SECTION_SCORING_MIN_SPANS, True, False),
+        ({"scoring": "lsa"}, SECTION_SCORING_MIN_SPANS, False, False),
+        ({"vectorizer_mode": "hashing"}, SECTION_SCORING_MIN_SPANS, False, False),
+    ]
+    for options, n_spans, indexed, expected in cases:
+        if DocumentAnalyst(granularity="auto", **options).section_scoring(n_spans, indexed=indexed) != expected:
+            print(f"❌ Auto granularity with {options}, {n_spans} spans, indexed={indexed} should "
+                  f"{'' if expected else 'not '}score sections")
+            return False
+    
+    print(f"✅ {len(sections)} sections ranked, auto switches only with the default scorer")
+    return True
+
+def test_outline_sections():
+    """Test that a current Challenge 1a outline sets a document's section boundaries and a stale one is ignored"""
+    print("\n🧪 Testing Outline-Driven Sections")
+    
+    import tempfile
+    from main import DocumentAnalyst
+    
+    outline = {"title": "Weekend Guide", "outline": [
+        {"level": "H1", "text": "Getting There", "page": 1},
+        {"level": "P", "text": "Trains run hourly from the airport to the old town and cost ten euros.", "page": 1},
+        {"level": "H4", "text": "Night Buses", "page": 1},
+        {"level": "P", "text": "Night buses leave from the main square every thirty minutes after midnight.", "page": 1},
+        {"level": "H2", "text": "Where to Eat", "page": 2},
+        {"level": "P", "text": "The harbour has cheap seafood restaurants and a busy evening market.", "page": 2},
+        {"level": "P", "text": "Book a table for groups of ten at least a day ahead.", "page": 3},
+    ]}
+    headings = {"Weekend Guide", "Getting There", "Night Buses", "Where to Eat"}
+    
+    with tempfile.TemporaryDirectory(prefix="test-outlines-") as tmp_dir:
+        pdf_paths, persona, job = synthetic_request(tmp_dir)
+        outlines_dir = os.path.join(tmp_dir, "outlines")
+        os.makedirs(outlines_dir)
+        document = os.path.basename(pdf_paths[0])
+        outline_path = os.path.join(outlines_dir, os.path.splitext(document)[0] + "_labels.json")
+        with open(outline_path, 'w', encoding='utf-8') as f:
+            json.dump(outline, f)
+        current = DocumentAnalyst(outlines_dir=outlines_dir, top_k=1000).analyze_documents(pdf_paths, persona, job)
+        # An outline older than its PDF is out of date
+        stale_time = os.path.getmtime(pdf_paths[0]) - 60
+        os.utime(outline_path, (stale_time, stale_time))
+        stale = DocumentAnalyst(outlines_dir=outlines_dir, top_k=1000).analyze_documents(pdf_paths, persona, job)
+    
+    titles = {s["section_title"] for s in current["extracted_sections"] if s["document"] == document}
+    if titles != headings:
+        print(f"❌ Sections of the outlined document are {sorted(titles)}, expected {sorted(headings)}")
+        return False
+    refined = {s["section_title"]: s["refined_text"] for s in current["subsection_analysis"] if s["document"] == document}
+    if "Book a table" not in refined.get("Where to Eat", ""):
+        print("❌ 'Where to Eat' does not continue onto the next page")
+        return False
+    if {s["section_title"] for s in stale["extracted_sections"] if s["document"] == document} & headings:
+        print("❌ A stale outline was used")
+        return False
+    
+    print(f"✅ {len(titles)} outline sections used, stale outline ignored")
+    return True
+
+def test_sentence_refinement():
+    """Test that refined_text keeps the best sentence, stays within its budget and reads in order"""
+    print("\n🧪 Testing Sentence Refinement")
+    
+    from main import DocumentAnalyst, SENTENCE_PATTERN
+    from span_text import SpanTexts, text_of
+    
+    texts = SpanTexts()
+    
+    def section(paragraphs):
+        content = []
+        for page, text in paragraphs:
+            offset, length = texts.append(text)
+            content.append({"text_ref": (texts, offset, length), "page": page})
+        return {"document": "guide.pdf", "content": content}
+    
+    best = "Plan a coast trip for friends by train."
+    long_best = "Plan a coast trip " + "with friends " * 10 + "by train."
+    sections = [
+        section([(1, "The tax form needs a signature. Invoices are filed monthly."),
+                 (2, f"{best} Budget forecasts are due in March."),
+                 (2, "Expense reports use the blue form.")]),
+        section([]),
+        section([(3, long_best)]),
+    ]
+    budget = 80
+    refined = DocumentAnalyst().refine_sections(sections, ["Mixed", "Empty", "Long"], "Travel Planner",
+                                                "Plan a trip to the coast for friends", char_budget=budget)
+    
+    if [entry["section_title"] for entry in refined] != ["Mixed", "Long"]:
+        print(f"❌ Expected entries for the two sections with text, got {refined}")
+        return False
+    mixed, long = refined
+    if best not in mixed["refined_text"] or mixed["page_number"] != 2:
+        print(f"❌ The best sentence or its page is missing: {mixed}")
+        return False
+    if len(mixed["refined_text"]) > budget:
+        print(f"❌ {len(mixed['refined_text'])} characters exceed the {budget} character budget")
+        return False
+    reading_order = " ".join(text_of(item["text_ref"]) for item in sections[0]["content"])
+    positions = [reading_order.index(sentence) for sentence in SENTENCE_PATTERN.findall(mixed["refined_text"])]
+    if positions != sorted(positions):
+        print("❌ Selected sentences are not in reading order")
+        return False
+    if long["refined_text"] != long_best[:budget] + "...":
+        print(f"❌ An over-long best sentence should be cut to the budget: {long['refined_text']!r}")
+        return False
+    
+    print(f"✅ Best sentences kept within {budget} characters, in reading order")
+    return True
+
+def test_profiles():
+    """Test that profiles set the analysis options, flags override them and the benchmark's stdout stays clean"""
+    print("\n🧪 Testing Speed/Quality Profiles")
+    
+    import sys
+    import tempfile
+    from main import PROFILES, profile_settings
+    
+    settings = profile_settings("fast", top_k=7, granularity=None)
+    if settings != dict(PROFILES["fast"], top_k=7):
+        print(f"❌ Overrides not applied as given: {settings}")
+        return False
+    
+    with tempfile.TemporaryDirectory(prefix="test-profiles-") as tmp_dir:
+        pdf_paths, persona, job = synthetic_request(tmp_dir)
+        pdf_dir = os.path.dirname(pdf_paths[0])
+        sections = {}
+        for flags in (["--profile", "fast"], ["--profile", "fast", "--top_k", "7"]):
+            output_path = os.path.join(tmp_dir, "output.json")
+            run = subprocess.run([sys.executable, "main.py", "--input_dir", pdf_dir, "--persona", persona,
+                                  "--job", job, "--output", output_path] + flags,
+                                 capture_output=True, text=True, timeout=300)
+            if run.returncode != 0:
+                print(f"❌ {' '.join(flags)} failed: {run.stderr[-500:]}")
+                return False
+            with open(output_path, 'r', encoding='utf-8') as f:
+                sections[" ".join(flags)] = len(json.load(f)["extracted_sections"])
+        benchmark = subprocess.run([sys.executable, "benchmark.py", "profiles", "--input_dir", pdf_dir,
+                                    "--persona", persona, "--job", job, "--runs", "1"],
+                                   capture_output=True, text=True, timeout=300)
+    
+    if list(sections.values()) != [PROFILES["fast"]["top_k"], 7]:
+        print(f"❌ Sections returned per profile: {sections}")
+        return False
+    lines = benchmark.stdout.splitlines()
+    if benchmark.returncode != 0 or len(lines) != 1 + len(PROFILES) or \
+            not all(any(line.startswith(f"⏱️  {name}:") for line in lines) for name in PROFILES):
+        print(f"❌ Benchmark stdout is not just its own lines: {lines[:5]}")
+        return False
+    
+    print(f"✅ Profile top_k and override applied, {len(lines)} clean benchmark lines")
+    return True
+
 def validate_output_format(output_file: str) -> bool:
     """Validate Challenge 1b output JSON format"""
     try:
@@ -323,6 +1040,168 @@ def main():
         print(f"❌ All Collections error: {e}")
         test_results.append(("All Collections", False))
     
+    # Test 5: Library API
+    print(f"\n{'='*60}")
+    try:
+        result = test_library_api()
+        test_results.append(("Library API", result))
+    except Exception as e:
+        print(f"❌ Library API error: {e}")
+        test_results.append(("Library API", False))
+    
+    # Test 6: Near-Duplicate Suppression
+    print(f"\n{'='*60}")
+    try:
+        result = test_near_duplicates()
+        test_results.append(("Near Duplicates", result))
+    except Exception as e:
+        print(f"❌ Near Duplicates error: {e}")
+        test_results.append(("Near Duplicates", False))
+    
+    # Test 7: Result Cache
+    print(f"\n{'='*60}")
+    try:
+        result = test_result_cache()
+        test_results.append(("Result Cache", result))
+    except Exception as e:
+        print(f"❌ Result Cache error: {e}")
+        test_results.append(("Result Cache", False))
+    
+    # Test 8: Checkpoint/Resume
+    print(f"\n{'='*60}")
+    try:
+        result = test_checkpoint_resume()
+        test_results.append(("Checkpoint Resume", result))
+    except Exception as e:
+        print(f"❌ Checkpoint Resume error: {e}")
+        test_results.append(("Checkpoint Resume", False))
+    
+    # Test 9: Memory Budget Spill
+    print(f"\n{'='*60}")
+    try:
+        result = test_spill()
+        test_results.append(("Memory Budget Spill", result))
+    except Exception as e:
+        print(f"❌ Memory Budget Spill error: {e}")
+        test_results.append(("Memory Budget Spill", False))
+    
+    # Test 10: Sharded Index
+    print(f"\n{'='*60}")
+    try:
+        result = test_sharded_index()
+        test_results.append(("Sharded Index", result))
+    except Exception as e:
+        print(f"❌ Sharded Index error: {e}")
+        test_results.append(("Sharded Index", False))
+    
+    # Test 11: 1a Batched Model Labels
+    print(f"\n{'='*60}")
+    try:
+        result = test_1a_model_labels()
+        test_results.append(("1a Model Labels", result))
+    except Exception as e:
+        print(f"❌ 1a Model Labels error: {e}")
+        test_results.append(("1a Model Labels", False))
+    
+    # Test 12: 1a Atomic Output Writes
+    print(f"\n{'='*60}")
+    try:
+        result = test_1a_atomic_write()
+        test_results.append(("1a Atomic Writes", result))
+    except Exception as e:
+        print(f"❌ 1a Atomic Writes error: {e}")
+        test_results.append(("1a Atomic Writes", False))
+    
+    # Test 13: 1a Watch Mode Crash Requeue
+    print(f"\n{'='*60}")
+    try:
+        result = test_1a_watch_requeue()
+        test_results.append(("1a Watch Requeue", result))
+    except Exception as e:
+        print(f"❌ 1a Watch Requeue error: {e}")
+        test_results.append(("1a Watch Requeue", False))
+    
+    # Test 14: Hashing Model Document Frequencies
+    print(f"\n{'='*60}")
+    try:
+        result = test_hashing_document_frequencies()
+        test_results.append(("Hashing Frequencies", result))
+    except Exception as e:
+        print(f"❌ Hashing Frequencies error: {e}")
+        test_results.append(("Hashing Frequencies", False))
+    
+    # Test 15: LSA Projection Reuse
+    print(f"\n{'='*60}")
+    try:
+        result = test_lsa_projection_reuse()
+        test_results.append(("LSA Projection Reuse", result))
+    except Exception as e:
+        print(f"❌ LSA Projection Reuse error: {e}")
+        test_results.append(("LSA Projection Reuse", False))
+    
+    # Test 16: Two-Tier Extraction
+    print(f"\n{'='*60}")
+    try:
+        result = test_candidate_pages()
+        test_results.append(("Two-Tier Extraction", result))
+    except Exception as e:
+        print(f"❌ Two-Tier Extraction error: {e}")
+        test_results.append(("Two-Tier Extraction", False))
+    
+    # Test 17: Progressive Results
+    print(f"\n{'='*60}")
+    try:
+        result = test_progressive_results()
+        test_results.append(("Progressive Results", result))
+    except Exception as e:
+        print(f"❌ Progressive Results error: {e}")
+        test_results.append(("Progressive Results", False))
+    
+    # Test 18: Progress Stream on Error
+    print(f"\n{'='*60}")
+    try:
+        result = test_progress_stream_closed()
+        test_results.append(("Progress Stream Closed", result))
+    except Exception as e:
+        print(f"❌ Progress Stream Closed error: {e}")
+        test_results.append(("Progress Stream Closed", False))
+    
+    # Test 19: Section-Level Scoring
+    print(f"\n{'='*60}")
+    try:
+        result = test_section_scoring()
+        test_results.append(("Section Scoring", result))
+    except Exception as e:
+        print(f"❌ Section Scoring error: {e}")
+        test_results.append(("Section Scoring", False))
+    
+    # Test 20: Outline-Driven Sections
+    print(f"\n{'='*60}")
+    try:
+        result = test_outline_sections()
+        test_results.append(("Outline Sections", result))
+    except Exception as e:
+        print(f"❌ Outline Sections error: {e}")
+        test_results.append(("Outline Sections", False))
+    
+    # Test 21: Sentence Refinement
+    print(f"\n{'='*60}")
+    try:
+        result = test_sentence_refinement()
+        test_results.append(("Sentence Refinement", result))
+    except Exception as e:
+        print(f"❌ Sentence Refinement error: {e}")
+        test_results.append(("Sentence Refinement", False))
+    
+    # Test 22: Speed/Quality Profiles
+    print(f"\n{'='*60}")
+    try:
+        result = test_profiles()
+        test_results.append(("Profiles", result))
+    except Exception as e:
+        print(f"❌ Profiles error: {e}")
+        test_results.append(("Profiles", False))
+    
     # Test Summary
     print(f"\n{'='*60}")
     print("📊 TEST SUMMARY")